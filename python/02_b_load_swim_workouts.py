@@ -0,0 +1,182 @@
+"""
+Streaming CSV Loader for Workout Tables
+---------------------------------------
+
+Python replacement for sql/02_load_data.sql that runs on any host with an
+ODBC driver (no server-side file path needed). Loads any sport in the
+registry (sports.py); swim is the default:
+
+1. Streams the Garmin CSV export in fixed-size chunks with a generator,
+   so memory stays constant regardless of file size.
+2. Parses and type-converts the sport's csv_columns (commas in Distance,
+   "--" placeholders, Training Stress Score®, ...).
+3. Bulk-inserts each chunk into a #<table>_stage temp table with
+   fast_executemany, then upserts it with dbo.merge_<table>_stage
+   (sql/01_b_natural_key_upsert.sql, sql/10_bike_run_schema.sql): one
+   MERGE and one commit per chunk. Re-importing an overlapping export only
+   touches new or changed rows.
+4. Refreshes the training_load_* aggregates (training_load.py) for the
+   days the load touched, once sql/13_training_load.sql has been run.
+
+Usage:
+    python 02_b_load_swim_workouts.py path/to/swim_workouts.csv [--chunk-size 5000]
+    python 02_b_load_swim_workouts.py path/to/run_workouts.csv --sport run
+"""
+
+import argparse
+import csv
+import time
+from datetime import datetime
+import training_load
+from utils import pooled_connection
+from sports import SPORTS, get_sport
+
+LOAD_CHUNK_SIZE = 5000
+
+# ---------------------------------------------------------
+# VALUE PARSERS (TRY_CONVERT equivalents: bad values → None)
+# ---------------------------------------------------------
+MISSING = {"", "--"}
+
+def clean(value):
+    if value is None:
+        return None
+    value = value.strip()
+    return None if value in MISSING else value
+
+def parse_float(value):
+    value = clean(value)
+    if value is None:
+        return None
+    try:
+        return float(value.replace(",", ""))
+    except ValueError:
+        return None
+
+def parse_int(value):
+    number = parse_float(value)
+    if number is None or not number.is_integer():
+        return None
+    return int(number)
+
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%Y-%m-%d")
+
+def parse_datetime(value):
+    value = clean(value)
+    if value is None:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+def parse_text(value):
+    return clean(value)
+
+# ---------------------------------------------------------
+# COLUMN MAPPING (table column, CSV header, parser) per sport
+# ---------------------------------------------------------
+PARSERS = {"text": parse_text, "float": parse_float, "int": parse_int, "datetime": parse_datetime}
+
+def columns_for(sport):
+    return [(name, header, PARSERS[kind]) for name, header, kind in sport.csv_columns]
+
+def stage_sql(sport, columns):
+    """(CREATE stage table SQL, INSERT INTO stage SQL) for a sport."""
+    column_list = ", ".join(f"[{name}]" for name, _, _ in columns)
+    create = f"""
+    DROP TABLE IF EXISTS {sport.stage_table};
+    SELECT TOP (0) {column_list}
+    INTO {sport.stage_table}
+    FROM {sport.table};
+"""
+    insert = f"""
+    INSERT INTO {sport.stage_table} ({column_list})
+    VALUES ({", ".join("?" for _ in columns)})
+"""
+    return create, insert
+
+def parse_row(record, columns):
+    return tuple(parser(record.get(header)) for _, header, parser in columns)
+
+# ---------------------------------------------------------
+# STREAMING READER
+# ---------------------------------------------------------
+def iter_chunks(path, columns, chunk_size=LOAD_CHUNK_SIZE, rejected=None):
+    """Yield lists of parsed row tuples, chunk_size rows at a time.
+
+    Rows without a parseable Date (workout_date is NOT NULL) are skipped and
+    their CSV line numbers appended to `rejected` when a list is given.
+    """
+    date_index = [name for name, _, _ in columns].index("workout_date")
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        chunk = []
+        for record in reader:
+            row = parse_row(record, columns)
+            if row[date_index] is None:
+                if rejected is not None:
+                    rejected.append(reader.line_num)
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+# ---------------------------------------------------------
+# MAIN PIPELINE
+# ---------------------------------------------------------
+def load_csv(path, chunk_size=LOAD_CHUNK_SIZE, sport="swim"):
+    sport = get_sport(sport)
+    columns = columns_for(sport)
+    create_stage_sql, insert_stage_sql = stage_sql(sport, columns)
+    rejected = []
+    total = inserted = updated = 0
+    started = time.perf_counter()
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.fast_executemany = True
+        cur.execute(create_stage_sql)
+
+        for chunk in iter_chunks(path, columns, chunk_size, rejected):
+            cur.execute(f"TRUNCATE TABLE {sport.stage_table};")
+            cur.executemany(insert_stage_sql, chunk)
+            cur.execute(f"EXEC {sport.merge_procedure};")
+            _, chunk_inserted, chunk_updated = cur.fetchone()
+            conn.commit()
+
+            total += len(chunk)
+            inserted += chunk_inserted
+            updated += chunk_updated
+            elapsed = time.perf_counter() - started
+            print(f"  {total} rows read, {inserted} inserted, {updated} updated ({total / elapsed:,.0f} rows/sec)")
+
+        cur.execute(f"DROP TABLE IF EXISTS {sport.stage_table};")
+        cur.close()
+
+        if (inserted or updated) and training_load.tables_ready(conn, [sport]):
+            recomputed = training_load.refresh(conn, [sport])
+            print(f"Training load refreshed ({recomputed.get(sport.key, 0)} {sport.key} days recomputed).")
+
+    elapsed = time.perf_counter() - started
+    print(f"Read {total} {sport.key} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/sec): "
+          f"{inserted} inserted, {updated} updated, {total - inserted - updated} unchanged.")
+    if rejected:
+        print(f"Skipped {len(rejected)} rows without a valid Date (first at CSV line {rejected[0]}).")
+    return inserted, updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a Garmin CSV export into a workout table.")
+    parser.add_argument("path", help="path to the sport's CSV export, e.g. swim_workouts.csv")
+    parser.add_argument("--chunk-size", type=int, default=LOAD_CHUNK_SIZE)
+    parser.add_argument("--sport", choices=list(SPORTS), default="swim")
+    args = parser.parse_args()
+    load_csv(args.path, args.chunk_size, args.sport)
@@ -1,155 +1,731 @@
 import os
 import json
+import time
+import uuid
+import argparse
+from datetime import timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import anthropic
 from anthropic import Anthropic
 from dotenv import load_dotenv
-from utils import get_connection, age_at_workout, athlete_gender
+from utils import pooled_connection, age_at_workout, athlete_gender
+from rate_limit import RateLimiter, retry_after_seconds, backoff_delay
+from sports import SPORTS, get_sport, active_sports
+import ai_output_cache
+from ai_output_cache import AI_OUTPUT_CACHE_ENABLED
+from instrumentation import span, count, log_event, session
 
 load_dotenv()
 
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_AI_API_KEY")
 ANTHROPIC_MODEL = os.getenv("ANTHROPIC_AI_MODEL")
 
-client = Anthropic(api_key=ANTHROPIC_API_KEY)
+# Retries are handled below so 429/retry-after can pause every worker at once.
+client = Anthropic(api_key=ANTHROPIC_API_KEY, max_retries=0)
+
+MAX_TOKENS = 300
+
+# ---------------------------------------------------------
+# CONCURRENCY / RATE LIMITS
+# ---------------------------------------------------------
+# Leave a limit at 0 to disable that bucket.
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "4"))
+AI_WRITE_BATCH_SIZE = int(os.getenv("AI_WRITE_BATCH_SIZE", "25"))
+AI_FETCH_BATCH_SIZE = int(os.getenv("AI_FETCH_BATCH_SIZE", "100"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "5"))
+
+# Packed prompts: AI_PACK_SIZE workouts share one request (and one copy of the
+# instructions). Ids missing from a packed reply are re-sent up to
+# AI_PACK_RETRIES times in a smaller pack. 1 = one workout per request.
+AI_PACK_SIZE = int(os.getenv("AI_PACK_SIZE", "1"))
+AI_PACK_RETRIES = int(os.getenv("AI_PACK_RETRIES", "2"))
+
+# Per-row failure tracking (sql/06_ai_generation_tracking.sql): a workout that
+# fails AI_MAX_ATTEMPTS times is moved to the dead-letter table.
+AI_MAX_ATTEMPTS = int(os.getenv("AI_MAX_ATTEMPTS", "5"))
+AI_RETRY_BASE_SECONDS = int(os.getenv("AI_RETRY_BASE_SECONDS", "60"))
+AI_RETRY_MAX_SECONDS = int(os.getenv("AI_RETRY_MAX_SECONDS", "86400"))
+
+limiter = RateLimiter(
+    requests_per_minute=int(os.getenv("ANTHROPIC_REQUESTS_PER_MINUTE", "50")),
+    input_tokens_per_minute=int(os.getenv("ANTHROPIC_INPUT_TOKENS_PER_MINUTE", "40000")),
+    output_tokens_per_minute=int(os.getenv("ANTHROPIC_OUTPUT_TOKENS_PER_MINUTE", "8000")),
+)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504, 529}
+
+def message_params(prompt, max_tokens=MAX_TOKENS):
+    return {
+        "model": ANTHROPIC_MODEL,
+        "max_tokens": max_tokens,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+    }
+
+def create_message(prompt, max_tokens=MAX_TOKENS):
+    """messages.create with rate limiting and retry/backoff on 429 and 5xx."""
+    estimated_input = len(prompt) // 4 + 1
+
+    for attempt in range(AI_MAX_RETRIES + 1):
+        with span("rate_limit_wait"):
+            limiter.acquire(estimated_input, max_tokens)
+        try:
+            with span("anthropic_request"):
+                response = client.messages.create(**message_params(prompt, max_tokens))
+        except anthropic.APIStatusError as e:
+            limiter.settle(estimated_input, max_tokens, 0, 0)
+            if e.status_code not in RETRYABLE_STATUS or attempt == AI_MAX_RETRIES:
+                raise
+            delay = retry_after_seconds(e.response.headers)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            if e.status_code == 429:
+                limiter.pause(delay)
+            count("anthropic_retries_total", reason=str(e.status_code))
+            log_event("anthropic_retry", status=e.status_code, attempt=attempt, delay_seconds=delay)
+            print(f"  HTTP {e.status_code}, retrying in {delay:.1f}s...")
+            with span("retry_sleep"):
+                time.sleep(delay)
+            continue
+        except anthropic.APIConnectionError:
+            limiter.settle(estimated_input, max_tokens, 0, 0)
+            if attempt == AI_MAX_RETRIES:
+                raise
+            count("anthropic_retries_total", reason="connection")
+            log_event("anthropic_retry", status="connection", attempt=attempt)
+            with span("retry_sleep"):
+                time.sleep(backoff_delay(attempt))
+            continue
+
+        limiter.settle(
+            estimated_input, max_tokens,
+            response.usage.input_tokens, response.usage.output_tokens
+        )
+        count("anthropic_tokens_total", response.usage.input_tokens, direction="input")
+        count("anthropic_tokens_total", response.usage.output_tokens, direction="output")
+        return response
 
 # ---------------------------------------------------------
 # AI CALL (Anthropic)
 # ---------------------------------------------------------
-def call_ai_for_workout(row):
+def workout_data(row, sport):
+    """Metric dict sent to the model (and hashed for the output cache)."""
     data = {
-        "swim_workout_id": row.swim_workout_id,
+        sport.id_column: getattr(row, sport.id_column),
         "activity_type": row.activity_type,
         "workout_date": str(row.workout_date),
-        "title": row.title,
-        "distance_yards": row.distance_yards,
-        "calories": row.calories,
-        "time": row.time,
-        "avg_hr": row.avg_hr,
-        "max_hr": row.max_hr,
-        "aerobic_te": row.aerobic_te,
-        "avg_pace": row.avg_pace,
-        "best_pace": row.best_pace,
-        "total_strokes": row.total_strokes,
-        "avg_swolf": row.avg_swolf,
-        "avg_stroke_rate": row.avg_stroke_rate,
-        "best_lap_time": row.best_lap_time,
-        "number_of_laps": row.number_of_laps,
-        "moving_time": row.moving_time,
-        "elapsed_time": row.elapsed_time,
-        "training_stress_score": row.training_stress_score,
     }
+    data.update((column, getattr(row, column)) for column in sport.metric_columns)
+    return data
 
-    age = age_at_workout(row.workout_date)
-
-    prompt = f"""
-You are an expert endurance swim coach. Analyze the following swim workout and return STRICT JSON.
-
-Workout details:
-{json.dumps(data, indent=2)}
-
-The athlete was {age} years old at the time of this workout.
-The athlete is {athlete_gender}. Use gender only to interpret heart‑rate‑based physiology, not as a determinant of performance.
-Use age only to interpret heart‑rate‑based metrics, not as the primary determinant of difficulty.
-
-Generate:
-1. "summary": 2–3 sentences describing how the swim likely felt, focusing on pacing, efficiency, aerobic load, and technique.
-2. "felt_rating": one of ["easy", "moderate", "hard"].
-3. "perceived_effort": one of ["low", "medium", "high"].
-
-Return ONLY valid JSON in this exact shape, with NO code fences:
-{{
-  "summary": "string",
-  "felt_rating": "easy|moderate|hard",
-  "perceived_effort": "low|medium|high"
-}}
-"""
-
-    response = client.messages.create(
-        model=ANTHROPIC_MODEL,
-        max_tokens=300,
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
+def output_cache_key(row, sport, packed=False):
+    return ai_output_cache.cache_key(
+        sport, workout_data(row, sport), age_at_workout(row.workout_date), athlete_gender, ANTHROPIC_MODEL,
+        packed,
     )
 
-    content = response.content[0].text
+def build_prompt(row, sport):
+    data = workout_data(row, sport)
 
+    age = age_at_workout(row.workout_date)
+
+    return sport.prompt(json.dumps(data, indent=2), age, athlete_gender)
+
+def parse_ai_response(content):
+    """Model text → (summary, felt_rating, perceived_effort)."""
     try:
         parsed = json.loads(content)
     except json.JSONDecodeError:
         raise RuntimeError(f"Model did not return valid JSON: {content}")
 
-    return (
-        parsed.get("summary"),
-        parsed.get("felt_rating"),
-        parsed.get("perceived_effort")
-    )
+    summary = parsed.get("summary")
+    felt_rating = parsed.get("felt_rating")
+    perceived_effort = parsed.get("perceived_effort")
+    if not (summary and felt_rating and perceived_effort):
+        raise RuntimeError(f"Model response is missing fields: {content}")
+
+    return summary, felt_rating, perceived_effort
+
+def call_ai_for_workout(row, sport):
+    response = create_message(build_prompt(row, sport))
+
+    with span("ai_parse"):
+        return parse_ai_response(response.content[0].text)
+
+# ---------------------------------------------------------
+# PACKED AI CALL (several workouts per request)
+# ---------------------------------------------------------
+def build_packed_prompt(rows, sport):
+    workouts = []
+    for row in rows:
+        data = workout_data(row, sport)
+        data["athlete_age"] = age_at_workout(row.workout_date)
+        workouts.append(data)
+    return sport.packed_prompt(json.dumps(workouts, indent=2), athlete_gender)
+
+def parse_packed_response(content, sport, expected_ids):
+    """Model text → {workout_id: (summary, felt_rating, perceived_effort)}.
+
+    Entries that are malformed, incomplete or for unexpected ids are dropped;
+    the caller retries whatever is missing. Invalid JSON (e.g. a reply cut off
+    at max_tokens) yields an empty dict.
+    """
+    try:
+        parsed = json.loads(content)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, list):
+        return {}
+
+    outputs = {}
+    for item in parsed:
+        if not isinstance(item, dict):
+            continue
+        try:
+            wid = int(item.get(sport.id_column))
+        except (TypeError, ValueError):
+            continue
+        summary = item.get("summary")
+        felt_rating = item.get("felt_rating")
+        perceived_effort = item.get("perceived_effort")
+        if wid in expected_ids and wid not in outputs and summary and felt_rating and perceived_effort:
+            outputs[wid] = (summary, felt_rating, perceived_effort)
+    return outputs
+
+def call_ai_for_pack(rows, sport):
+    """→ ({workout_id: fields}, {workout_id: error}) for one pack of rows."""
+    outputs = {}
+    pending = rows
+    for attempt in range(AI_PACK_RETRIES + 1):
+        ids = {getattr(row, sport.id_column) for row in pending}
+        response = create_message(build_packed_prompt(pending, sport), MAX_TOKENS * len(pending))
+        with span("ai_parse", packed=True):
+            outputs.update(parse_packed_response(response.content[0].text, sport, ids))
+        pending = [row for row in pending if getattr(row, sport.id_column) not in outputs]
+        if not pending:
+            break
+        count("anthropic_pack_retries_total", len(pending))
+        print(f"  packed reply missing {len(pending)} of {len(ids)} {sport.key} workouts")
+    missing = {
+        getattr(row, sport.id_column): RuntimeError("Missing from packed model response")
+        for row in pending
+    }
+    return outputs, missing
+
+def call_ai_for_rows(rows, sport):
+    """One request for one row (call_ai_for_workout) or a pack of rows."""
+    if len(rows) == 1:
+        return {getattr(rows[0], sport.id_column): call_ai_for_workout(rows[0], sport)}, {}
+    return call_ai_for_pack(rows, sport)
 
 # ---------------------------------------------------------
 # FETCH WORKOUTS NEEDING AI FIELDS
 # ---------------------------------------------------------
-def fetch_pending(conn, batch_size=25):
-    query = """
-    SELECT TOP (?) *
-    FROM swim_workouts
-    WHERE notes IS NULL
-       OR felt_rating IS NULL
-       OR perceived_effort IS NULL
-    ORDER BY swim_workout_id;
+# Keyset pagination: each call starts after the last id seen, so a pass always
+# moves forward and ends even when some rows fail. Rows still in backoff or
+# dead-lettered are skipped. With exclude_in_flight, so are rows waiting in an
+# unapplied message batch (bulk mode).
+def fetch_pending(conn, sport, last_id=0, batch_size=25, exclude_in_flight=False):
+    in_flight = """
+      AND NOT EXISTS (
+          SELECT 1
+          FROM ai_generation_batch_items AS b
+          WHERE b.sport = ?
+            AND b.workout_id = w.{id_column}
+            AND b.applied = 0
+      )""".format(id_column=sport.id_column) if exclude_in_flight else ""
+    query = f"""
+    SELECT TOP (?) w.*
+    FROM {sport.table} AS w
+    LEFT JOIN {sport.attempts_table} AS a
+        ON a.{sport.id_column} = w.{sport.id_column}
+    WHERE w.{sport.id_column} > ?
+      AND (w.notes IS NULL
+           OR w.felt_rating IS NULL
+           OR w.perceived_effort IS NULL)
+      AND (a.next_attempt_at IS NULL OR a.next_attempt_at <= SYSUTCDATETIME())
+      AND NOT EXISTS (
+          SELECT 1
+          FROM {sport.dead_letter_table} AS d
+          WHERE d.{sport.id_column} = w.{sport.id_column}
+      ){in_flight}
+    ORDER BY w.{sport.id_column};
     """
-    cur = conn.cursor()
-    cur.execute(query, batch_size)
-    rows = cur.fetchall()
-    cur.close()
+    params = (batch_size, last_id) + ((sport.key,) if exclude_in_flight else ())
+    with span("sql_fetch", sport=sport.key) as s:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        cur.close()
+        s.rows = len(rows)
     return rows
 
 # ---------------------------------------------------------
-# UPDATE WORKOUT
+# UPDATE WORKOUTS (one round trip + one commit per group)
 # ---------------------------------------------------------
-def update_workout(conn, workout_id, summary, felt_rating, perceived_effort):
-    query = """
-    UPDATE swim_workouts
+def update_workouts(conn, sport, results):
+    """results: list of (workout_id, summary, felt_rating, perceived_effort)."""
+    if not results:
+        return
+    query = f"""
+    UPDATE {sport.table}
     SET
         notes = ?,
         felt_rating = ?,
         perceived_effort = ?
-    WHERE swim_workout_id = ?;
+    WHERE {sport.id_column} = ?;
+    """
+    cur = conn.cursor()
+    cur.fast_executemany = True
+    with span("sql_write", sport=sport.key, table=sport.table) as s:
+        s.rows = len(results)
+        cur.executemany(query, [
+            (summary, felt_rating, perceived_effort, wid)
+            for wid, summary, felt_rating, perceived_effort in results
+        ])
+        cur.executemany(
+            f"DELETE FROM {sport.attempts_table} WHERE {sport.id_column} = ?;",
+            [(wid,) for wid, *_ in results]
+        )
+    with span("sql_commit", sport=sport.key):
+        conn.commit()
+    cur.close()
+
+def write_results(conn, sport, results, cache_keys=None, packed_ids=()):
+    """Write a group to SQL. With cache_keys ({workout_id: key}) the fresh
+    outputs are also cached; packed_ids are the rows answered by a packed prompt."""
+    update_workouts(conn, sport, results)
+    if cache_keys:
+        for packed in (False, True):
+            ai_output_cache.store(conn, sport, ANTHROPIC_MODEL, [
+                (cache_keys[wid], *fields) for wid, *fields in results
+                if wid in cache_keys and (wid in packed_ids) == packed
+            ], packed)
+
+# ---------------------------------------------------------
+# RECORD FAILURES (attempt count, backoff, dead letter)
+# ---------------------------------------------------------
+def record_failures(conn, sport, failures):
+    """failures: list of (workout_id, error message)."""
+    if not failures:
+        return
+    attempt_query = f"""
+    MERGE {sport.attempts_table} AS t
+    USING (SELECT ? AS {sport.id_column}, ? AS last_error) AS s
+        ON t.{sport.id_column} = s.{sport.id_column}
+    WHEN MATCHED THEN UPDATE SET
+        attempts = t.attempts + 1,
+        last_error = s.last_error,
+        last_attempt_at = SYSUTCDATETIME(),
+        next_attempt_at = DATEADD(
+            SECOND,
+            CASE WHEN t.attempts >= 20 THEN ?
+                 ELSE IIF(? * POWER(2, t.attempts) > ?, ?, ? * POWER(2, t.attempts))
+            END,
+            SYSUTCDATETIME())
+    WHEN NOT MATCHED THEN
+        INSERT ({sport.id_column}, attempts, last_error, last_attempt_at, next_attempt_at)
+        VALUES (s.{sport.id_column}, 1, s.last_error, SYSUTCDATETIME(),
+                DATEADD(SECOND, ?, SYSUTCDATETIME()));
+    """
+    base, cap = AI_RETRY_BASE_SECONDS, AI_RETRY_MAX_SECONDS
+    dead_letter_query = f"""
+    INSERT INTO {sport.dead_letter_table} ({sport.id_column}, attempts, last_error)
+    SELECT a.{sport.id_column}, a.attempts, a.last_error
+    FROM {sport.attempts_table} AS a
+    WHERE a.{sport.id_column} = ?
+      AND a.attempts >= ?
+      AND NOT EXISTS (
+          SELECT 1
+          FROM {sport.dead_letter_table} AS d
+          WHERE d.{sport.id_column} = a.{sport.id_column}
+      );
+    """
+    count("ai_rows_total", len(failures), sport=sport.key, outcome="failed")
+    cur = conn.cursor()
+    with span("sql_write", sport=sport.key, table=sport.attempts_table) as s:
+        s.rows = len(failures)
+        cur.executemany(attempt_query, [
+            (wid, str(error), cap, base, cap, cap, base, base)
+            for wid, error in failures
+        ])
+        cur.executemany(dead_letter_query, [(wid, AI_MAX_ATTEMPTS) for wid, _ in failures])
+    with span("sql_commit", sport=sport.key):
+        conn.commit()
+    cur.close()
+
+# ---------------------------------------------------------
+# OUTPUT CACHE
+# ---------------------------------------------------------
+def fill_from_cache(conn, sport, rows):
+    """Write cached outputs for rows whose prompt inputs were seen before
+    (e.g. after a reload), from either prompt variant. Returns (rows still
+    needing the model, {workout_id: single-prompt cache key})."""
+    if not AI_OUTPUT_CACHE_ENABLED:
+        return rows, {}
+    keys = {getattr(row, sport.id_column): output_cache_key(row, sport) for row in rows}
+    packed_keys = {getattr(row, sport.id_column): output_cache_key(row, sport, packed=True) for row in rows}
+    cached = ai_output_cache.lookup(conn, [*keys.values(), *packed_keys.values()])
+    results = [
+        (wid, *cached.get(key, cached.get(packed_keys[wid])))
+        for wid, key in keys.items() if key in cached or packed_keys[wid] in cached
+    ]
+    if results:
+        count("ai_rows_total", len(results), sport=sport.key, outcome="cached")
+        print(f"  {len(results)} {sport.key} workouts filled from the AI output cache")
+        write_results(conn, sport, results)
+        hit_ids = {wid for wid, *_ in results}
+        rows = [row for row in rows if getattr(row, sport.id_column) not in hit_ids]
+    return rows, keys
+
+# ---------------------------------------------------------
+# BULK MODE (Message Batches)
+# ---------------------------------------------------------
+# --bulk submits pending workouts as Anthropic message batches (half price,
+# separate rate limits, results within 24h) instead of one request each.
+# Each batch id and its workout ids are saved (sql/12_ai_generation_batches.sql)
+# right after submission, so a crashed run resumes by polling the open batches
+# and applying only the items not applied yet.
+AI_BATCH_MAX_REQUESTS = int(os.getenv("AI_BATCH_MAX_REQUESTS", "10000"))
+AI_BATCH_POLL_SECONDS = float(os.getenv("AI_BATCH_POLL_SECONDS", "60"))
+AI_BATCH_WRITE_SIZE = int(os.getenv("AI_BATCH_WRITE_SIZE", "500"))
+
+# Polling and result downloads are read-only, so the SDK may retry them.
+# Batch creation stays on the no-retry client: a retried create could submit twice.
+batch_reader = client.with_options(max_retries=AI_MAX_RETRIES)
+
+# A 'submitting' row younger than this may still be waiting on its
+# batches.create call (in this or another run) and is left alone. It is also
+# the clock-skew allowance when matching rows to batches by creation time.
+BATCH_SUBMIT_GRACE_MINUTES = 10
+
+def set_batch_id(conn, local_id, batch_id):
+    """Swap a batch's local placeholder id for the API's id and mark it in progress."""
+    cur = conn.cursor()
+    cur.execute("UPDATE ai_generation_batch_items SET batch_id = ? WHERE batch_id = ?;", batch_id, local_id)
+    cur.execute("""
+        UPDATE ai_generation_batches
+        SET batch_id = ?, status = 'in_progress'
+        WHERE batch_id = ?;
+    """, batch_id, local_id)
+    conn.commit()
+    cur.close()
+
+def drop_batch(conn, local_id):
+    """Forget a batch that was never created; its workouts become pending again."""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM ai_generation_batch_items WHERE batch_id = ?;", local_id)
+    cur.execute("DELETE FROM ai_generation_batches WHERE batch_id = ?;", local_id)
+    conn.commit()
+    cur.close()
+
+def submit_batch(conn, sport, rows, keys):
+    """Create one message batch for rows and record it. Returns the batch id.
+
+    The batch and its items are committed under a local id (status
+    'submitting') before batches.create is called, so a crash between the
+    two leaves a record that reconcile_submitting() resolves instead of a
+    paid-for batch nobody applies.
     """
+    requests = [
+        {
+            "custom_id": f"{sport.key}-{getattr(row, sport.id_column)}",
+            "params": message_params(build_prompt(row, sport)),
+        }
+        for row in rows
+    ]
+    local_id = f"local-{uuid.uuid4().hex}"
     cur = conn.cursor()
-    cur.execute(query, (summary, felt_rating, perceived_effort, workout_id))
+    cur.execute("""
+        INSERT INTO ai_generation_batches (batch_id, sport, model, request_count, status)
+        VALUES (?, ?, ?, ?, 'submitting');
+    """, (local_id, sport.key, ANTHROPIC_MODEL, len(requests)))
+    cur.fast_executemany = True
+    cur.executemany("""
+        INSERT INTO ai_generation_batch_items (batch_id, sport, workout_id, cache_key)
+        VALUES (?, ?, ?, CAST(? AS BINARY(32)));
+    """, [
+        (local_id, sport.key, wid, keys.get(wid))
+        for wid in (getattr(row, sport.id_column) for row in rows)
+    ])
     conn.commit()
     cur.close()
 
+    try:
+        with span("anthropic_batch_create", sport=sport.key) as s:
+            s.rows = len(requests)
+            batch = client.messages.batches.create(requests=requests)
+    except anthropic.APIStatusError:
+        # The API answered with an error, so no batch exists.
+        drop_batch(conn, local_id)
+        raise
+    log_event("batch_submitted", sport=sport.key, batch_id=batch.id, requests=len(requests))
+    set_batch_id(conn, local_id, batch.id)
+    return batch.id
+
+def reconcile_submitting(conn, sport):
+    """Resolve batches an earlier run left in 'submitting'.
+
+    Such a batch may or may not exist. Unrecorded batches created around
+    the time the row was written, with the same request count, are matched
+    oldest first; a row with no match was never created and is dropped.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT batch_id, request_count, submitted_at
+        FROM ai_generation_batches
+        WHERE sport = ? AND status = 'submitting'
+          AND submitted_at < DATEADD(MINUTE, -?, SYSUTCDATETIME())
+        ORDER BY submitted_at;
+    """, sport.key, BATCH_SUBMIT_GRACE_MINUTES)
+    stale = cur.fetchall()
+    if not stale:
+        cur.close()
+        return
+    cur.execute("SELECT batch_id FROM ai_generation_batches;")
+    known = {row[0] for row in cur.fetchall()}
+    cur.close()
+
+    grace = timedelta(minutes=BATCH_SUBMIT_GRACE_MINUTES)
+    since = stale[0][2].replace(tzinfo=timezone.utc) - grace
+    unrecorded = []
+    for batch in batch_reader.messages.batches.list(limit=100):   # newest first
+        if batch.created_at < since:
+            break
+        if batch.id not in known:
+            unrecorded.append(batch)
+    unrecorded.reverse()
+
+    for local_id, request_count, submitted_at in stale:
+        submitted_at = submitted_at.replace(tzinfo=timezone.utc)
+        match = next((
+            b for b in unrecorded
+            if submitted_at - grace <= b.created_at <= submitted_at + grace
+            and sum(dict(b.request_counts).values()) == request_count
+        ), None)
+        if match is None:
+            drop_batch(conn, local_id)
+            log_event("batch_dropped", sport=sport.key, batch_id=local_id)
+        else:
+            unrecorded.remove(match)
+            set_batch_id(conn, local_id, match.id)
+            log_event("batch_recovered", sport=sport.key, batch_id=match.id)
+            print(f"  recovered batch {match.id} left unrecorded by an earlier run")
+
+def open_batches(conn, sport):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT batch_id
+        FROM ai_generation_batches
+        WHERE sport = ? AND status IN ('in_progress', 'ended')
+        ORDER BY submitted_at;
+    """, sport.key)
+    batch_ids = [row[0] for row in cur.fetchall()]
+    cur.close()
+    return batch_ids
+
+def wait_for_batch(conn, batch_id):
+    while True:
+        batch = batch_reader.messages.batches.retrieve(batch_id)
+        if batch.processing_status == "ended":
+            break
+        counts = batch.request_counts
+        log_event("batch_progress", batch_id=batch_id, processing=counts.processing,
+                  succeeded=counts.succeeded, errored=counts.errored)
+        print(f"  batch {batch_id}: {counts.processing} processing, "
+              f"{counts.succeeded} succeeded, {counts.errored} errored")
+        with span("batch_poll_wait"):
+            time.sleep(AI_BATCH_POLL_SECONDS)
+
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE ai_generation_batches
+        SET status = 'ended', ended_at = SYSUTCDATETIME()
+        WHERE batch_id = ? AND status = 'in_progress';
+    """, batch_id)
+    conn.commit()
+    cur.close()
+
+def mark_applied(conn, batch_id, workout_ids):
+    if not workout_ids:
+        return
+    cur = conn.cursor()
+    cur.fast_executemany = True
+    cur.executemany("""
+        UPDATE ai_generation_batch_items
+        SET applied = 1
+        WHERE batch_id = ? AND workout_id = ?;
+    """, [(batch_id, wid) for wid in workout_ids])
+    conn.commit()
+    cur.close()
+
+def apply_batch(conn, sport, batch_id):
+    """Stream an ended batch's results into SQL, AI_BATCH_WRITE_SIZE rows per write."""
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT i.workout_id, i.cache_key
+        FROM ai_generation_batch_items AS i
+        JOIN {sport.table} AS w
+            ON w.{sport.id_column} = i.workout_id
+        WHERE i.batch_id = ? AND i.applied = 0;
+    """, batch_id)
+    open_items = cur.fetchall()
+    cur.close()
+
+    open_ids = {wid for wid, _ in open_items}
+    keys = {wid: bytes(key) for wid, key in open_items if key is not None}
+    applied = failed = 0
+    results, failures = [], []
+
+    def flush():
+        write_results(conn, sport, results, keys)
+        record_failures(conn, sport, failures)
+        mark_applied(conn, batch_id, [wid for wid, *_ in results] + [wid for wid, _ in failures])
+        results.clear()
+        failures.clear()
+
+    for entry in batch_reader.messages.batches.results(batch_id):
+        wid = int(entry.custom_id.rpartition("-")[2])
+        if wid not in open_ids:
+            continue
+        result = entry.result
+        if result.type == "succeeded":
+            count("anthropic_tokens_total", result.message.usage.input_tokens, direction="input", batch=True)
+            count("anthropic_tokens_total", result.message.usage.output_tokens, direction="output", batch=True)
+            try:
+                results.append((wid, *parse_ai_response(result.message.content[0].text)))
+                applied += 1
+                count("ai_rows_total", sport=sport.key, outcome="generated")
+            except RuntimeError as e:
+                failures.append((wid, e))
+                failed += 1
+        else:
+            # errored / canceled / expired: normal per-row backoff and dead letter.
+            detail = getattr(getattr(getattr(result, "error", None), "error", None), "message", None)
+            failures.append((wid, f"batch result {result.type}" + (f": {detail}" if detail else "")))
+            failed += 1
+        if len(results) + len(failures) >= AI_BATCH_WRITE_SIZE:
+            flush()
+    flush()
+
+    cur = conn.cursor()
+    cur.execute("UPDATE ai_generation_batch_items SET applied = 1 WHERE batch_id = ?;", batch_id)
+    cur.execute("""
+        UPDATE ai_generation_batches
+        SET status = 'applied', applied_at = SYSUTCDATETIME()
+        WHERE batch_id = ?;
+    """, batch_id)
+    conn.commit()
+    cur.close()
+    log_event("batch_applied", sport=sport.key, batch_id=batch_id, applied=applied, failed=failed)
+    print(f"  batch {batch_id}: applied {applied}, failed {failed}")
+
+def bulk_generate_for_sport(conn, sport):
+    """Submit every pending workout not already in flight, then apply all open batches."""
+    reconcile_submitting(conn, sport)
+    last_id = 0
+    while True:
+        rows = fetch_pending(conn, sport, last_id, AI_BATCH_MAX_REQUESTS, exclude_in_flight=True)
+        if not rows:
+            break
+        last_id = getattr(rows[-1], sport.id_column)
+        rows, keys = fill_from_cache(conn, sport, rows)
+        if rows:
+            batch_id = submit_batch(conn, sport, rows, keys)
+            print(f"Submitted batch {batch_id} with {len(rows)} {sport.key} workouts")
+
+    # Includes batches left open by an earlier, interrupted run.
+    for batch_id in open_batches(conn, sport):
+        wait_for_batch(conn, batch_id)
+        apply_batch(conn, sport, batch_id)
+    print(f"Bulk pass complete for {sport.key} workouts.")
+
 # ---------------------------------------------------------
 # MAIN PIPELINE
 # ---------------------------------------------------------
-def main():
-    conn = get_connection()
+def process_rows(conn, pool, sport, rows):
+    """Generate, write and record failures for one fetched group of rows."""
+    with span("ai_group", sport=sport.key) as s:
+        s.rows = len(rows)
+        _process_rows(conn, pool, sport, rows)
 
-    try:
-        while True:
-            rows = fetch_pending(conn)
+def _process_rows(conn, pool, sport, rows):
+    rows, keys = fill_from_cache(conn, sport, rows)
+    results = []
+    failures = []
+
+    pack_size = max(AI_PACK_SIZE, 1)
+    packs = [rows[i:i + pack_size] for i in range(0, len(rows), pack_size)]
+    # Packs of one go out with the single-workout prompt (call_ai_for_rows).
+    packed_rows = [row for pack in packs if len(pack) > 1 for row in pack]
+    packed_ids = {getattr(row, sport.id_column) for row in packed_rows}
+    if keys:
+        keys.update((getattr(row, sport.id_column), output_cache_key(row, sport, packed=True)) for row in packed_rows)
+    futures = {
+        pool.submit(call_ai_for_rows, pack, sport): [getattr(row, sport.id_column) for row in pack]
+        for pack in packs
+    }
+
+    for future in as_completed(futures):
+        try:
+            outputs, missing = future.result()
+        except Exception as e:
+            outputs, missing = {}, {wid: e for wid in futures[future]}
+        count("ai_rows_total", len(outputs), sport=sport.key, outcome="generated")
+
+        for wid, e in missing.items():
+            print(f"  ERROR on {sport.id_column}={wid}: {e}")
+            failures.append((wid, e))
 
-            if not rows:
-                print("All swim workouts have AI fields.")
-                break
+        for wid, (summary, felt_rating, perceived_effort) in outputs.items():
+            print(f"Processed {sport.id_column}={wid}")
+            print(f"  summary={summary}")
+            print(f"  felt_rating={felt_rating}, perceived_effort={perceived_effort}")
 
-            for row in rows:
-                wid = row.swim_workout_id
-                print(f"Processing swim_workout_id={wid}...")
+            results.append((wid, summary, felt_rating, perceived_effort))
+            if len(results) >= AI_WRITE_BATCH_SIZE:
+                write_results(conn, sport, results, keys, packed_ids)
+                results = []
 
-                try:
-                    summary, felt_rating, perceived_effort = call_ai_for_workout(row)
+    if results:
+        write_results(conn, sport, results, keys, packed_ids)
+    record_failures(conn, sport, failures)
 
-                    print(f"  summary={summary}")
-                    print(f"  felt_rating={felt_rating}, perceived_effort={perceived_effort}")
+def generate_for_sport(conn, pool, sport):
+    """One forward pass over a sport's pending workouts."""
+    last_id = 0
+    while True:
+        rows = fetch_pending(conn, sport, last_id, AI_FETCH_BATCH_SIZE)
 
-                    update_workout(conn, wid, summary, felt_rating, perceived_effort)
+        if not rows:
+            print(f"Pass complete: no more {sport.key} workouts ready for AI fields.")
+            break
 
-                except Exception as e:
-                    print(f"  ERROR on swim_workout_id={wid}: {e}")
+        last_id = getattr(rows[-1], sport.id_column)
+        process_rows(conn, pool, sport, rows)
+        log_event("ai_group_done", sport=sport.key, rows=len(rows), last_id=last_id)
 
-    finally:
-        conn.close()
+def main(sports=None, bulk=False):
+    with pooled_connection() as conn:
+        with ThreadPoolExecutor(max_workers=AI_CONCURRENCY) as pool:
+            for sport in active_sports(conn, sports):
+                if AI_OUTPUT_CACHE_ENABLED:
+                    evicted = ai_output_cache.evict_stale(conn, sport)
+                    if evicted:
+                        print(f"Evicted {evicted} cached {sport.key} outputs from older prompt versions.")
+                if bulk:
+                    bulk_generate_for_sport(conn, sport)
+                else:
+                    generate_for_sport(conn, pool, sport)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate AI summaries for pending workouts.")
+    parser.add_argument("--sport", choices=list(SPORTS), action="append",
+                        help="limit to this sport (repeatable); default: SPORTS or every sport")
+    parser.add_argument("--bulk", action="store_true",
+                        help="submit pending workouts as message batches and apply the results (resumable)")
+    parser.add_argument("--profile", action="store_true", help="run under cProfile (see instrumentation.py)")
+    args = parser.parse_args()
+    with session(args.profile):
+        main([get_sport(key) for key in args.sport] if args.sport else None, bulk=args.bulk)
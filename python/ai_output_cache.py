@@ -0,0 +1,134 @@
+"""
+AI Output Cache
+---------------
+Persistent cache of generated AI fields (summary, felt_rating,
+perceived_effort) in the ai_output_cache table (sql/11_ai_output_cache.sql).
+
+The key is a SHA-256 of the canonicalized prompt inputs: sport, workout
+metrics (without the row id, which changes on reload), athlete age and
+gender, the sport's prompt_version and the model. Outputs of packed
+requests (several workouts per prompt) also key on packed_prompt_version,
+since a different prompt produced them. Reloading a table that reproduces
+identical metrics therefore repopulates the AI fields without any API
+calls. Entries written for an older prompt_version, and packed entries
+written for an older packed_prompt_version, are evicted when 04_b starts a
+pass for that sport.
+"""
+
+import hashlib
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+AI_OUTPUT_CACHE_ENABLED = os.getenv("AI_OUTPUT_CACHE_ENABLED", "1") == "1"
+
+LOOKUP_CHUNK = 500   # stays under SQL Server's 2100 parameter limit
+
+# ------------------------------------------------------------
+# Keys
+# ------------------------------------------------------------
+
+def canonical_value(value):
+    """Stable representation for hashing: ints stay ints, floats drop
+    representation noise, dates become ISO strings."""
+    if isinstance(value, (float, Decimal)):
+        value = float(value)
+        return int(value) if value.is_integer() else float(f"{value:.10g}")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def cache_key(sport, data, age, gender, model, packed=False):
+    """32-byte key for one workout's prompt inputs. `data` is the metric dict sent to the model;
+    `packed` selects the key for an output of the packed prompt."""
+    payload = {
+        "sport": sport.key,
+        "metrics": {
+            column: canonical_value(value)
+            for column, value in data.items()
+            if column != sport.id_column
+        },
+        "age": age,
+        "gender": gender,
+        "prompt_version": sport.prompt_version,
+        "model": model,
+    }
+    if packed:
+        payload["packed_prompt_version"] = sport.packed_prompt_version
+    text = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+# ------------------------------------------------------------
+# SQL access
+# ------------------------------------------------------------
+
+def lookup(conn, keys):
+    """{key: (summary, felt_rating, perceived_effort)} for the cached keys; marks them as hit."""
+    keys = list(dict.fromkeys(keys))
+    found = {}
+    cur = conn.cursor()
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        chunk = keys[start:start + LOOKUP_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        cur.execute(f"""
+            SELECT cache_key, summary, felt_rating, perceived_effort
+            FROM ai_output_cache
+            WHERE cache_key IN ({placeholders});
+        """, chunk)
+        for key, summary, felt_rating, perceived_effort in cur.fetchall():
+            found[bytes(key)] = (summary, felt_rating, perceived_effort)
+    if found:
+        cur.fast_executemany = True
+        cur.executemany("""
+            UPDATE ai_output_cache
+            SET hits = hits + 1, last_hit_at = SYSUTCDATETIME()
+            WHERE cache_key = ?;
+        """, [(key,) for key in found])
+        conn.commit()
+    cur.close()
+    return found
+
+
+def store(conn, sport, model, entries, packed=False):
+    """entries: list of (key, summary, felt_rating, perceived_effort). Existing keys are kept.
+
+    `packed` marks outputs of the packed prompt (keys from cache_key(..., packed=True)).
+    """
+    if not entries:
+        return
+    packed_version = sport.packed_prompt_version if packed else None
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO ai_output_cache
+            (cache_key, sport, prompt_variant, prompt_version, packed_prompt_version, model,
+             summary, felt_rating, perceived_effort)
+        SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM ai_output_cache WHERE cache_key = ?);
+    """, [
+        (key, sport.key, "packed" if packed else "single", sport.prompt_version, packed_version, model,
+         summary, felt_rating, perceived_effort, key)
+        for key, summary, felt_rating, perceived_effort in entries
+    ])
+    conn.commit()
+    cur.close()
+
+
+def evict_stale(conn, sport):
+    """Drop a sport's entries written for another prompt_version, and packed
+    entries written for another packed_prompt_version (their keys hash both).
+    Returns rows deleted."""
+    cur = conn.cursor()
+    cur.execute("""
+        DELETE FROM ai_output_cache
+        WHERE sport = ?
+          AND (prompt_version <> ?
+               OR (prompt_variant = 'packed' AND ISNULL(packed_prompt_version, -1) <> ?));
+    """, (sport.key, sport.prompt_version, sport.packed_prompt_version))
+    deleted = cur.rowcount
+    conn.commit()
+    cur.close()
+    return deleted
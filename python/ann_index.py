@@ -0,0 +1,251 @@
+"""
+IVF-Flat Approximate Nearest-Neighbour Index
+--------------------------------------------
+
+Pure NumPy replacement for the SQL Server 2025 HNSW VECTOR_SEARCH path
+(parked under sql/for_when_sql_server_2025_ai_features_work).
+
+Vectors are clustered with spherical k-means into `nlist` inverted lists.
+A query scores the centroids, then only the rows in the `nprobe` closest
+lists. Raising nprobe trades latency for recall; nprobe == nlist is exact.
+
+IVFIndex extends VectorIndex, so SQL load/refresh, incremental inserts and
+removals behave the same; new rows are assigned to their nearest centroid
+and the centroids are retrained once the index has grown RETRAIN_GROWTH
+times past the size it was trained on.
+
+Filtered searches probe as usual and drop non-matching candidates; when the
+filter is selective enough (FILTER_EXACT_ROWS or fewer matches) or the
+probed lists hold too few matches, the matching rows are scored exactly.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+from vector_index import VectorIndex, EMBED_DIM, normalize, normalize_rows, top_k
+from search_filters import FILTER_COLUMNS
+
+MIN_TRAIN_ROWS = 1024
+RETRAIN_GROWTH = 4.0
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_CHUNK_ROWS = 65536
+FILTER_EXACT_ROWS = 20000
+
+# ------------------------------------------------------------
+# Spherical k-means
+# ------------------------------------------------------------
+
+def assign_to_centroids(matrix, centroids):
+    """Nearest (max inner product) centroid per float32 row."""
+    return np.argmax(matrix @ centroids.T, axis=1).astype(np.int32)
+
+
+def spherical_kmeans(matrix, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(matrix), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = matrix if sample_size == len(matrix) else matrix[rng.choice(len(matrix), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = assign_to_centroids(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        nonempty = counts > 0
+        sums = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+        centroids[nonempty] = sums
+        # Re-seed empty lists from random sample rows.
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        normalize_rows(centroids)
+
+    return centroids
+
+
+# ------------------------------------------------------------
+# IVF index
+# ------------------------------------------------------------
+
+class IVFIndex(VectorIndex):
+
+    def __init__(self, dim=EMBED_DIM, nlist=None, nprobe=8, index_format="float32", rerank_source=None,
+                 sports=None, model_tag=None):
+        self.nlist_setting = nlist
+        self.nprobe = nprobe
+        super().__init__(dim, index_format, rerank_source, sports=sports, model_tag=model_tag)
+
+    def _reset(self):
+        super()._reset()
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.trained_size = 0
+        self._lists = None
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    # --------------------------------------------------------
+    # Training / list maintenance
+    # --------------------------------------------------------
+
+    def _assign(self, rows):
+        """Nearest centroid for the given rows, dequantizing one chunk at a time."""
+        labels = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), ASSIGN_CHUNK_ROWS):
+            chunk = rows[start:start + ASSIGN_CHUNK_ROWS]
+            labels[start:start + len(chunk)] = assign_to_centroids(self.dense_rows(chunk), self.centroids)
+        return labels
+
+    def train(self):
+        with self.lock:
+            nlist = self.nlist_setting or max(1, int(np.sqrt(len(self))))
+            nlist = min(nlist, len(self))
+            rng = np.random.default_rng(0)
+            sample_size = min(len(self), nlist * KMEANS_SAMPLE_PER_LIST)
+            sample = np.sort(rng.choice(len(self), sample_size, replace=False))
+            self.centroids = spherical_kmeans(self.dense_rows(sample), nlist)
+            self.assignments = self._assign(np.arange(len(self)))
+            self.trained_size = len(self)
+            self._lists = None
+
+    def _maybe_train(self):
+        if not self.trained:
+            if len(self) >= MIN_TRAIN_ROWS:
+                self.train()
+        elif len(self) > self.trained_size * RETRAIN_GROWTH:
+            self.train()
+
+    def _inverted_lists(self):
+        """(row order sorted by list, start offset per list), cached until mutation."""
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    def upsert(self, ids, vectors, notes, metadata=None):
+        with self.lock:
+            written = super().upsert(ids, vectors, notes, metadata)
+            if len(self.assignments) < len(self):
+                grown = np.full(len(self), -1, dtype=np.int32)
+                grown[:len(self.assignments)] = self.assignments
+                self.assignments = grown
+            if self.trained and len(written):
+                self.assignments[written] = self._assign(written)
+            self._lists = None
+            self._maybe_train()
+            return written
+
+    def _compact(self, keep):
+        super()._compact(keep)
+        self.assignments = self.assignments[keep]
+        self._lists = None
+
+    # --------------------------------------------------------
+    # Search
+    # --------------------------------------------------------
+
+    def search(self, query_vec, top_n=5, rerank=0, filters=None, nprobe=None):
+        q = normalize(query_vec)
+        return self._rerank(self._search(q, self._depth(top_n, rerank), filters, nprobe), q, top_n, rerank)
+
+    def _search(self, q, depth, filters, nprobe=None):
+        with self.lock:
+            if not self.trained:
+                return super()._search(q, depth, filters)
+
+            matching = self.filter_rows(filters)
+            if matching is not None and len(matching) <= max(FILTER_EXACT_ROWS, depth):
+                return super()._search(q, depth, filters)
+
+            nprobe = min(nprobe or self.nprobe, len(self.centroids))
+            probe = top_k(self.centroids @ q, nprobe)
+
+            order, bounds = self._inverted_lists()
+            candidates = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probe])
+            if matching is not None:
+                candidates = candidates[np.isin(candidates, matching, assume_unique=True)]
+                if len(candidates) < depth:
+                    return super()._search(q, depth, filters)
+
+            return self._results(candidates, self.score_rows(candidates, q), depth)
+
+    def search_many(self, query_vecs, top_n=5, rerank=0, filters=None, nprobe=None):
+        Q = normalize_rows(np.array(query_vecs, dtype=np.float32, ndmin=2))
+        candidates = self._search_many(Q, self._depth(top_n, rerank), filters, nprobe)
+        return [self._rerank(results, q, top_n, rerank) for results, q in zip(candidates, Q)]
+
+    def _search_many(self, Q, depth, filters, nprobe=None):
+        with self.lock:
+            if not self.trained:
+                return super()._search_many(Q, depth, filters)
+            return [self._search(q, depth, filters, nprobe) for q in Q]
+
+    # --------------------------------------------------------
+    # Persistence
+    # --------------------------------------------------------
+
+    def save(self, path):
+        # Same-directory temp file then os.replace, so a crash mid-write never
+        # truncates the live file; writing to a handle also stops np.savez
+        # from appending ".npz" to the path.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, self.lock:
+                np.savez(
+                    f,
+                    ids=self.ids,
+                    matrix=self.matrix,
+                    scales=self.scales,
+                    notes=np.array([n or "" for n in self.notes], dtype=str),
+                    **{
+                        f"column_{name}": (values if FILTER_COLUMNS[name] == "range"
+                                           else np.array([v or "" for v in values], dtype=str))
+                        for name, values in self.columns.items()
+                    },
+                    centroids=self.centroids if self.trained else np.empty((0, self.dim), np.float32),
+                    assignments=self.assignments,
+                    trained_size=np.int64(self.trained_size),
+                    watermark=np.frombuffer(self.watermark or b"", dtype=np.uint8),
+                    settings=np.array([self.nlist_setting or 0, self.nprobe], dtype=np.int64),
+                    index_format=np.array(self.index_format),
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @classmethod
+    def from_file(cls, path, rerank_source=None, sports=None, model_tag=None):
+        with np.load(path) as data:
+            nlist, nprobe = (int(x) for x in data["settings"])
+            index = cls(
+                dim=data["matrix"].shape[1], nlist=nlist or None, nprobe=nprobe,
+                index_format=str(data["index_format"]) if "index_format" in data else "float32",
+                rerank_source=rerank_source, sports=sports, model_tag=model_tag,
+            )
+            expected = ["index_format", "scales", *(f"column_{name}" for name in FILTER_COLUMNS)]
+            if any(key not in data for key in expected):
+                # Saved before quantization or metadata filters existed; the
+                # empty index loads from SQL on its first refresh.
+                return index
+            index.ids = data["ids"]
+            index.matrix = np.ascontiguousarray(data["matrix"])
+            index.scales = data["scales"]
+            index.notes = data["notes"].tolist()
+            for name, kind in FILTER_COLUMNS.items():
+                values = data[f"column_{name}"]
+                if kind == "category":
+                    values = np.array([v or None for v in values.tolist()], dtype=object)
+                index.columns[name] = values
+            index.positions = {int(i): pos for pos, i in enumerate(index.ids)}
+            centroids = data["centroids"]
+            index.centroids = centroids if len(centroids) else None
+            index.assignments = data["assignments"]
+            index.trained_size = int(data["trained_size"])
+            index.watermark = data["watermark"].tobytes() or None
+        return index
@@ -0,0 +1,362 @@
+"""
+Offline Benchmark Suite
+-----------------------
+Measures the hot paths against local stand-ins, so runs are repeatable and
+cost nothing:
+
+    search.*               p50/p99 latency of the in-memory indexes
+                           (exact, exact + filters, batched, IVF, BM25, hybrid)
+    pipeline.embeddings    rows/sec of python_regenerate_embeddings_openai
+                           against tests/fake_openai_server.py
+    pipeline.summaries.*   rows/sec of 04_b's generation loop (single and
+                           packed prompts) against tests/fake_anthropic_server.py
+
+Workouts, vectors and the swim_workouts table come from benchmarks/synthetic.py
+(SQLite fixture, no SQL Server needed). Pipeline benchmarks run on at most
+--pipeline-max-rows rows per size, since their cost is per row.
+
+Results are written as JSON (--output). With --baseline, each result is
+compared to the same benchmark/size in an earlier file and the run exits
+with status 1 when latency rises or throughput falls by more than
+--tolerance.
+
+The default sizes are 1k/10k/100k; add 1000000 to --sizes for the full
+sweep (about 6 GB of RAM at the default 256 dimensions).
+
+Usage (from python/):
+    python benchmarks/run_benchmarks.py --sizes 1000,10000
+    python benchmarks/run_benchmarks.py --sizes 1000,10000,100000,1000000 --only search
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/baseline.json
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "tests"))
+
+from synthetic import create_fixture, synthetic_vectors, synthetic_workouts, NOTE_PHRASES
+
+DEFAULT_SIZES = "1000,10000,100000"
+RESULTS_DIR = os.path.join(HERE, "results")
+
+# Lower is better for these metrics, higher for the rest.
+LATENCY_METRICS = ("p50_ms", "p99_ms", "mean_ms", "build_seconds")
+THROUGHPUT_METRICS = ("rows_per_sec", "qps")
+
+SEARCH_FILTERS = {"min_avg_hr": 140, "activity_type": "Pool Swim"}
+
+# ------------------------------------------------------------
+# Fake backends
+# ------------------------------------------------------------
+
+def start_server(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def start_fakes(args):
+    """Start both fake APIs on free ports and point the SDKs at them.
+
+    Must run before the pipeline modules are imported: they read their
+    configuration from the environment at import time.
+    """
+    import fake_anthropic_server
+    import fake_openai_server
+
+    openai_url = start_server(fake_openai_server.make_server(
+        port=0, latency_ms=args.embed_latency_ms, rate_limit_rate=args.rate_limit_rate))
+    anthropic_url = start_server(fake_anthropic_server.make_server(
+        port=0, latency_ms=args.ai_latency_ms, rate_limit_rate=args.rate_limit_rate))
+
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "ANTHROPIC_AI_API_KEY": "benchmark",
+        "ANTHROPIC_AI_MODEL": "benchmark-model",
+        "ANTHROPIC_BASE_URL": anthropic_url,
+        "EMBED_DIMENSIONS": str(args.dims),
+        "EMBED_STORAGE_FORMAT": "float32",
+        "AI_OUTPUT_CACHE_ENABLED": "0",
+        "AI_MAX_RETRIES": "20",
+        "AI_CONCURRENCY": str(args.ai_concurrency),
+        "ANTHROPIC_REQUESTS_PER_MINUTE": "0",
+        "ANTHROPIC_INPUT_TOKENS_PER_MINUTE": "0",
+        "ANTHROPIC_OUTPUT_TOKENS_PER_MINUTE": "0",
+        "LEXICAL_INDEX_PATH": "",
+    })
+    os.environ.setdefault("ATHLETE_BIRTHDATE", "1980-01-01")
+    os.environ.setdefault("ATHLETE_GENDER", "female")
+
+# ------------------------------------------------------------
+# Measurement helpers
+# ------------------------------------------------------------
+
+def latency_stats(seconds):
+    ms = np.asarray(seconds) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "qps": round(float(len(ms) / (ms.sum() / 1000.0)), 1),
+    }
+
+
+def time_each(fn, inputs):
+    timings = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def quiet():
+    """The pipelines print per row; keep benchmark output readable."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def recall_at_k(results, truth):
+    hits = sum(len({wid for _, wid, _ in got} & {wid for _, wid, _ in want}) for got, want in zip(results, truth))
+    return round(hits / max(1, sum(len(want) for want in truth)), 4)
+
+# ------------------------------------------------------------
+# Search benchmarks
+# ------------------------------------------------------------
+
+def metadata_tuple(row):
+    from search_filters import FILTER_COLUMNS
+    return tuple("swim" if column == "sport" else row.get(column) for column in FILTER_COLUMNS)
+
+
+def bench_search(size, args):
+    from vector_index import VectorIndex
+    from ann_index import IVFIndex
+    from lexical_index import LexicalIndex
+    from semantic_search import fuse
+
+    ids, notes, titles, metadata = [], [], [], []
+    for row in synthetic_workouts(size, seed=args.seed):
+        ids.append(row["swim_workout_id"])
+        notes.append(row["notes"])
+        titles.append(row["title"])
+        metadata.append(metadata_tuple(row))
+    vectors = synthetic_vectors(size, args.dims, seed=args.seed)
+
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, size, args.queries)
+    queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, args.dims)).astype(np.float32)
+    query_texts = [NOTE_PHRASES[i % len(NOTE_PHRASES)].split(",")[0] for i in range(args.queries)]
+    top_n = args.top_n
+    results = []
+
+    start = time.perf_counter()
+    exact = VectorIndex(dim=args.dims)
+    exact.upsert(ids, vectors, notes, metadata)
+    build = time.perf_counter() - start
+    truth = [exact.search(q, top_n) for q in queries]
+
+    results.append({"benchmark": "search.vector_exact", "rows": size, "build_seconds": round(build, 3),
+                    **latency_stats(time_each(lambda q: exact.search(q, top_n), queries))})
+    results.append({"benchmark": "search.vector_exact_filtered", "rows": size,
+                    **latency_stats(time_each(lambda q: exact.search(q, top_n, filters=SEARCH_FILTERS), queries))})
+
+    start = time.perf_counter()
+    exact.search_many(queries, top_n)
+    batch = time.perf_counter() - start
+    results.append({"benchmark": "search.vector_batch", "rows": size,
+                    "mean_ms": round(batch * 1000 / len(queries), 4), "qps": round(len(queries) / batch, 1)})
+
+    lexical = LexicalIndex()
+    start = time.perf_counter()
+    lexical.upsert(zip(ids, titles, notes))
+    build = time.perf_counter() - start
+    results.append({"benchmark": "search.keyword", "rows": size, "build_seconds": round(build, 3),
+                    **latency_stats(time_each(lambda text: lexical.search(text, top_n), query_texts))})
+
+    depth = max(top_n, args.hybrid_candidates)
+    pairs = list(zip(queries, query_texts))
+    results.append({"benchmark": "search.hybrid", "rows": size, **latency_stats(time_each(
+        lambda pair: fuse(exact.search(pair[0], depth), lexical.search(pair[1], depth), top_n), pairs))})
+    del exact, lexical
+
+    start = time.perf_counter()
+    ivf = IVFIndex(dim=args.dims, nprobe=args.nprobe)
+    ivf.upsert(ids, vectors, notes, metadata)
+    build = time.perf_counter() - start
+    approx = [ivf.search(q, top_n) for q in queries]
+    results.append({"benchmark": "search.ivf", "rows": size, "build_seconds": round(build, 3),
+                    "nprobe": args.nprobe, "recall_at_k": recall_at_k(approx, truth),
+                    **latency_stats(time_each(lambda q: ivf.search(q, top_n), queries))})
+    return results
+
+# ------------------------------------------------------------
+# Pipeline benchmarks
+# ------------------------------------------------------------
+
+def bench_embeddings(size, args):
+    from sports import SWIM
+    regenerate = importlib.import_module("python_regenerate_embeddings_openai")
+
+    conn = create_fixture(size, seed=args.seed)
+    start = time.perf_counter()
+    with quiet():
+        regenerate.regenerate_sport(conn, SWIM, True, regenerate.EMBED_BATCH_SIZE,
+                                    regenerate.EMBED_BATCH_TOKEN_BUDGET)
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return [{"benchmark": "pipeline.embeddings", "rows": size, "seconds": round(elapsed, 3),
+             "rows_per_sec": round(size / elapsed, 1), "batch_size": regenerate.EMBED_BATCH_SIZE}]
+
+
+def bench_summaries(size, args):
+    from sports import SWIM
+    generate = importlib.import_module("04_b_generate_swim_ai_fields_anthropic")
+
+    results = []
+    for pack_size in args.pack_sizes:
+        conn = create_fixture(size, seed=args.seed, with_notes=False)
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM swim_workouts ORDER BY swim_workout_id")
+        rows = cursor.fetchall()
+        generate.AI_PACK_SIZE = pack_size
+        start = time.perf_counter()
+        with quiet(), ThreadPoolExecutor(max_workers=args.ai_concurrency) as pool:
+            for group in range(0, len(rows), generate.AI_FETCH_BATCH_SIZE):
+                generate.process_rows(conn, pool, SWIM, rows[group:group + generate.AI_FETCH_BATCH_SIZE])
+        elapsed = time.perf_counter() - start
+        cursor.execute("SELECT COUNT(*) FROM swim_workouts WHERE notes IS NOT NULL")
+        written = cursor.fetchone()[0]
+        conn.close()
+        results.append({"benchmark": f"pipeline.summaries.pack{pack_size}", "rows": size,
+                        "rows_written": written, "seconds": round(elapsed, 3),
+                        "rows_per_sec": round(size / elapsed, 1)})
+    return results
+
+# ------------------------------------------------------------
+# Baseline comparison
+# ------------------------------------------------------------
+
+def compare(results, baseline, tolerance):
+    """Regression messages for results that are worse than baseline by > tolerance."""
+    previous = {(r["benchmark"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["benchmark"], result["rows"]))
+        if not before:
+            continue
+        for metric in LATENCY_METRICS + THROUGHPUT_METRICS:
+            if metric not in result or not before.get(metric):
+                continue
+            change = (result[metric] - before[metric]) / before[metric]
+            worse = change > tolerance if metric in LATENCY_METRICS else change < -tolerance
+            if worse:
+                regressions.append(
+                    f"{result['benchmark']} @ {result['rows']}: {metric} "
+                    f"{before[metric]} → {result[metric]} ({change:+.0%})"
+                )
+    return regressions
+
+
+def print_result(result):
+    fields = ", ".join(f"{k}={v}" for k, v in result.items() if k not in ("benchmark", "rows"))
+    print(f"  {result['benchmark']:<32} rows={result['rows']:<8} {fields}")
+
+# ------------------------------------------------------------
+# Entry point
+# ------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated workout counts")
+    parser.add_argument("--only", choices=["search", "embeddings", "summaries"], action="append",
+                        help="run only these groups (repeatable)")
+    parser.add_argument("--dims", type=int, default=256, help="embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="queries per search benchmark")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--hybrid-candidates", type=int, default=50)
+    parser.add_argument("--pipeline-max-rows", type=int, default=10000,
+                        help="skip pipeline benchmarks above this size")
+    parser.add_argument("--pack-sizes", default="1,8", help="AI_PACK_SIZE values for pipeline.summaries")
+    parser.add_argument("--ai-concurrency", type=int, default=8)
+    parser.add_argument("--ai-latency-ms", type=float, default=20.0, help="fake messages latency")
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0, help="fake embeddings latency")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of fake API calls → 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(",") if s]
+    args.pack_sizes = [int(s) for s in args.pack_sizes.split(",") if s]
+    groups = args.only or ["search", "embeddings", "summaries"]
+
+    start_fakes(args)
+    import instrumentation
+    instrumentation.enable()
+
+    results = []
+    for size in args.sizes:
+        print(f"\n=== {size} workouts ===")
+        runs = []
+        if "search" in groups:
+            runs.append(bench_search)
+        if size <= args.pipeline_max_rows:
+            if "embeddings" in groups:
+                runs.append(bench_embeddings)
+            if "summaries" in groups:
+                runs.append(bench_summaries)
+        for run in runs:
+            for result in run(size, args):
+                print_result(result)
+                results.append(result)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "results": results,
+        # Per-stage timings from instrumentation.py, summed over every size.
+        "stages": instrumentation.registry.snapshot(),
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
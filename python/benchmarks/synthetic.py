@@ -0,0 +1,222 @@
+"""
+Synthetic Workouts and SQLite Fixture
+-------------------------------------
+Deterministic swim_workouts rows, clustered unit vectors and a SQLite copy
+of the tables the pipelines write to, for benchmarks/run_benchmarks.py.
+
+The SQLite schema keeps the SQL Server column names and a compatible
+subset of types, so statements the pipelines issue with plain ?
+parameters (SELECT ... ORDER BY, UPDATE ... WHERE id = ?, DELETE) run on
+it unchanged. T-SQL-only paths (TOP, MERGE, SYSUTCDATETIME) are not
+exercised.
+"""
+
+import functools
+import random
+import sqlite3
+from collections import namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+from sports import SWIM
+
+START_DATE = datetime(2015, 1, 1, 6, 0)
+
+ACTIVITY_TYPES = ["Pool Swim", "Pool Swim", "Pool Swim", "Open Water Swimming"]
+TITLE_WORDS = ["Morning", "Masters", "Lunch", "Evening", "Recovery", "Threshold", "Drills", "Endurance"]
+NOTE_PHRASES = [
+    "steady aerobic pacing with relaxed breathing",
+    "threshold intervals held a strong, even pace",
+    "drill-focused session working on catch and rotation",
+    "pull buoy sets emphasised upper body strength",
+    "open water sighting practice in choppy conditions",
+    "sprint repeats pushed heart rate near max",
+    "long continuous swim built aerobic endurance",
+    "easy recovery swim to loosen up after a hard week",
+    "kick sets with fins to improve ankle flexibility",
+    "negative split ladder finished faster than it started",
+]
+FELT = ["easy", "moderate", "hard"]
+EFFORT = ["low", "medium", "high"]
+
+# ------------------------------------------------------------
+# Rows
+# ------------------------------------------------------------
+
+def clock(seconds):
+    """Seconds → Garmin-style "h:mm:ss" / "m:ss" string."""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def clock_seconds(text):
+    """clock() string → seconds, as the persisted *_seconds columns hold it."""
+    return float(sum(int(part) * 60 ** i for i, part in enumerate(reversed(text.split(":")))))
+
+
+DURATION_COLUMNS = ("time", "avg_pace", "best_pace", "best_lap_time", "moving_time", "elapsed_time")
+
+
+def synthetic_workouts(n, seed=0, with_notes=True):
+    """Yield n swim_workouts dicts with ids 1..n, one workout every ~1.5 days."""
+    rng = random.Random(seed)
+    for wid in range(1, n + 1):
+        distance = rng.choice([1000, 1500, 2000, 2500, 3000, 3500, 4000, 5000])
+        pace = rng.uniform(85, 140)                       # seconds per 100 yards
+        moving = distance / 100 * pace
+        elapsed = moving * rng.uniform(1.05, 1.4)
+        laps = distance // 25
+        phrases = rng.sample(NOTE_PHRASES, 2)
+        felt = rng.randrange(3)
+        row = {
+            SWIM.id_column: wid,
+            "activity_type": rng.choice(ACTIVITY_TYPES),
+            "workout_date": START_DATE + timedelta(hours=36 * wid + rng.randrange(6)),
+            "title": f"{rng.choice(TITLE_WORDS)} Swim",
+            "distance_yards": float(distance),
+            "calories": int(distance * rng.uniform(0.18, 0.26)),
+            "time": clock(elapsed),
+            "avg_hr": rng.randrange(110, 165),
+            "max_hr": rng.randrange(150, 185),
+            "aerobic_te": round(rng.uniform(1.5, 4.5), 1),
+            "avg_pace": clock(pace),
+            "best_pace": clock(pace * rng.uniform(0.75, 0.95)),
+            "total_strokes": int(laps * rng.uniform(14, 20)),
+            "avg_swolf": round(rng.uniform(32, 48), 1),
+            "avg_stroke_rate": round(rng.uniform(22, 34), 1),
+            "best_lap_time": clock(pace / 4 * rng.uniform(0.8, 0.95)),
+            "number_of_laps": laps,
+            "moving_time": clock(moving),
+            "elapsed_time": clock(elapsed),
+            "training_stress_score": round(moving / 3600 * rng.uniform(40, 90), 1),
+            "notes": f"{phrases[0].capitalize()}; {phrases[1]}." if with_notes else None,
+            "felt_rating": FELT[felt] if with_notes else None,
+            "perceived_effort": EFFORT[felt] if with_notes else None,
+        }
+        for column in DURATION_COLUMNS:
+            row[f"{column}_seconds"] = clock_seconds(row[column])
+        yield row
+
+
+def synthetic_vectors(n, dim, seed=0, clusters=64, chunk=65536):
+    """n clustered unit float32 vectors (clusters make IVF probing realistic)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, chunk):
+        stop = min(n, start + chunk)
+        block = centers[rng.integers(0, clusters, stop - start)]
+        block += 0.6 * rng.standard_normal(block.shape).astype(np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        out[start:stop] = block
+    return out
+
+# ------------------------------------------------------------
+# SQLite fixture
+# ------------------------------------------------------------
+
+SCHEMA = f"""
+CREATE TABLE swim_workouts (
+    swim_workout_id       INTEGER PRIMARY KEY,
+    activity_type         TEXT,
+    workout_date          TIMESTAMP NOT NULL,
+    title                 TEXT,
+    distance_yards        REAL,
+    calories              INTEGER,
+    time                  TEXT,
+    avg_hr                INTEGER,
+    max_hr                INTEGER,
+    aerobic_te            REAL,
+    avg_pace              TEXT,
+    best_pace             TEXT,
+    total_strokes         INTEGER,
+    avg_swolf             REAL,
+    avg_stroke_rate       REAL,
+    best_lap_time         TEXT,
+    number_of_laps        INTEGER,
+    moving_time           TEXT,
+    elapsed_time          TEXT,
+    training_stress_score REAL,
+    notes                 TEXT,
+    felt_rating           TEXT,
+    perceived_effort      TEXT,
+    time_seconds          REAL,
+    avg_pace_seconds      REAL,
+    best_pace_seconds     REAL,
+    best_lap_time_seconds REAL,
+    moving_time_seconds   REAL,
+    elapsed_time_seconds  REAL,
+    embedding             BLOB,
+    embedding_hash        BLOB,
+    embedding_model       TEXT
+);
+
+CREATE TABLE {SWIM.attempts_table} (
+    swim_workout_id   INTEGER PRIMARY KEY,
+    attempts          INTEGER NOT NULL,
+    last_error        TEXT,
+    last_attempt_at   TIMESTAMP NOT NULL,
+    next_attempt_at   TIMESTAMP NOT NULL
+);
+"""
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+@functools.lru_cache(maxsize=None)
+def _row_type(fields):
+    return namedtuple("Row", fields, rename=True)
+
+
+class FixtureCursor:
+    """sqlite3 cursor that accepts pyodbc-only attributes (fast_executemany)."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.fast_executemany = False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class FixtureConnection:
+    """sqlite3 connection whose rows allow pyodbc-style attribute access (row.title)."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._conn.row_factory = self._row
+
+    @staticmethod
+    def _row(cursor, values):
+        return _row_type(tuple(column[0] for column in cursor.description))(*values)
+
+    def cursor(self):
+        return FixtureCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def create_fixture(n, path=":memory:", seed=0, with_notes=True):
+    """SQLite swim_workouts fixture with n synthetic rows → FixtureConnection."""
+    conn = sqlite3.connect(path, check_same_thread=False,
+                           detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.executescript(SCHEMA)
+    columns = None
+    for row in synthetic_workouts(n, seed, with_notes):
+        if columns is None:
+            columns = list(row)
+            insert = (f"INSERT INTO swim_workouts ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' * len(columns))})")
+        conn.execute(insert, tuple(row[c] for c in columns))
+    conn.commit()
+    return FixtureConnection(conn)
@@ -0,0 +1,133 @@
+"""
+Query Embedding Cache
+---------------------
+
+Two-tier cache for query embeddings, keyed on (model, normalized text):
+
+1. In-memory LRU with a maximum entry count and TTL.
+2. Optional SQLite file that survives process restarts. Disk hits are
+   promoted into the memory tier. Each write trims it to the newest
+   disk_max_entries rows and drops rows past the TTL.
+
+Hit/miss counters are available from stats().
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace and case so trivially different queries share a key."""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Thread-safe memory + optional SQLite cache of query embeddings."""
+
+    def __init__(self, max_entries=1024, ttl_seconds=None, path=None, disk_max_entries=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    key        TEXT PRIMARY KEY,
+                    vector     BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS ix_query_embeddings_created_at ON query_embeddings (created_at)"
+            )
+            self.db.commit()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key, vec, created_at):
+        self.entries[key] = (vec, created_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, model, text):
+        """Cached float32 vector or None."""
+        key = cache_key(model, text)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                vec, created_at = entry
+                if not self._expired(created_at, now):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return vec
+                del self.entries[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    blob, created_at = row
+                    if not self._expired(created_at, now):
+                        vec = np.frombuffer(blob, dtype="<f4")
+                        self._remember(key, vec, created_at)
+                        self.disk_hits += 1
+                        return vec
+                    self.db.execute("DELETE FROM query_embeddings WHERE key = ?", (key,))
+                    self.db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, model, text, vector):
+        key = cache_key(model, text)
+        vec = np.asarray(vector, dtype="<f4")
+        now = time.time()
+        with self.lock:
+            self._remember(key, vec, now)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                    (key, vec.tobytes(), now)
+                )
+                self._trim_disk(now)
+                self.db.commit()
+        return vec
+
+    def _trim_disk(self, now):
+        if self.ttl_seconds is not None:
+            self.db.execute("DELETE FROM query_embeddings WHERE created_at < ?", (now - self.ttl_seconds,))
+        if self.disk_max_entries:
+            self.db.execute("""
+                DELETE FROM query_embeddings WHERE key IN (
+                    SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.disk_max_entries,))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
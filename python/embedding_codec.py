@@ -0,0 +1,147 @@
+"""
+Embedding Storage Codec
+-----------------------
+
+Packs embeddings for the workout tables' embedding VARBINARY column in one
+of three formats:
+
+    float32  4 bytes/dim  (lossless)
+    float16  2 bytes/dim
+    int8     1 byte/dim + one float32 scale per vector (max-abs scaling)
+
+Every blob starts with a small header (magic, version, format, dimension),
+so readers never need to know how a row was written. Blobs without the
+header are the original raw float32 layout from struct.pack(f"{n}f").
+
+Run this file directly to report recall@k of the quantized formats against
+float32 over the embeddings currently stored in SQL.
+"""
+
+import struct
+import numpy as np
+
+MAGIC = b"EV"
+VERSION = 1
+HEADER = struct.Struct("<2sBBH")      # magic, version, format code, dimension
+SCALE = struct.Struct("<f")
+
+FORMAT_CODES = {"float32": 0, "float16": 1, "int8": 2}
+FORMAT_NAMES = {code: name for name, code in FORMAT_CODES.items()}
+FORMAT_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2"), "int8": np.dtype("i1")}
+
+# ------------------------------------------------------------
+# Quantization
+# ------------------------------------------------------------
+
+def quantize(matrix, fmt):
+    """float32 rows → (codes, scales). scales is all ones except for int8."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    scales = np.ones(len(matrix), dtype=np.float32)
+    if fmt == "float32":
+        return matrix.astype("<f4", copy=False), scales
+    if fmt == "float16":
+        return matrix.astype("<f2"), scales
+    if fmt == "int8":
+        peak = np.abs(matrix).max(axis=1)
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Unknown embedding format: {fmt}")
+
+
+def dequantize(codes, scales):
+    out = codes.astype(np.float32)
+    if codes.dtype == np.int8:
+        out *= scales[:, None] if out.ndim == 2 else scales
+    return out
+
+# ------------------------------------------------------------
+# Pack / unpack
+# ------------------------------------------------------------
+
+def pack(vec, fmt="float32"):
+    """One vector → self-describing VARBINARY blob."""
+    codes, scales = quantize(vec, fmt)
+    return pack_quantized(codes[0], scales[0], fmt)
+
+
+def pack_matrix(matrix, fmt="float32"):
+    """Many vectors → list of blobs, quantized in one vectorized pass."""
+    codes, scales = quantize(matrix, fmt)
+    return [pack_quantized(c, s, fmt) for c, s in zip(codes, scales)]
+
+
+def pack_quantized(codes, scale, fmt):
+    header = HEADER.pack(MAGIC, VERSION, FORMAT_CODES[fmt], len(codes))
+    if fmt == "int8":
+        header += SCALE.pack(float(scale))
+    return header + codes.tobytes()
+
+
+def unpack_quantized(blob):
+    """Blob → (codes, scale, fmt) without converting to float32."""
+    if len(blob) >= HEADER.size and blob[:2] == MAGIC:
+        _, version, code, dim = HEADER.unpack_from(blob)
+        fmt = FORMAT_NAMES.get(code)
+        offset = HEADER.size
+        scale = 1.0
+        if fmt == "int8":
+            (scale,) = SCALE.unpack_from(blob, offset)
+            offset += SCALE.size
+        if fmt is not None and len(blob) - offset == dim * FORMAT_DTYPES[fmt].itemsize:
+            return np.frombuffer(blob, dtype=FORMAT_DTYPES[fmt], offset=offset), scale, fmt
+    # Legacy raw float32 blob.
+    return np.frombuffer(blob, dtype="<f4"), 1.0, "float32"
+
+
+def unpack(blob):
+    """Blob → float32 vector, whatever format it was stored in."""
+    codes, scale, fmt = unpack_quantized(blob)
+    vec = codes.astype(np.float32)
+    if fmt == "int8":
+        vec *= scale
+    return vec
+
+# ------------------------------------------------------------
+# Recall report
+# ------------------------------------------------------------
+
+def recall_report(matrix, k=10, num_queries=200, seed=0):
+    """recall@k of each quantized format vs float32, using stored rows as queries."""
+    from vector_index import normalize_rows, top_k
+
+    matrix = normalize_rows(np.array(matrix, dtype=np.float32))
+    rng = np.random.default_rng(seed)
+    queries = matrix[rng.choice(len(matrix), min(num_queries, len(matrix)), replace=False)]
+    exact = [set(top_k(matrix @ q, k)) for q in queries]
+
+    report = {}
+    for fmt in FORMAT_CODES:
+        approx = dequantize(*quantize(matrix, fmt))
+        hits = sum(len(exact[i] & set(top_k(approx @ q, k))) for i, q in enumerate(queries))
+        report[fmt] = {
+            "bytes_per_vector": len(pack(matrix[0], fmt)),
+            f"recall@{k}": hits / (len(queries) * min(k, len(matrix))),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    from utils import pooled_connection
+    from sports import active_sports
+
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        vectors = []
+        for sport in active_sports(conn):
+            cursor.execute(f"SELECT embedding FROM {sport.table} WHERE embedding IS NOT NULL")
+            vectors.extend(unpack(r[0]) for r in cursor.fetchall())
+        cursor.close()
+
+    if not vectors:
+        print("No embeddings stored yet.")
+    else:
+        for fmt, stats in recall_report(np.vstack(vectors)).items():
+            print(f"{fmt:8s} {stats}")
@@ -0,0 +1,301 @@
+"""
+Pipeline Instrumentation
+------------------------
+
+One shared registry of timings and counters for the SQL connection pool,
+04_b AI generation, the embedding script and semantic search, so a slow
+run shows where the time went (API call, JSON parsing, SQL execute,
+commit, rate-limit waits, retry sleeps) instead of a wall of print lines.
+
+    with span("anthropic_request", sport="swim"):
+        response = client.messages.create(...)
+
+    with span("embed_request", sport="swim") as s:
+        s.rows = len(batch)               # rows/sec is reported per stage
+        ...
+
+    count("anthropic_tokens_total", usage.input_tokens, direction="input")
+
+Every span feeds a `<name>_seconds` histogram per label set; counters are
+plain totals. Output is chosen with METRICS_FORMAT:
+
+    json        one JSON line per series at the end of the run, plus
+                log_event() lines as they happen (stderr, or METRICS_PATH)
+    prometheus  Prometheus text exposition at the end of the run (stdout,
+                or METRICS_PATH); search_service.py also serves it live at
+                GET /metrics/prometheus
+    (unset)     recording is off and span()/count() cost almost nothing
+
+--profile on the pipeline scripts (or PROFILE=1) also runs them under
+cProfile, dumps the stats to PROFILE_PATH (default <script>.prof) and
+prints the top functions. cProfile only sees the main thread; time spent
+in worker threads shows up as waits on their futures.
+"""
+
+import cProfile
+import json
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_FORMAT = os.getenv("METRICS_FORMAT", "").lower()
+METRICS_PATH = os.getenv("METRICS_PATH")
+PROFILE_ENABLED = os.getenv("PROFILE", "0") == "1"
+PROFILE_PATH = os.getenv("PROFILE_PATH")
+
+# Seconds; suits everything from an in-memory search to a slow API call.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# ------------------------------------------------------------
+# Metric types
+# ------------------------------------------------------------
+
+class Histogram:
+    """Fixed-bucket latency histogram (Prometheus-style) with a row total."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)     # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    def observe(self, seconds, rows=0):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.rows += rows
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding rank q."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+    def summary(self):
+        summary = {
+            "count": self.count,
+            "sum_seconds": round(self.sum, 6),
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+        if self.rows:
+            summary["rows"] = self.rows
+            summary["rows_per_sec"] = round(self.rows / self.sum, 1) if self.sum else None
+        return summary
+
+# ------------------------------------------------------------
+# Registry
+# ------------------------------------------------------------
+
+class Registry:
+    """Thread-safe {(name, labels): metric} store."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, seconds, rows=0, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds, rows)
+
+    def count(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def snapshot(self):
+        """[{"metric", "labels", ...values}] for every series."""
+        with self.lock:
+            series = [
+                {"metric": f"{name}_seconds", "type": "histogram", "labels": dict(labels), **h.summary()}
+                for (name, labels), h in sorted(self.histograms.items())
+            ]
+            series.extend(
+                {"metric": name, "type": "counter", "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            )
+        return series
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), h in sorted(self.histograms.items()):
+                metric = f"{name}_seconds"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (math.inf,), h.buckets):
+                    cumulative += n
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{metric}_bucket{fmt(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{metric}_sum{fmt(labels)} {h.sum}")
+                lines.append(f"{metric}_count{fmt(labels)} {h.count}")
+            # Span row counts are their own counter families, listed with the
+            # other counters so every family's samples stay together.
+            counters = dict(self.counters)
+            for (name, labels), h in self.histograms.items():
+                if h.rows:
+                    key = (f"{name}_rows_total", labels)
+                    counters[key] = counters.get(key, 0) + h.rows
+            for (name, labels), value in sorted(counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+_enabled = bool(METRICS_FORMAT)
+
+def enable():
+    """Turn recording on regardless of METRICS_FORMAT (used by search_service)."""
+    global _enabled
+    _enabled = True
+
+# ------------------------------------------------------------
+# Recording API
+# ------------------------------------------------------------
+
+class _Span:
+    __slots__ = ("name", "labels", "rows", "started")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.rows = 0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = self.labels if exc_type is None else {**self.labels, "error": exc_type.__name__}
+        registry.observe(self.name, time.perf_counter() - self.started, self.rows, **labels)
+        return False
+
+
+class _NullSpan:
+    rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+def span(name, **labels):
+    """Time a block into the `<name>_seconds` histogram. Set `.rows` for rows/sec."""
+    return _Span(name, labels) if _enabled else _NULL_SPAN
+
+def count(name, amount=1, **labels):
+    if _enabled and amount:
+        registry.count(name, amount, **labels)
+
+def observe(name, seconds, rows=0, **labels):
+    """Record a duration measured elsewhere (e.g. a pool wait)."""
+    if _enabled:
+        registry.observe(name, seconds, rows, **labels)
+
+def _write(text, default_stream):
+    if METRICS_PATH:
+        with open(METRICS_PATH, "a", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        default_stream.write(text)
+        default_stream.flush()
+
+def log_event(event, **fields):
+    """Structured JSON log line (METRICS_FORMAT=json only)."""
+    if METRICS_FORMAT == "json":
+        _write(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str) + "\n",
+               sys.stderr)
+
+# ------------------------------------------------------------
+# Reporting / profiling
+# ------------------------------------------------------------
+
+def report():
+    """Write every series in the configured METRICS_FORMAT."""
+    if METRICS_FORMAT == "json":
+        elapsed = round(time.time() - registry.started, 3)
+        lines = [json.dumps({"event": "metric", "run_seconds": elapsed, **series}) for series in registry.snapshot()]
+        if lines:
+            _write("\n".join(lines) + "\n", sys.stderr)
+    elif METRICS_FORMAT == "prometheus":
+        _write(registry.render_prometheus(), sys.stdout)
+
+@contextmanager
+def profiled(enabled=PROFILE_ENABLED, path=None, top=25):
+    """Run the block under cProfile when enabled; dump and print stats after."""
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+        path = path or PROFILE_PATH or f"{script}.prof"
+        profiler.dump_stats(path)
+        print(f"\ncProfile stats written to {path}; top {top} by cumulative time:", file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(top)
+
+@contextmanager
+def session(profile=False):
+    """Wrap a script's main(): optional cProfile, then report() even on failure."""
+    try:
+        with profiled(profile or PROFILE_ENABLED):
+            yield
+    finally:
+        report()
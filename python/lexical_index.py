@@ -0,0 +1,259 @@
+"""
+BM25 Inverted Index over Workout Titles and Notes
+-------------------------------------------------
+
+Keyword side of hybrid search. Exact training terms ("drills", "pull buoy",
+"threshold") often rank poorly on embeddings alone; BM25 over title + notes
+catches them, and reciprocal_rank_fusion() merges the two rankings.
+
+Like VectorIndex, the index covers every active sport (keyed by
+sports.workout_key), loads once and refreshes incrementally by row_version.
+With LEXICAL_INDEX_PATH set it is also kept on disk, so a restart only
+reads rows changed since it was last saved.
+
+Keyword queries never need an embedding call.
+"""
+
+import gzip
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from sports import active_sports, key_expression, row_version_ceiling
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 2          # title terms count this many times
+RRF_K = 60
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH")
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# ------------------------------------------------------------
+# Tokenizing
+# ------------------------------------------------------------
+
+def tokenize(text):
+    """Lowercase word tokens with a light plural fold (drills → drill)."""
+    tokens = []
+    for token in TOKEN_RE.findall((text or "").lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def document_terms(title, notes):
+    terms = Counter(tokenize(notes))
+    for token in tokenize(title):
+        terms[token] += TITLE_WEIGHT
+    return terms
+
+# ------------------------------------------------------------
+# Rank fusion
+# ------------------------------------------------------------
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked id lists → [(score, id)] best first; score = Σ 1 / (k + rank)."""
+    fused = Counter()
+    for ranking in rankings:
+        for rank, workout_id in enumerate(ranking, start=1):
+            fused[workout_id] += 1.0 / (k + rank)
+    return sorted(((score, wid) for wid, score in fused.items()), key=lambda x: -x[0])
+
+# ------------------------------------------------------------
+# Index
+# ------------------------------------------------------------
+
+class LexicalIndex:
+    """term → {workout_key: tf} postings with BM25 scoring."""
+
+    def __init__(self, sports=None):
+        self.sports = sports
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.postings = {}
+        self.doc_terms = {}
+        self.doc_len = {}
+        self.notes = {}
+        # Keys of rows whose title and notes yield no terms: not searchable,
+        # but tracked so refresh() can compare its row count with SQL's.
+        self.empty = set()
+        self.total_len = 0
+        self.watermark = None
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    # --------------------------------------------------------
+    # Mutation
+    # --------------------------------------------------------
+
+    def _add_terms(self, workout_id, terms):
+        self.doc_terms[workout_id] = terms
+        length = sum(terms.values())
+        self.doc_len[workout_id] = length
+        self.total_len += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[workout_id] = tf
+
+    def remove(self, ids):
+        with self.lock:
+            for workout_id in ids:
+                self.empty.discard(workout_id)
+                terms = self.doc_terms.pop(workout_id, None)
+                if terms is None:
+                    continue
+                self.total_len -= self.doc_len.pop(workout_id)
+                self.notes.pop(workout_id, None)
+                for term in terms:
+                    docs = self.postings[term]
+                    del docs[workout_id]
+                    if not docs:
+                        del self.postings[term]
+
+    def upsert(self, rows):
+        """rows: (workout_key, title, notes). Rows with no terms are left out of search (tracked in self.empty)."""
+        with self.lock:
+            for workout_id, title, notes in rows:
+                self.remove([workout_id])
+                terms = document_terms(title, notes)
+                if terms:
+                    self._add_terms(workout_id, terms)
+                    self.notes[workout_id] = notes
+                else:
+                    self.empty.add(workout_id)
+
+    # --------------------------------------------------------
+    # SQL load / refresh
+    # --------------------------------------------------------
+
+    def _apply_rows(self, rows):
+        self.upsert([(wid, title, notes) for wid, title, notes, _ in rows])
+        return len(rows)
+
+    def load(self, conn):
+        cursor = conn.cursor()
+        ceiling = row_version_ceiling(cursor)
+        rows = []
+        for sport in active_sports(conn, self.sports):
+            cursor.execute(f"SELECT {key_expression(sport)}, title, notes, row_version FROM {sport.table}")
+            rows.extend(cursor.fetchall())
+        cursor.close()
+        with self.lock:
+            self._reset()
+            self._apply_rows(rows)
+            self.watermark = ceiling
+        return len(self)
+
+    def refresh(self, conn):
+        """Apply rows changed since the last load/refresh. Returns rows changed."""
+        if self.watermark is None:
+            return self.load(conn)
+        sports = active_sports(conn, self.sports)
+        cursor = conn.cursor()
+        ceiling = row_version_ceiling(cursor)
+        rows = []
+        for sport in sports:
+            cursor.execute(f"""
+                SELECT {key_expression(sport)}, title, notes, row_version
+                FROM {sport.table}
+                WHERE row_version >= ? AND row_version < ?
+                ORDER BY row_version
+            """, self.watermark, ceiling)
+            rows.extend(cursor.fetchall())
+
+        # Queries run before taking the lock so searches are blocked only
+        # while rows are applied.
+        live_count = 0
+        for sport in sports:
+            cursor.execute(f"SELECT COUNT(*) FROM {sport.table}")
+            live_count += cursor.fetchone()[0]
+
+        with self.lock:
+            changed = self._apply_rows(rows)
+            self.watermark = ceiling
+            in_sync = live_count == len(self) + len(self.empty)
+
+        if not in_sync:
+            live = set()
+            for sport in sports:
+                cursor.execute(f"SELECT {key_expression(sport)} FROM {sport.table}")
+                live.update(r[0] for r in cursor.fetchall())
+            with self.lock:
+                gone = [wid for wid in (*self.doc_terms, *self.empty) if wid not in live]
+                self.remove(gone)
+            changed += len(gone)
+        cursor.close()
+        return changed
+
+    # --------------------------------------------------------
+    # Search
+    # --------------------------------------------------------
+
+    def search(self, query_text, top_n=5, candidates=None):
+        """BM25 → [(score, workout_key, notes)] best first.
+
+        `candidates` (a set of workout keys) restricts which documents can match.
+        """
+        with self.lock:
+            n_docs = len(self)
+            if not n_docs:
+                return []
+            avg_len = self.total_len / n_docs
+            scores = Counter()
+            for term in set(tokenize(query_text)):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for workout_id, tf in docs.items():
+                    if candidates is not None and workout_id not in candidates:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[workout_id] / avg_len)
+                    scores[workout_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            return [(score, wid, self.notes.get(wid)) for wid, score in scores.most_common(top_n)]
+
+    # --------------------------------------------------------
+    # Persistence
+    # --------------------------------------------------------
+
+    def save(self, path):
+        with self.lock:
+            payload = {
+                "watermark": self.watermark.hex() if self.watermark else None,
+                "docs": [[wid, dict(terms), self.notes.get(wid)] for wid, terms in self.doc_terms.items()],
+                "empty": sorted(self.empty),
+            }
+        # Unique temp file in the same directory, so concurrent savers never
+        # share one and os.replace stays an atomic rename.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @classmethod
+    def from_file(cls, path):
+        index = cls()
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+        if "empty" not in payload:
+            # Saved before empty rows were tracked; load from SQL instead.
+            return index
+        index.empty = set(payload["empty"])
+        for workout_id, terms, notes in payload["docs"]:
+            index._add_terms(workout_id, Counter(terms))
+            index.notes[workout_id] = notes
+        if payload["watermark"]:
+            index.watermark = bytes.fromhex(payload["watermark"])
+        return index
@@ -1,10 +1,14 @@
 import os
+import argparse
+import hashlib
 import pyodbc
-import time
+import numpy as np
 from dotenv import load_dotenv
 from openai import OpenAI
-from utils import get_connection
-import struct
+from utils import pooled_connection, EMBED_MODEL, EMBED_DIMENSIONS, embedding_model_tag
+from embedding_codec import pack_matrix
+from sports import SPORTS, get_sport, active_sports
+from instrumentation import span, count, log_event, session
 
 load_dotenv()
 
@@ -16,51 +20,178 @@ if not openai_api_key:
 # Use OpenAI’s official API (NOT GitHub Models)
 client = OpenAI(api_key=openai_api_key)
 
-EMBED_MODEL = "text-embedding-3-small"   # 1536-dim
+# --- BATCHING ---
+# One embeddings request carries up to EMBED_BATCH_SIZE inputs, capped so the
+# estimated token count stays under EMBED_BATCH_TOKEN_BUDGET (the API rejects
+# requests above 2048 inputs / 300k tokens).
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_BATCH_TOKEN_BUDGET = int(os.getenv("EMBED_BATCH_TOKEN_BUDGET", "250000"))
+EMBED_MAX_BATCH_INPUTS = 2048
+
+# --- STORAGE FORMAT ---
+# float32 (lossless), float16 or int8; see embedding_codec.py.
+EMBED_STORAGE_FORMAT = os.getenv("EMBED_STORAGE_FORMAT", "float32")
 
 # --- EMBEDDING FUNCTION ---
 def embed_text(text: str):
-    """Generate a 1536‑dim embedding using OpenAI."""
+    """Generate an EMBED_DIMENSIONS‑dim embedding using OpenAI."""
     response = client.embeddings.create(
         model=EMBED_MODEL,
-        input=text
+        input=text,
+        dimensions=EMBED_DIMENSIONS
     )
     vec = response.data[0].embedding
-    if len(vec) != 1536:
+    if len(vec) != EMBED_DIMENSIONS:
         raise RuntimeError(f"Unexpected embedding length: {len(vec)}")
     return vec
 
-# --- MAIN PIPELINE ---
-def regenerate_embeddings():
-    conn = get_connection()
-    cursor = conn.cursor()
+def embed_texts(texts):
+    """Generate EMBED_DIMENSIONS‑dim embeddings for many texts in one request.
 
-    print("Fetching swim workouts...")
-    cursor.execute("SELECT swim_workout_id, notes FROM swim_workouts")
-    rows = cursor.fetchall()
-
-    print(f"Found {len(rows)} workouts. Generating embeddings...")
-
-    update_sql = """
-        UPDATE swim_workouts
-        SET embedding = ?
-        WHERE swim_workout_id = ?
+    Returns a float32 matrix with one row per input, in input order.
     """
-
+    with span("openai_embeddings_request") as s:
+        s.rows = len(texts)
+        response = client.embeddings.create(
+            model=EMBED_MODEL,
+            input=list(texts),
+            dimensions=EMBED_DIMENSIONS
+        )
+    count("openai_tokens_total", response.usage.total_tokens)
+    data = sorted(response.data, key=lambda d: d.index)
+    matrix = np.asarray([d.embedding for d in data], dtype="<f4")
+    if matrix.shape != (len(texts), EMBED_DIMENSIONS):
+        raise RuntimeError(f"Unexpected embedding shape: {matrix.shape}")
+    return matrix
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token) used for batch sizing."""
+    return len(text) // 4 + 1
+
+def iter_batches(rows, batch_size=EMBED_BATCH_SIZE, token_budget=EMBED_BATCH_TOKEN_BUDGET):
+    """Yield lists of (workout_id, text) bounded by batch size and token budget.
+
+    Blank notes are skipped: the API rejects empty inputs, which would fail the
+    whole batch (see clear_blank).
+    """
+    batch_size = max(1, min(batch_size, EMBED_MAX_BATCH_INPUTS))
+    batch, batch_tokens = [], 0
     for workout_id, notes in rows:
         text = notes or ""
+        if not text.strip():
+            continue
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > token_budget):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append((workout_id, text))
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+def content_hash(text: str) -> bytes:
+    """SHA-256 of the UTF-16LE text, matching SQL HASHBYTES('SHA2_256', NVARCHAR)."""
+    return hashlib.sha256(text.encode("utf-16-le")).digest()
+
+# --- FETCH WORKOUTS NEEDING EMBEDDINGS ---
+# Stale detection runs in SQL so only changed rows cross the wire
+# (see sql/05_embedding_metadata.sql). A NULL embedding with a current hash and
+# model is a row with blank notes that clear_blank already handled.
+STALE_QUERY = """
+    SELECT {id_column}, notes
+    FROM {table}
+    WHERE embedding_hash IS NULL
+       OR embedding_hash <> HASHBYTES('SHA2_256', ISNULL(notes, N''))
+       OR embedding_model IS NULL
+       OR embedding_model <> ?
+    ORDER BY {id_column}
+"""
+
+def fetch_stale(cursor, sport, full=False):
+    with span("sql_fetch", sport=sport.key) as s:
+        if full:
+            cursor.execute(f"SELECT {sport.id_column}, notes FROM {sport.table} ORDER BY {sport.id_column}")
+        else:
+            cursor.execute(STALE_QUERY.format(id_column=sport.id_column, table=sport.table), embedding_model_tag())
+        rows = cursor.fetchall()
+        s.rows = len(rows)
+    return rows
+
+def clear_blank(cursor, sport, rows, model_tag):
+    """Store no embedding for rows with blank notes, but record their hash and
+    model so STALE_QUERY stops selecting them until the notes change."""
+    params = [(content_hash(notes or ""), model_tag, workout_id)
+              for workout_id, notes in rows if not (notes or "").strip()]
+    if params:
+        with span("sql_write", sport=sport.key, table=sport.table) as w:
+            w.rows = len(params)
+            cursor.executemany(
+                f"UPDATE {sport.table} SET embedding = NULL, embedding_hash = ?, embedding_model = ? "
+                f"WHERE {sport.id_column} = ?",
+                params,
+            )
+    return len(params)
 
-        time.sleep(0.5)  # OpenAI is stable; small delay is enough
+# --- MAIN PIPELINE ---
+def regenerate_embeddings(full=False, batch_size=EMBED_BATCH_SIZE, token_budget=EMBED_BATCH_TOKEN_BUDGET,
+                          sports=None):
+    with pooled_connection() as conn:
+        for sport in active_sports(conn, sports):
+            regenerate_sport(conn, sport, full, batch_size, token_budget)
+    print("\nDone.")
 
-        vec = embed_text(text)
+def regenerate_sport(conn, sport, full, batch_size, token_budget):
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
 
-        # Convert Python list[float] → SQL VARBINARY
-        binary_vec = struct.pack(f"{len(vec)}f", *vec)
+    if full:
+        print(f"Fetching all {sport.key} workouts...")
+    else:
+        print(f"Fetching {sport.key} workouts with missing or stale embeddings...")
+    rows = fetch_stale(cursor, sport, full)
 
-        cursor.execute(update_sql, (binary_vec, workout_id))
-        conn.commit()
+    print(f"Found {len(rows)} workouts. Generating embeddings...")
 
-    print("All embeddings updated.")
+    update_sql = f"""
+        UPDATE {sport.table}
+        SET embedding = ?,
+            embedding_hash = ?,
+            embedding_model = ?
+        WHERE {sport.id_column} = ?
+    """
+
+    model_tag = embedding_model_tag()
+    blank = clear_blank(cursor, sport, rows, model_tag)
+    if blank:
+        conn.commit()
+        print(f"  {blank} workouts have no notes; cleared their embeddings")
+    total = len(rows) - blank
+    done = 0
+    for batch in iter_batches(rows, batch_size, token_budget):
+        with span("embed_batch", sport=sport.key) as s:
+            s.rows = len(batch)
+            matrix = embed_texts([text for _, text in batch])
+
+            # Convert float32 rows → self-describing VARBINARY blobs
+            with span("embedding_pack"):
+                blobs = pack_matrix(matrix, EMBED_STORAGE_FORMAT)
+                params = [
+                    (blobs[i], content_hash(text), model_tag, workout_id)
+                    for i, (workout_id, text) in enumerate(batch)
+                ]
+
+            with span("sql_write", sport=sport.key, table=sport.table) as w:
+                w.rows = len(params)
+                cursor.executemany(update_sql, params)
+            with span("sql_commit", sport=sport.key):
+                conn.commit()
+
+        done += len(batch)
+        count("embedding_rows_total", len(batch), sport=sport.key)
+        log_event("embed_batch_done", sport=sport.key, done=done, total=total)
+        print(f"  {done}/{total} embedded")
+
+    print(f"All {sport.key} embeddings updated.")
 
     # print("Rebuilding HNSW index...")
     #cursor.execute("ALTER INDEX idx_swim_embedding ON swim_workouts REBUILD;")
@@ -89,8 +220,15 @@ def regenerate_embeddings():
     #     print(f"- ID {r.swim_workout_id}: {r.notes[:80]}... (distance={r.distance})")
 
     cursor.close()
-    conn.close()
-    print("\nDone.")
 
 if __name__ == "__main__":
-    regenerate_embeddings()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Regenerate workout embeddings.")
+    parser.add_argument("--full", action="store_true",
+                        help="re-embed every row instead of only missing/stale ones")
+    parser.add_argument("--sport", choices=list(SPORTS), action="append",
+                        help="limit to this sport (repeatable); default: SPORTS or every sport")
+    parser.add_argument("--profile", action="store_true", help="run under cProfile (see instrumentation.py)")
+    args = parser.parse_args()
+    with session(args.profile):
+        regenerate_embeddings(full=args.full,
+                              sports=[get_sport(key) for key in args.sport] if args.sport else None)
\ No newline at end of file
@@ -0,0 +1,460 @@
+"""
+SQL-Grounded RAG over Workout Logs
+----------------------------------
+
+Answers a training question from the athlete's own data:
+
+1. Retrieves the top-k workouts with semantic_search.search_similar_swims
+   (a search_filters dict narrows them) and fetches their metrics from SQL.
+2. Adds the precomputed aggregates from training_load.py: current form and
+   recent weekly rollups per sport, plus each workout's load on its day.
+3. Packs the workouts into RAG_CONTEXT_TOKEN_BUDGET tokens, best match
+   first (notes are trimmed before a workout is dropped).
+4. Streams the answer from Anthropic.
+
+Latency and cost:
+- The coaching preamble and the aggregates block are system blocks marked
+  with cache_control, so follow-up questions read them from the prompt
+  cache (billed at 0.1x input) instead of re-processing them. Anthropic
+  only caches prefixes above a model-specific minimum length (about 1024
+  tokens on Sonnet-class models); the aggregates keep the prefix above it.
+- Assembled contexts are cached in memory per (question, top_k, filters,
+  data version). The data version is the highest row_version of every
+  workout table plus the last training-load day, so any write invalidates
+  it. A hit skips the query embedding and every retrieval round trip.
+- Each answer reports time to first token and its cost (usage priced with
+  RAG_PRICE_INPUT_PER_MTOK / RAG_PRICE_OUTPUT_PER_MTOK).
+
+search_service.py serves the same thing as GET /ask (Server-Sent Events).
+
+Usage:
+    python rag.py "How has my swim pace changed since the spring?"
+    python rag.py --top-k 12 --sport run "Which runs left me most fatigued?"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from anthropic import Anthropic
+from dotenv import load_dotenv
+import training_load
+from embedding_cache import normalize_query
+from instrumentation import count, observe, session, span
+from semantic_search import search_similar_swims
+from sports import SPORTS, active_sports, key_expression, split_key
+from utils import age_at_workout, athlete_gender, pooled_connection
+
+load_dotenv()
+
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_AI_API_KEY")
+RAG_MODEL = os.getenv("RAG_MODEL") or os.getenv("ANTHROPIC_AI_MODEL")
+
+client = Anthropic(api_key=ANTHROPIC_API_KEY, max_retries=2)
+
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "8"))
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "2500"))
+RAG_MAX_TOKENS = int(os.getenv("RAG_MAX_TOKENS", "600"))
+RAG_WEEKS = int(os.getenv("RAG_WEEKS", "8"))
+RAG_CONTEXT_CACHE_SIZE = int(os.getenv("RAG_CONTEXT_CACHE_SIZE", "256"))
+
+# USD per million tokens (defaults: Sonnet-class list prices). Prompt-cache
+# writes bill at 1.25x the input price, reads at 0.1x.
+RAG_PRICE_INPUT_PER_MTOK = float(os.getenv("RAG_PRICE_INPUT_PER_MTOK", "3.00"))
+RAG_PRICE_OUTPUT_PER_MTOK = float(os.getenv("RAG_PRICE_OUTPUT_PER_MTOK", "15.00"))
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+# Notes shorter than this after trimming are not worth the tokens.
+MIN_NOTES_CHARS = 80
+
+PACE_UNITS = {"swim": "/100yd", "run": "/mi"}
+
+# ---------------------------------------------------------
+# Static coaching preamble (prompt-cached; keep it byte-stable)
+# ---------------------------------------------------------
+COACH_PREAMBLE = """
+You are an experienced endurance coach (swimming, cycling and running) answering an athlete's
+questions about their own training log. Everything you know about the athlete is in the
+training-load summary and the retrieved workouts supplied with each question.
+
+How to read the data:
+- TSS (Training Stress Score): load of one session; about 100 = one hour at threshold.
+- CTL (chronic training load, "fitness"): exponentially weighted daily TSS over 42 days.
+- ATL (acute training load, "fatigue"): exponentially weighted daily TSS over 7 days.
+- TSB (training stress balance, "form"): yesterday's CTL minus yesterday's ATL.
+  Roughly: below -30 heavy fatigue and elevated injury/illness risk; -30 to -10 productive
+  overload; -10 to +5 neutral; +5 to +25 fresh, suited to racing; above +25 detraining.
+- Pace is time per distance, so lower is faster: swim pace is per 100 yards, run pace per
+  mile. Rides have no pace; use distance, time and heart rate instead.
+- SWOLF (swims only) is strokes plus seconds per length; lower means more efficient.
+- avg HR is the session's average heart rate in bpm.
+- "felt" and "effort" labels and the notes are AI-generated summaries of each workout's
+  metrics, not the athlete's own words; treat them as estimates.
+- "all" rows combine every sport; pace trends are per sport only.
+- Retrieved workouts are the sessions most similar to the question, best match first, each
+  tagged [sport id] and followed by the athlete's load on that day.
+
+How to answer:
+- Ground every claim in the supplied data and cite workouts by their [sport id] tag.
+- Prefer concrete numbers (dates, paces, TSS, CTL/ATL/TSB) over generalities.
+- If the data cannot answer the question, say what is missing instead of guessing.
+- Give training advice in terms of load, intensity and recovery; do not give medical advice.
+- Answer in at most 200 words unless the athlete asks for more detail.
+""".strip()
+
+# ---------------------------------------------------------
+# Context cache
+# ---------------------------------------------------------
+class ContextCache:
+    """Thread-safe LRU of assembled contexts with hit/miss counters."""
+
+    def __init__(self, max_entries=RAG_CONTEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+context_cache = ContextCache()
+
+# Both only ever go from "missing" to "present", so they are looked up once.
+_sports = None
+_training_load_ready = False
+
+def _setup(conn):
+    global _sports, _training_load_ready
+    if _sports is None:
+        _sports = active_sports(conn)
+    if not _training_load_ready:
+        _training_load_ready = training_load.tables_ready(conn)
+    return _sports
+
+# ---------------------------------------------------------
+# Formatting
+# ---------------------------------------------------------
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def clock(seconds):
+    """Seconds → "h:mm:ss" / "m:ss"."""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+def distance_text(sport_key, yards):
+    if sport_key in ("bike", "run"):
+        return f"{yards / 1760:.1f} mi"
+    return f"{yards:,.0f} yd"
+
+def _join(parts):
+    return ", ".join(part for part in parts if part)
+
+def load_text(load, trend=None):
+    """ATL/CTL/TSB on a day (from 'all') plus the sport's pace/SWOLF trend."""
+    if load is None:
+        return ""
+    parts = [f"CTL {load.ctl:.1f}", f"ATL {load.atl:.1f}", f"TSB {load.tsb:+.1f}"]
+    if trend is not None and trend.pace_trend_seconds:
+        parts.append(f"28-day pace {clock(trend.pace_trend_seconds)}{PACE_UNITS.get(trend.sport, '')}")
+    if trend is not None and trend.swolf_trend:
+        parts.append(f"28-day SWOLF {trend.swolf_trend:.1f}")
+    return _join(parts)
+
+def workout_header(w, load_line):
+    """One workout's metrics as a compact line (no notes)."""
+    pace_unit = PACE_UNITS.get(w["sport"], "")
+    line = f"[{w['sport']} {w['workout_id']}] {w['workout_date']:%Y-%m-%d} {w['activity_type'] or ''}"
+    if w["title"]:
+        line += f' "{w["title"]}"'
+    line += ": " + _join([
+        distance_text(w["sport"], w["distance_yards"]) if w["distance_yards"] else None,
+        f"moving {clock(w['moving_time_seconds'])}" if w["moving_time_seconds"] else None,
+        f"pace {clock(w['avg_pace_seconds'])}{pace_unit}" if w["avg_pace_seconds"] else None,
+        f"avg HR {w['avg_hr']}" if w["avg_hr"] else None,
+        f"TSS {w['training_stress_score']:.0f}" if w["training_stress_score"] is not None else None,
+        f"SWOLF {w['avg_swolf']:.0f}" if w["avg_swolf"] else None,
+        f"felt {w['felt_rating']}" if w["felt_rating"] else None,
+        f"effort {w['perceived_effort']}" if w["perceived_effort"] else None,
+    ])
+    if load_line:
+        line += f"\n  Load that day: {load_line}"
+    return line
+
+# ---------------------------------------------------------
+# Retrieval (SQL)
+# ---------------------------------------------------------
+def data_version(conn, sports):
+    """Changes whenever a workout is written or deleted, or the training-load
+    tables refresh. Deletes leave MAX(row_version) alone, so the row count is
+    part of the version too."""
+    parts = [f"(SELECT MAX(row_version) FROM {sport.table}), (SELECT COUNT_BIG(*) FROM {sport.table})"
+             for sport in sports]
+    if _training_load_ready:
+        parts.append("(SELECT MAX(day) FROM training_load_metrics)")
+    cursor = conn.cursor()
+    cursor.execute("SELECT " + ", ".join(parts or ["NULL"]))
+    values = tuple(cursor.fetchone()) + (date.today(),)
+    cursor.close()
+    return hashlib.sha256(repr(values).encode("utf-8")).hexdigest()[:16]
+
+def fetch_workouts(conn, keys):
+    """Workout keys → {key: dict of the columns the context shows}."""
+    by_sport = {}
+    for key in keys:
+        sport, workout_id = split_key(key)
+        by_sport.setdefault(sport, []).append(workout_id)
+    cursor = conn.cursor()
+    workouts = {}
+    for sport, ids in by_sport.items():
+        expressions = sport.filter_expressions()
+        cursor.execute(f"""
+            SELECT {key_expression(sport)} AS workout_key, {sport.id_column} AS workout_id,
+                   workout_date, activity_type, title,
+                   {expressions["distance_yards"]} AS distance_yards, moving_time_seconds,
+                   {expressions["avg_pace_seconds"]} AS avg_pace_seconds, avg_hr,
+                   training_stress_score,
+                   {"avg_swolf" if "avg_swolf" in sport.metric_columns else "NULL"} AS avg_swolf,
+                   felt_rating, perceived_effort, notes
+            FROM {sport.table}
+            WHERE {sport.id_column} IN ({", ".join("?" * len(ids))})
+        """, *ids)
+        columns = [c[0] for c in cursor.description]
+        for row in cursor.fetchall():
+            workouts[row.workout_key] = dict(zip(columns, row), sport=sport.key)
+    cursor.close()
+    return workouts
+
+def day_loads(conn, workouts):
+    """{(sport, day): training_load_metrics row} for the days the workouts fall on."""
+    days = sorted({w["workout_date"].date() for w in workouts.values()})
+    if not days or not _training_load_ready:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT sport, day, atl, ctl, tsb, pace_trend_seconds, swolf_trend
+        FROM training_load_metrics
+        WHERE day IN ({", ".join("?" * len(days))})
+    """, *days)
+    loads = {(row.sport, row.day): row for row in cursor.fetchall()}
+    cursor.close()
+    return loads
+
+def aggregates_block(conn, sports):
+    """Athlete, current form and recent weekly rollups; the same for every question."""
+    today = date.today()
+    lines = [f"Athlete: {athlete_gender}, {age_at_workout(today)} years old. Today is {today:%Y-%m-%d}."]
+    if not _training_load_ready:
+        return "\n".join(lines)
+    for key in [training_load.ALL] + [sport.key for sport in sports]:
+        form = training_load.current_form(conn, key, today)
+        if form is None:
+            continue
+        pace_unit = PACE_UNITS.get(key, "")
+        lines.append("")
+        lines.append(f"{key} (as of {form['day']:%Y-%m-%d}): " + _join([
+            f"CTL {form['ctl']:.1f}", f"ATL {form['atl']:.1f}", f"TSB {form['tsb']:+.1f}",
+            f"28-day pace {clock(form['pace_trend_seconds'])}{pace_unit}" if form["pace_trend_seconds"] else None,
+            f"28-day SWOLF {form['swolf_trend']:.1f}" if form["swolf_trend"] else None,
+        ]))
+        for week in training_load.weekly_summary(conn, key, RAG_WEEKS):
+            lines.append(f"  week of {week['week_start']:%Y-%m-%d}: " + _join([
+                f"{week['workouts']} workouts",
+                distance_text(key, week["distance_yards"]),
+                f"moving {clock(week['moving_seconds'])}",
+                f"TSS {week['training_stress_score']:.0f}",
+                f"avg HR {week['avg_hr']:.0f}" if week["avg_hr"] else None,
+                f"pace {clock(week['avg_pace_seconds'])}{pace_unit}" if week["avg_pace_seconds"] else None,
+                f"SWOLF {week['avg_swolf']:.1f}" if week["avg_swolf"] else None,
+            ]))
+    return "\n".join(lines)
+
+def pack_workouts(results, workouts, loads, budget=RAG_CONTEXT_TOKEN_BUDGET):
+    """Render results best first until `budget` tokens are used → (text, sources)."""
+    blocks, sources, used = [], [], 0
+    for score, key, _ in results:
+        w = workouts.get(key)
+        if w is None:
+            continue
+        day = w["workout_date"].date()
+        header = workout_header(w, load_text(loads.get((training_load.ALL, day)), loads.get((w["sport"], day))))
+        notes = " ".join((w["notes"] or "").split())
+        cost = estimate_tokens(header) + (estimate_tokens(notes) if notes else 0)
+        if used + cost > budget:
+            room = (budget - used - estimate_tokens(header)) * 4
+            if not notes or room < MIN_NOTES_CHARS:
+                break
+            notes = notes[:room].rsplit(" ", 1)[0] + " ..."
+            cost = estimate_tokens(header) + estimate_tokens(notes)
+        blocks.append(header + (f"\n  Notes: {notes}" if notes else ""))
+        sources.append({"sport": w["sport"], "workout_id": w["workout_id"], "score": score})
+        used += cost
+    return "\n\n".join(blocks), sources
+
+# ---------------------------------------------------------
+# Context assembly (cached per data version)
+# ---------------------------------------------------------
+def context_key(question, top_k, filters, version):
+    payload = json.dumps([normalize_query(question), top_k, filters or {}, version], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_context(question, top_k=RAG_TOP_K, filters=None):
+    """(context dict, cache hit?) for a question at the current data version."""
+    with pooled_connection() as conn:
+        sports = _setup(conn)
+        version = data_version(conn, sports)
+    key = context_key(question, top_k, filters, version)
+    context = context_cache.get(key)
+    if context is not None:
+        count("rag_context_cache_total", result="hit")
+        return context, True
+    count("rag_context_cache_total", result="miss")
+
+    with span("rag_retrieve"):
+        results = search_similar_swims(question, top_k, filters)
+
+    with pooled_connection() as conn:
+        aggregates = context_cache.get(f"aggregates:{version}")
+        if aggregates is None:
+            with span("rag_aggregates"):
+                aggregates = aggregates_block(conn, sports)
+            context_cache.put(f"aggregates:{version}", aggregates)
+        with span("sql_fetch", table="rag_workouts") as s:
+            workouts = fetch_workouts(conn, [wid for _, wid, _ in results])
+            loads = day_loads(conn, workouts)
+            s.rows = len(workouts)
+
+    text, sources = pack_workouts(results, workouts, loads)
+    context = {"aggregates": aggregates, "workouts": text, "sources": sources, "data_version": version}
+    context_cache.put(key, context)
+    return context, False
+
+def build_request(question, context):
+    """Messages API params: cached system prefix, per-question user turn."""
+    system = [
+        {"type": "text", "text": COACH_PREAMBLE, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": "Training-load summary:\n" + context["aggregates"],
+         "cache_control": {"type": "ephemeral"}},
+    ]
+    workouts = context["workouts"] or "(no matching workouts)"
+    prompt = f"Retrieved workouts (best match first):\n{workouts}\n\nQuestion: {question}"
+    return {
+        "model": RAG_MODEL,
+        "max_tokens": RAG_MAX_TOKENS,
+        "system": system,
+        "messages": [{"role": "user", "content": prompt}],
+    }
+
+# ---------------------------------------------------------
+# Answering (streamed)
+# ---------------------------------------------------------
+def usage_tokens(usage):
+    return {
+        "input": usage.input_tokens,
+        "output": usage.output_tokens,
+        "cache_write": getattr(usage, "cache_creation_input_tokens", None) or 0,
+        "cache_read": getattr(usage, "cache_read_input_tokens", None) or 0,
+    }
+
+def cost_usd(tokens):
+    input_price = RAG_PRICE_INPUT_PER_MTOK / 1e6
+    return round(
+        tokens["input"] * input_price
+        + tokens["cache_write"] * input_price * CACHE_WRITE_MULTIPLIER
+        + tokens["cache_read"] * input_price * CACHE_READ_MULTIPLIER
+        + tokens["output"] * RAG_PRICE_OUTPUT_PER_MTOK / 1e6,
+        6,
+    )
+
+def answer(question, top_k=RAG_TOP_K, filters=None, on_text=None):
+    """Answer `question`, calling on_text(chunk) as the reply streams in.
+
+    Returns {"answer", "sources", "context_cache_hit", "ttft_ms", "total_ms",
+    "tokens", "cost_usd"}.
+    """
+    started = time.perf_counter()
+    with span("rag_context"):
+        context, cache_hit = get_context(question, top_k, filters)
+
+    chunks = []
+    first_token = None
+    with span("anthropic_request", stream="true"):
+        with client.messages.stream(**build_request(question, context)) as stream:
+            for text in stream.text_stream:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    observe("rag_first_token", first_token - started)
+                chunks.append(text)
+                if on_text:
+                    on_text(text)
+            message = stream.get_final_message()
+
+    tokens = usage_tokens(message.usage)
+    for direction, amount in tokens.items():
+        count("anthropic_tokens_total", amount, direction=direction)
+    finished = time.perf_counter()
+    return {
+        "answer": "".join(chunks),
+        "sources": context["sources"],
+        "context_cache_hit": cache_hit,
+        "ttft_ms": round(((first_token or finished) - started) * 1000, 1),
+        "total_ms": round((finished - started) * 1000, 1),
+        "tokens": tokens,
+        "cost_usd": cost_usd(tokens),
+    }
+
+# ---------------------------------------------------------
+# CLI entry point
+# ---------------------------------------------------------
+def main(question, top_k=RAG_TOP_K, filters=None):
+    def write(text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    result = answer(question, top_k, filters, on_text=write)
+    print("\n\nSources: " + ", ".join(f"{s['sport']} {s['workout_id']}" for s in result["sources"]))
+    tokens = result["tokens"]
+    print(f"TTFT {result['ttft_ms']:.0f} ms, total {result['total_ms']:.0f} ms, "
+          f"context cache {'hit' if result['context_cache_hit'] else 'miss'}; "
+          f"tokens in {tokens['input']} (+{tokens['cache_read']} cached, {tokens['cache_write']} cache write), "
+          f"out {tokens['output']}; cost ${result['cost_usd']:.4f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a training question from the workout log.")
+    parser.add_argument("question", nargs="*", help="the question (prompted for when omitted)")
+    parser.add_argument("--top-k", type=int, default=RAG_TOP_K)
+    parser.add_argument("--sport", choices=list(SPORTS), action="append",
+                        help="only retrieve workouts of this sport (repeatable)")
+    parser.add_argument("--profile", action="store_true", help="run under cProfile (see instrumentation.py)")
+    args = parser.parse_args()
+    question = " ".join(args.question) or input("Ask about your training: ")
+    with session(args.profile):
+        main(question, args.top_k, {"sport": args.sport} if args.sport else None)
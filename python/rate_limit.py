@@ -0,0 +1,119 @@
+import email.utils
+import threading
+import time
+
+# ---------------------------------------------------------
+# TOKEN BUCKET
+# ---------------------------------------------------------
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`.
+
+    A rate of 0 or None disables the bucket (acquire never blocks).
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = (rate_per_minute or 0) / 60.0
+        self.capacity = float(capacity if capacity is not None else (rate_per_minute or 0))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available, then take them."""
+        if not self.enabled:
+            return
+        # A single request larger than the bucket would wait forever.
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, delta):
+        """Return (positive) or charge (negative) tokens after the real cost is known."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+
+# ---------------------------------------------------------
+# API RATE LIMITER
+# ---------------------------------------------------------
+class RateLimiter:
+    """Requests/min plus input and output tokens/min, shared by all workers.
+
+    acquire() reserves the estimated cost up front; settle() corrects the
+    buckets with the usage reported by the API. pause() makes every caller
+    wait out a server-provided retry-after window.
+    """
+
+    def __init__(self, requests_per_minute=None, input_tokens_per_minute=None,
+                 output_tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.input_tokens = TokenBucket(input_tokens_per_minute)
+        self.output_tokens = TokenBucket(output_tokens_per_minute)
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _wait_for_pause(self):
+        while True:
+            with self.lock:
+                wait = self.paused_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def acquire(self, input_tokens=0, output_tokens=0):
+        self._wait_for_pause()
+        self.requests.acquire(1)
+        self.input_tokens.acquire(input_tokens)
+        self.output_tokens.acquire(output_tokens)
+
+    def settle(self, estimated_input, estimated_output, actual_input, actual_output):
+        self.input_tokens.adjust(estimated_input - actual_input)
+        self.output_tokens.adjust(estimated_output - actual_output)
+
+
+# ---------------------------------------------------------
+# RETRY HELPERS
+# ---------------------------------------------------------
+def retry_after_seconds(headers):
+    """Parse a retry-after header (seconds or HTTP date). Returns None if absent."""
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff: base * 2^attempt seconds, capped."""
+    return min(cap, base * (2 ** attempt))
@@ -0,0 +1,170 @@
+"""
+Structured Filters for Semantic Search
+--------------------------------------
+
+Metadata filters on workout columns, applied before vector scoring so only
+matching workouts are scored. Column names follow swim_workouts; other
+sports map them through Sport.filter_expressions() (distances in yards).
+Durations and paces use the parsed *_seconds columns from
+sql/14_duration_seconds.sql; pace stays in the sport's own unit (seconds
+per 100 yd swimming, per mile running; rides have none).
+
+A filter is a plain dict:
+
+    {
+        "min_workout_date": "2025-01-01",        # inclusive
+        "max_workout_date": "2025-12-31",        # inclusive
+        "activity_type": ["Open Water Swimming"],# one value or a list
+        "min_distance_yards": 2000,
+        "min_avg_hr": 150,
+        "felt_rating": "hard",
+        "perceived_effort": ["medium", "high"],
+        "max_training_stress_score": 80,
+        "max_avg_pace_seconds": 105,            # 1:45 per 100 yd (swim)
+        "min_moving_time_seconds": 2700,         # 45 minutes or longer
+        "sport": ["swim", "run"],               # cross-sport index only
+    }
+
+The same dict is applied in memory by the vector index (build_mask over the
+column arrays it keeps) and pushed into SQL for the keyword side (to_sql →
+WHERE clause and parameters, backed by sql/09_search_filter_indexes.sql and
+sql/14_duration_seconds.sql).
+"""
+
+from datetime import date, datetime, timedelta
+import numpy as np
+
+# column → kind ("range" columns accept min_/max_, "category" columns accept
+# a value or a list of values)
+FILTER_COLUMNS = {
+    "workout_date":          "range",
+    "activity_type":         "category",
+    "distance_yards":        "range",
+    "avg_hr":                "range",
+    "felt_rating":           "category",
+    "perceived_effort":      "category",
+    "training_stress_score": "range",
+    "avg_pace_seconds":      "range",
+    "moving_time_seconds":   "range",
+    "sport":                 "category",
+}
+
+DATE_COLUMNS = {"workout_date"}
+
+# ------------------------------------------------------------
+# Parsing / validation
+# ------------------------------------------------------------
+
+def _parse_value(column, value):
+    if column in DATE_COLUMNS:
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        return datetime.fromisoformat(str(value))
+    return float(value)
+
+
+def normalize_filters(filters):
+    """Validate a filter dict → list of (column, op, value) with op in >=, <=, <, in."""
+    clauses = []
+    for key, value in (filters or {}).items():
+        if value is None:
+            continue
+        if key.startswith(("min_", "max_")):
+            column = key[4:]
+            if FILTER_COLUMNS.get(column) != "range":
+                raise ValueError(f"Unknown range filter: {key}")
+            parsed = _parse_value(column, value)
+            if key.startswith("min_"):
+                clauses.append((column, ">=", parsed))
+            elif column in DATE_COLUMNS and parsed.time() == datetime.min.time():
+                # A bare max date includes that whole day.
+                clauses.append((column, "<", parsed + timedelta(days=1)))
+            else:
+                clauses.append((column, "<=", parsed))
+        elif FILTER_COLUMNS.get(key) == "category":
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append((key, "in", values))
+        else:
+            raise ValueError(f"Unknown filter: {key}")
+    return clauses
+
+
+def parse_filter_params(params):
+    """Filters from URL query params ({key: [value, ...]}); lists allowed for categories."""
+    filters = {}
+    for key, values in params.items():
+        if key.startswith(("min_", "max_")):
+            filters[key] = values[-1]
+        elif FILTER_COLUMNS.get(key) == "category":
+            filters[key] = [v for value in values for v in value.split(",") if v]
+    return filters
+
+# ------------------------------------------------------------
+# In-memory column arrays
+# ------------------------------------------------------------
+
+def empty_columns():
+    return {
+        column: np.empty(0, dtype="datetime64[us]" if column in DATE_COLUMNS
+                         else object if kind == "category" else np.float64)
+        for column, kind in FILTER_COLUMNS.items()
+    }
+
+
+def to_column_arrays(rows):
+    """Row tuples in FILTER_COLUMNS order → {column: np.ndarray}."""
+    columns = list(FILTER_COLUMNS)
+    arrays = {}
+    for i, column in enumerate(columns):
+        values = [row[i] for row in rows]
+        if column in DATE_COLUMNS:
+            arrays[column] = np.array(values, dtype="datetime64[us]")
+        elif FILTER_COLUMNS[column] == "category":
+            arrays[column] = np.array(values, dtype=object)
+        else:
+            arrays[column] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return arrays
+
+
+def build_mask(columns, filters, size):
+    """Boolean row mask for `filters` over the index's column arrays."""
+    mask = np.ones(size, dtype=bool)
+    for column, op, value in normalize_filters(filters):
+        values = columns[column]
+        if op == "in":
+            mask &= np.isin(values, value)
+        else:
+            if column in DATE_COLUMNS:
+                value = np.datetime64(value, "us")
+            mask &= {">=": np.greater_equal, "<=": np.less_equal, "<": np.less}[op](values, value)
+    return mask
+
+# ------------------------------------------------------------
+# SQL push-down
+# ------------------------------------------------------------
+
+def to_sql(filters, alias=None, sport=None):
+    """(WHERE-clause fragment, params) for `filters`; ("1 = 1", []) when empty.
+
+    With a `sport` (sports.Sport) columns go through its filter expressions,
+    and a "sport" filter that excludes it yields "1 = 0". Without one the
+    "sport" filter is ignored (swim_workouts column names are used as is).
+    """
+    prefix = f"{alias}." if alias else ""
+    expressions = sport.filter_expressions(alias) if sport else {}
+    parts, params = [], []
+    for column, op, value in normalize_filters(filters):
+        if column == "sport":
+            if sport and sport.key not in value:
+                return "1 = 0", []
+            continue
+        expression = expressions.get(column, f"{prefix}{column}")
+        if op == "in":
+            parts.append(f"{expression} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            parts.append(f"{expression} {op} ?")
+            params.append(value)
+    return (" AND ".join(parts) or "1 = 1"), params
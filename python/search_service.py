@@ -0,0 +1,259 @@
+"""
+Semantic Search Service
+-----------------------
+
+Long-running local HTTP service around semantic_search.search_similar_swims.
+Everything expensive is created once and kept warm for the life of the
+process: the OpenAI client, the query-embedding cache, the SQL connection
+pool and the in-memory vector and keyword indexes. A background thread
+refreshes the indexes every SEARCH_INDEX_REFRESH_SECONDS, so requests rarely
+refresh them, though one that arrives while the index is stale and no refresh
+is running still does it inline. Requests do still run SQL of their own:
+filtered keyword searches push their filters down (keyword_candidates),
+SEARCH_RERANK re-reads stored vectors, and /ask reads the data version and
+the matched workouts on every call.
+
+Requests are handled concurrently, one thread per connection.
+
+Endpoints:
+    GET /search?q=<text>&top_n=5   → top matches as JSON; any search_filters
+                                     key narrows the candidates, e.g.
+                                     &min_workout_date=2025-06-01&min_avg_hr=150
+                                     &perceived_effort=medium,high&sport=swim,run
+                                     &mode=hybrid|vector|keyword overrides SEARCH_MODE
+    GET /ask?q=<question>&top_k=8  → RAG answer (rag.py) as Server-Sent Events:
+                                     "text" chunks as they stream, then "done"
+                                     with sources, TTFT, tokens and cost; the
+                                     search_filters keys narrow retrieval
+    GET /metrics                   → request count and p50/p95/p99 latency,
+                                     plus cache, pool and index stats
+    GET /metrics/prometheus        → per-stage timings and counters
+                                     (instrumentation.py) in Prometheus text format
+    GET /health                    → {"status": "ok"} once the index is loaded
+
+Usage:
+    python search_service.py [--host 127.0.0.1] [--port 8080]
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import semantic_search
+import rag
+from search_filters import normalize_filters, parse_filter_params
+from sports import split_key
+from utils import get_pool
+import instrumentation
+
+MAX_TOP_N = 100
+
+# ------------------------------------------------------------
+# Latency tracking
+# ------------------------------------------------------------
+
+class LatencyTracker:
+    """Rolling window of request latencies (ms) with percentile summaries."""
+
+    def __init__(self, window=10000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, ms, error=False):
+        with self.lock:
+            self.samples.append(ms)
+            self.count += 1
+            self.errors += int(error)
+
+    def summary(self):
+        with self.lock:
+            samples = np.array(self.samples, dtype=np.float64)
+            count, errors = self.count, self.errors
+        if not len(samples):
+            return {"count": count, "errors": errors}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            "count": count,
+            "errors": errors,
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(samples.max()), 2),
+        }
+
+latency = LatencyTracker()
+
+# ------------------------------------------------------------
+# Background index refresh
+# ------------------------------------------------------------
+
+def refresh_forever(stop):
+    while not stop.wait(semantic_search.SEARCH_INDEX_REFRESH_SECONDS):
+        try:
+            semantic_search.get_index()
+        except Exception as e:
+            print(f"Index refresh failed: {e}")
+
+# ------------------------------------------------------------
+# HTTP handler
+# ------------------------------------------------------------
+
+def result_json(score, key, notes):
+    sport, workout_id = split_key(key)
+    return {"sport": sport.key, "workout_id": workout_id, "score": score, "notes": notes}
+
+class SearchHandler(BaseHTTPRequestHandler):
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == "/search":
+            self._search(params)
+        elif url.path == "/ask":
+            self._ask(params)
+        elif url.path == "/metrics":
+            index = semantic_search._index
+            self._send_json(200, {
+                "latency": latency.summary(),
+                "query_cache": semantic_search.query_cache.stats(),
+                "sql_pool": get_pool().stats(),
+                "index_rows": len(index) if index is not None else 0,
+                "keyword_index_rows": len(semantic_search._lexical or ()),
+                "rag_context_cache": rag.context_cache.stats(),
+            })
+        elif url.path == "/metrics/prometheus":
+            body = instrumentation.registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/health":
+            ready = semantic_search._index is not None
+            self._send_json(200 if ready else 503, {"status": "ok" if ready else "loading"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _search(self, params):
+        started = time.perf_counter()
+        query = (params.get("q") or [""])[0].strip()
+        if not query:
+            self._send_json(400, {"error": "missing q"})
+            return
+        try:
+            top_n = min(MAX_TOP_N, max(1, int((params.get("top_n") or ["5"])[0])))
+        except ValueError:
+            self._send_json(400, {"error": "top_n must be an integer"})
+            return
+        mode = (params.get("mode") or [semantic_search.SEARCH_MODE])[0]
+        if mode not in semantic_search.SEARCH_MODES:
+            self._send_json(400, {"error": f"mode must be one of {', '.join(semantic_search.SEARCH_MODES)}"})
+            return
+        filters = parse_filter_params(params)
+        try:
+            normalize_filters(filters)
+        except ValueError as e:
+            self._send_json(400, {"error": f"bad filter: {e}"})
+            return
+
+        try:
+            results = semantic_search.search_similar_swims(query, top_n, filters, mode)
+        except Exception as e:
+            latency.record((time.perf_counter() - started) * 1000, error=True)
+            self._send_json(500, {"error": str(e)})
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        latency.record(elapsed_ms)
+        self._send_json(200, {
+            "query": query,
+            "mode": mode,
+            "filters": filters,
+            "latency_ms": round(elapsed_ms, 2),
+            "results": [result_json(score, key, notes) for score, key, notes in results],
+        })
+
+    def _ask(self, params):
+        question = (params.get("q") or [""])[0].strip()
+        if not question:
+            self._send_json(400, {"error": "missing q"})
+            return
+        try:
+            top_k = min(MAX_TOP_N, max(1, int((params.get("top_k") or [str(rag.RAG_TOP_K)])[0])))
+        except ValueError:
+            self._send_json(400, {"error": "top_k must be an integer"})
+            return
+        filters = parse_filter_params(params)
+        try:
+            normalize_filters(filters)
+        except ValueError as e:
+            self._send_json(400, {"error": f"bad filter: {e}"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(event, data):
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            result = rag.answer(question, top_k, filters or None, on_text=lambda text: send("text", {"text": text}))
+        except (BrokenPipeError, ConnectionResetError):
+            return   # client went away mid-answer
+        except Exception as e:
+            send("error", {"error": str(e)})
+            return
+        send("done", {key: value for key, value in result.items() if key != "answer"})
+
+    def log_message(self, format, *args):
+        pass   # keep per-request logging off the hot path
+
+# ------------------------------------------------------------
+# Entry point
+# ------------------------------------------------------------
+
+def serve(host="127.0.0.1", port=8080):
+    instrumentation.enable()
+    print("Loading vector index...")
+    index = semantic_search.get_index()
+    print(f"Index ready ({len(index)} workouts).")
+
+    stop = threading.Event()
+    threading.Thread(target=refresh_forever, args=(stop,), daemon=True).start()
+
+    server = ThreadingHTTPServer((host, port), SearchHandler)
+    server.daemon_threads = True
+    print(f"Serving semantic search on http://{host}:{port}/search?q=...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        get_pool().close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve semantic swim search over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -15,11 +15,20 @@ This matches the Datathon "Semantic Search Tool" category:
 """
 
 import os
+import time
+import threading
 import pyodbc
-import struct
 import numpy as np
 from openai import OpenAI
-from utils import get_connection
+from utils import pooled_connection, get_pool, EMBED_MODEL, EMBED_DIMENSIONS, embedding_model_tag
+from vector_index import VectorIndex
+from ann_index import IVFIndex
+from embedding_cache import EmbeddingCache
+from embedding_codec import unpack
+from lexical_index import LexicalIndex, LEXICAL_INDEX_PATH, reciprocal_rank_fusion
+from sports import configured_sports, active_sports, key_expression, split_key
+from search_filters import normalize_filters, to_sql
+from instrumentation import span, count
 
 # ------------------------------------------------------------
 # Configuration
@@ -28,63 +37,280 @@ from utils import get_connection
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 client = OpenAI(api_key=OPENAI_API_KEY)
 
+# Query embedding cache: in-memory LRU, plus a SQLite file when
+# QUERY_CACHE_PATH is set, capped at QUERY_CACHE_DISK_MAX_ENTRIES rows
+# (0 = unbounded). TTL of 0 means entries never expire.
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "0")) or None
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH")
+QUERY_CACHE_DISK_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_DISK_MAX_ENTRIES", "100000"))
+
+query_cache = EmbeddingCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_PATH,
+                             QUERY_CACHE_DISK_MAX_ENTRIES)
+
+# How often (seconds) the in-memory index polls SQL for changed rows.
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "60"))
+
+# "exact" scans every vector; "ivf" uses the approximate IVF-flat index.
+# SEARCH_IVF_NPROBE trades latency for recall. With SEARCH_INDEX_PATH set,
+# the IVF index is loaded from / saved to that .npz file between runs.
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "exact")
+SEARCH_IVF_NLIST = int(os.getenv("SEARCH_IVF_NLIST", "0")) or None
+SEARCH_IVF_NPROBE = int(os.getenv("SEARCH_IVF_NPROBE", "8"))
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH")
+
+# In-memory precision of the index (float32 | float16 | int8). With
+# SEARCH_RERANK > 0, that many top candidates are re-scored against the
+# stored embeddings before the final top_n is returned.
+SEARCH_INDEX_FORMAT = os.getenv("SEARCH_INDEX_FORMAT", "float32")
+SEARCH_RERANK = int(os.getenv("SEARCH_RERANK", "0"))
+
+# Two-stage search: score the first SEARCH_COARSE_DIMS dimensions of every
+# vector, then re-score the best SEARCH_COARSE_CANDIDATES at full dimension.
+SEARCH_COARSE_DIMS = int(os.getenv("SEARCH_COARSE_DIMS", "0")) or None
+SEARCH_COARSE_CANDIDATES = int(os.getenv("SEARCH_COARSE_CANDIDATES", "200"))
+
+# "hybrid" fuses BM25 keyword and vector rankings (reciprocal rank fusion),
+# "vector" is embeddings only, "keyword" is BM25 only (no embedding call).
+# Each side contributes its best SEARCH_HYBRID_CANDIDATES to the fusion.
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")
+SEARCH_HYBRID_CANDIDATES = int(os.getenv("SEARCH_HYBRID_CANDIDATES", "50"))
+SEARCH_MODES = ("hybrid", "vector", "keyword")
 
 
 # ------------------------------------------------------------
-# Embedding function (returns list of floats)
+# Embedding function (returns float32 vector, cached per normalized query)
 # ------------------------------------------------------------
 
 def embed(text: str):
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
-    )
-    return response.data[0].embedding  # list of floats
+    model_tag = embedding_model_tag()
+    cached = query_cache.get(model_tag, text)
+    if cached is not None:
+        count("query_embedding_total", source="cache")
+        return cached
 
-# ------------------------------------------------------------
-# Unpack VARBINARY → list of floats
-# ------------------------------------------------------------
+    count("query_embedding_total", source="api")
+    with span("openai_embeddings_request", caller="search"):
+        response = client.embeddings.create(
+            model=EMBED_MODEL,
+            input=text,
+            dimensions=EMBED_DIMENSIONS
+        )
+    count("openai_tokens_total", response.usage.total_tokens, caller="search")
+    return query_cache.put(model_tag, text, response.data[0].embedding)
+
+# The embeddings endpoint accepts at most 2048 inputs per request.
+EMBED_MAX_BATCH_INPUTS = 2048
+
+def embed_many(texts):
+    """Embed many queries: cache hits are free, all misses go in one batched request."""
+    model_tag = embedding_model_tag()
+    vectors = [query_cache.get(model_tag, text) for text in texts]
+    missing = [i for i, vec in enumerate(vectors) if vec is None]
+
+    for start in range(0, len(missing), EMBED_MAX_BATCH_INPUTS):
+        batch = missing[start:start + EMBED_MAX_BATCH_INPUTS]
+        with span("openai_embeddings_request", caller="search") as s:
+            s.rows = len(batch)
+            response = client.embeddings.create(
+                model=EMBED_MODEL,
+                input=[texts[i] for i in batch],
+                dimensions=EMBED_DIMENSIONS
+            )
+        count("openai_tokens_total", response.usage.total_tokens, caller="search")
+        for d in response.data:
+            i = batch[d.index]
+            vectors[i] = query_cache.put(model_tag, texts[i], d.embedding)
 
-def unpack_embedding(binary_vec):
-    return struct.unpack("1536f", binary_vec)
+    return np.vstack(vectors)
 
 # ------------------------------------------------------------
-# Cosine similarity
+# In-memory vector index (loaded once, refreshed incrementally)
 # ------------------------------------------------------------
 
-def cosine_similarity(a, b):
-    a = np.array(a, dtype=np.float32)
-    b = np.array(b, dtype=np.float32)
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+_index = None
+_lexical = None
+_last_refresh = 0.0
+_refresh_lock = threading.Lock()
+
+def fetch_stored_vectors(workout_keys):
+    """Full-precision vectors for the given cross-sport keys, used to re-rank candidates.
+
+    None for keys whose row or embedding is gone since the index last refreshed.
+    """
+    by_sport = {}
+    for key in workout_keys:
+        sport, workout_id = split_key(key)
+        by_sport.setdefault(sport, []).append(workout_id)
+
+    by_key = {}
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        for sport, workout_ids in by_sport.items():
+            placeholders = ",".join("?" * len(workout_ids))
+            cursor.execute(
+                f"SELECT {key_expression(sport)}, embedding FROM {sport.table} "
+                f"WHERE {sport.id_column} IN ({placeholders})",
+                workout_ids
+            )
+            by_key.update((key, unpack(blob)) for key, blob in cursor.fetchall() if blob is not None)
+        cursor.close()
+    return [by_key.get(key) for key in workout_keys]
+
+def new_index():
+    """One index over every configured sport (see sports.py)."""
+    rerank_source = fetch_stored_vectors if SEARCH_RERANK else None
+    sports = configured_sports()
+    model_tag = embedding_model_tag()
+    if SEARCH_ENGINE == "ivf":
+        if SEARCH_INDEX_PATH and os.path.exists(SEARCH_INDEX_PATH):
+            index = IVFIndex.from_file(SEARCH_INDEX_PATH, rerank_source, sports, model_tag)
+            if index.index_format == SEARCH_INDEX_FORMAT and index.dim == EMBED_DIMENSIONS:
+                index.nprobe = SEARCH_IVF_NPROBE
+                return index
+        return IVFIndex(dim=EMBED_DIMENSIONS, nlist=SEARCH_IVF_NLIST, nprobe=SEARCH_IVF_NPROBE,
+                        index_format=SEARCH_INDEX_FORMAT, rerank_source=rerank_source, sports=sports,
+                        model_tag=model_tag)
+    if SEARCH_ENGINE != "exact":
+        raise RuntimeError(f"Unknown SEARCH_ENGINE: {SEARCH_ENGINE}")
+    return VectorIndex(dim=EMBED_DIMENSIONS, index_format=SEARCH_INDEX_FORMAT, rerank_source=rerank_source,
+                       coarse_dims=SEARCH_COARSE_DIMS, coarse_candidates=SEARCH_COARSE_CANDIDATES,
+                       sports=sports, model_tag=model_tag)
+
+def new_lexical_index():
+    sports = configured_sports()
+    if LEXICAL_INDEX_PATH and os.path.exists(LEXICAL_INDEX_PATH):
+        index = LexicalIndex.from_file(LEXICAL_INDEX_PATH)
+        index.sports = sports
+        return index
+    return LexicalIndex(sports)
+
+def get_index():
+    """Shared index; loads on first use and refreshes when it is stale.
+
+    Safe to call from many threads: only one refreshes at a time while the
+    others keep searching the current index. The keyword index is refreshed
+    alongside it.
+    """
+    global _index, _lexical, _last_refresh
+    if _index is not None and time.monotonic() - _last_refresh < SEARCH_INDEX_REFRESH_SECONDS:
+        return _index
+    if not _refresh_lock.acquire(blocking=_index is None):
+        return _index
+    try:
+        if _index is None or time.monotonic() - _last_refresh >= SEARCH_INDEX_REFRESH_SECONDS:
+            with pooled_connection() as conn:
+                index = new_index() if _index is None else _index
+                with span("index_refresh", index="vector") as s:
+                    changed = s.rows = index.refresh(conn)
+                lexical = new_lexical_index() if _lexical is None else _lexical
+                with span("index_refresh", index="keyword") as s:
+                    lexical_changed = s.rows = lexical.refresh(conn)
+                _index, _lexical = index, lexical
+            if changed and SEARCH_INDEX_PATH and isinstance(index, IVFIndex):
+                index.save(SEARCH_INDEX_PATH)
+            if lexical_changed and LEXICAL_INDEX_PATH:
+                lexical.save(LEXICAL_INDEX_PATH)
+            _last_refresh = time.monotonic()
+    finally:
+        _refresh_lock.release()
+    return _index
 
 # ------------------------------------------------------------
 # Main semantic search
 # ------------------------------------------------------------
 
-def search_similar_swims(query_text: str, top_n: int = 5):
-    # 1. Embed the query
-    query_vec = embed(query_text)
+def keyword_candidates(filters):
+    """Workout keys allowed by `filters` for the keyword side (None = no filter).
+
+    Pushed down to SQL (search_filters.to_sql) rather than read from the
+    vector index, so workouts with notes but no embedding yet still match.
+    """
+    if not normalize_filters(filters):
+        return None
+    keys = set()
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        for sport in active_sports(conn, _lexical.sports):
+            where, params = to_sql(filters, sport=sport)
+            cursor.execute(f"SELECT {key_expression(sport)} FROM {sport.table} WHERE {where}", *params)
+            keys.update(r[0] for r in cursor.fetchall())
+        cursor.close()
+    return keys
+
+def fuse(vector_results, keyword_results, top_n):
+    """Reciprocal rank fusion → [(fused score, workout_key, notes)]."""
+    notes = {wid: n for _, wid, n in keyword_results}
+    notes.update({wid: n for _, wid, n in vector_results})
+    fused = reciprocal_rank_fusion([
+        [wid for _, wid, _ in vector_results],
+        [wid for _, wid, _ in keyword_results],
+    ])
+    return [(score, wid, notes[wid]) for score, wid in fused[:top_n]]
+
+def search_similar_swims(query_text: str, top_n: int = 5, filters: dict = None, mode: str = None):
+    """Top-n similar workouts across every sport as [(score, workout_key, notes)].
 
-    # 2. Load all workouts + embeddings from SQL
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT swim_workout_id, notes, embedding FROM swim_workouts")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    sports.split_key(workout_key) gives (sport, workout id); swim keys are
+    the swim_workout_id itself. `filters` (see search_filters.py) restricts
+    the candidates, e.g. {"sport": "run", "min_avg_hr": 150}. `mode` overrides
+    SEARCH_MODE; in "hybrid" mode the score is the fused RRF score, not a
+    cosine similarity.
+    """
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    with span("search", mode=mode):
+        index = get_index()
 
-    # 3. Compute cosine similarity in Python
-    results = []
-    for workout_id, notes, binary_vec in rows:
-        vec = unpack_embedding(binary_vec)
-        sim = cosine_similarity(query_vec, vec)
-        results.append((sim, workout_id, notes))
+        if mode == "keyword":
+            with span("search_keyword"):
+                return _lexical.search(query_text, top_n, keyword_candidates(filters))
 
-    # 4. Sort by similarity (descending)
-    results.sort(key=lambda x: x[0], reverse=True)
+        # 1. Embed the query
+        with span("search_embed"):
+            query_vec = embed(query_text)
 
-    # 5. Return top N
-    return results[:top_n]
+        # 2. Score the matching rows of the in-memory index (one matrix-vector product + top-k)
+        if mode == "vector":
+            with span("search_vector"):
+                return index.search(query_vec, top_n, SEARCH_RERANK, filters)
+
+        depth = max(top_n, SEARCH_HYBRID_CANDIDATES)
+        with span("search_vector"):
+            vector_results = index.search(query_vec, depth, SEARCH_RERANK, filters)
+        with span("search_keyword"):
+            keyword_results = _lexical.search(query_text, depth, keyword_candidates(filters))
+        with span("search_fuse"):
+            return fuse(vector_results, keyword_results, top_n)
+
+def search_many(queries, top_n: int = 5, filters: dict = None, mode: str = None):
+    """Batch version of search_similar_swims for many canned queries.
+
+    Embeds every query in one request and scores them against the corpus as
+    matrix-matrix products. Returns one result list per query, in order.
+    """
+    if not queries:
+        return []
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    queries = list(queries)
+    index = get_index()
+
+    if mode == "keyword":
+        candidates = keyword_candidates(filters)
+        return [_lexical.search(q, top_n, candidates) for q in queries]
+    if mode == "vector":
+        return index.search_many(embed_many(queries), top_n, SEARCH_RERANK, filters)
+
+    depth = max(top_n, SEARCH_HYBRID_CANDIDATES)
+    vector_results = index.search_many(embed_many(queries), depth, SEARCH_RERANK, filters)
+    candidates = keyword_candidates(filters)
+    return [
+        fuse(vector, _lexical.search(q, depth, candidates), top_n)
+        for q, vector in zip(queries, vector_results)
+    ]
 
 # ------------------------------------------------------------
 # CLI entry point
@@ -95,6 +321,10 @@ if __name__ == "__main__":
     results = search_similar_swims(query)
 
     print("\nTop matches:\n")
-    for sim, workout_id, notes in results:
-        print(f"Workout {workout_id} | similarity={sim:.4f}")
-        print(f"Notes: {notes}\n")
\ No newline at end of file
+    for score, key, notes in results:
+        sport, workout_id = split_key(key)
+        print(f"{sport.key.capitalize()} workout {workout_id} | {SEARCH_MODE} score={score:.4f}")
+        print(f"Notes: {notes}\n")
+
+    print(f"Query cache: {query_cache.stats()}")
+    print(f"SQL pool: {get_pool().stats()}")
\ No newline at end of file
@@ -0,0 +1,324 @@
+"""
+Sport Registry
+--------------
+
+One entry per activity table. Everything sport-specific lives here: the
+table and id column, the metric columns sent to the model, the Garmin CSV
+column mapping, the AI generation tracking tables and the prompt template.
+The loader, 04_b generation, embedding regeneration and search pipelines
+are generic and loop over the registered sports.
+
+Workouts from different tables share one search index. Their ids are
+packed into a single int64 key, (sport.code << 32) | workout_id. Swim is
+code 0, so swim keys are the plain swim_workout_id.
+
+SPORTS (env) limits which sports the pipelines touch; by default every
+registered sport whose table exists is used.
+"""
+
+import os
+from dataclasses import dataclass, field
+
+KEY_SHIFT = 32
+
+# ------------------------------------------------------------
+# Prompt template
+# ------------------------------------------------------------
+# {data}, {age} and {gender} are filled per workout; the rest per sport.
+PROMPT_TEMPLATE = """
+You are an expert endurance {coach} coach. Analyze the following {noun} workout and return STRICT JSON.
+
+Workout details:
+{{data}}
+
+The athlete was {{age}} years old at the time of this workout.
+The athlete is {{gender}}. Use gender only to interpret heart‑rate‑based physiology, not as a determinant of performance.
+Use age only to interpret heart‑rate‑based metrics, not as the primary determinant of difficulty.
+
+Generate:
+1. "summary": 2–3 sentences describing how the {session} likely felt, focusing on {focus}.
+2. "felt_rating": one of ["easy", "moderate", "hard"].
+3. "perceived_effort": one of ["low", "medium", "high"].
+
+Return ONLY valid JSON in this exact shape, with NO code fences:
+{{{{
+  "summary": "string",
+  "felt_rating": "easy|moderate|hard",
+  "perceived_effort": "low|medium|high"
+}}}}
+"""
+
+# Packed variant: several workouts per request (04_b with AI_PACK_SIZE > 1).
+# Age varies by workout date, so each workout carries its own athlete_age.
+PACKED_PROMPT_TEMPLATE = """
+You are an expert endurance {coach} coach. Analyze each of the following {noun} workouts and return STRICT JSON.
+
+Workouts (a JSON array; "athlete_age" is the athlete's age at the time of that workout):
+{{data}}
+
+The athlete is {{gender}}. Use gender only to interpret heart‑rate‑based physiology, not as a determinant of performance.
+Use age only to interpret heart‑rate‑based metrics, not as the primary determinant of difficulty.
+
+For EACH workout generate:
+1. "summary": 2–3 sentences describing how the {session} likely felt, focusing on {focus}.
+2. "felt_rating": one of ["easy", "moderate", "hard"].
+3. "perceived_effort": one of ["low", "medium", "high"].
+
+Return ONLY a valid JSON array with exactly one object per workout, with NO code fences:
+[
+  {{{{
+    "{id_column}": 123,
+    "summary": "string",
+    "felt_rating": "easy|moderate|hard",
+    "perceived_effort": "low|medium|high"
+  }}}}
+]
+"""
+
+# ------------------------------------------------------------
+# Registry
+# ------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Sport:
+    key: str                    # "swim", "bike", "run"
+    code: int                   # high bits of the cross-sport search key
+    table: str
+    id_column: str
+    distance_column: str
+    yards_per_distance_unit: float
+    # Metric columns sent to the model (besides id, date and type).
+    metric_columns: tuple
+    # (table column, Garmin CSV header, parser kind: text|float|int|datetime)
+    csv_columns: tuple
+    attempts_table: str
+    dead_letter_table: str
+    prompt_template: str = field(repr=False)
+    packed_prompt_template: str = field(repr=False)
+    # Bump when prompt_template changes: cached AI outputs for older
+    # versions are evicted (ai_output_cache.py).
+    prompt_version: int = 1
+    # The same for packed_prompt_template (outputs of packed requests).
+    packed_prompt_version: int = 1
+
+    @property
+    def merge_procedure(self):
+        return f"dbo.merge_{self.table}_stage"
+
+    @property
+    def stage_table(self):
+        return f"#{self.table}_stage"
+
+    def prompt(self, data, age, gender):
+        return self.prompt_template.format(data=data, age=age, gender=gender)
+
+    def packed_prompt(self, data, gender):
+        """Prompt for a JSON array of workouts, each with its own athlete_age."""
+        return self.packed_prompt_template.format(data=data, gender=gender)
+
+    def filter_expressions(self, alias=None):
+        """SQL expression per search_filters.FILTER_COLUMNS entry (distances in yards, times in seconds)."""
+        p = f"{alias}." if alias else ""
+        distance = f"{p}{self.distance_column}"
+        if self.yards_per_distance_unit != 1:
+            distance = f"{distance} * {self.yards_per_distance_unit}"
+        return {
+            "workout_date": f"{p}workout_date",
+            "activity_type": f"{p}activity_type",
+            "distance_yards": distance,
+            "avg_hr": f"{p}avg_hr",
+            "felt_rating": f"{p}felt_rating",
+            "perceived_effort": f"{p}perceived_effort",
+            "training_stress_score": f"{p}training_stress_score",
+            "avg_pace_seconds": f"{p}avg_pace_seconds" if "avg_pace" in self.metric_columns else "NULL",
+            "moving_time_seconds": f"{p}moving_time_seconds",
+            "sport": f"N'{self.key}'",
+        }
+
+
+def _template(coach, noun, session, focus):
+    return PROMPT_TEMPLATE.format(coach=coach, noun=noun, session=session, focus=focus)
+
+
+def _packed_template(id_column, coach, noun, session, focus):
+    return PACKED_PROMPT_TEMPLATE.format(
+        id_column=id_column, coach=coach, noun=noun, session=session, focus=focus
+    )
+
+
+COMMON_CSV_HEAD = (
+    ("activity_type",         "Activity Type",          "text"),
+    ("workout_date",          "Date",                   "datetime"),
+    ("title",                 "Title",                  "text"),
+)
+
+COMMON_CSV_TAIL = (
+    ("best_lap_time",         "Best Lap Time",          "text"),
+    ("number_of_laps",        "Number of Laps",         "int"),
+    ("moving_time",           "Moving Time",            "text"),
+    ("elapsed_time",          "Elapsed Time",           "text"),
+    ("training_stress_score", "Training Stress Score®", "float"),
+)
+
+SWIM = Sport(
+    key="swim",
+    code=0,
+    table="swim_workouts",
+    id_column="swim_workout_id",
+    distance_column="distance_yards",
+    yards_per_distance_unit=1,
+    metric_columns=(
+        "title", "distance_yards", "calories", "time", "avg_hr", "max_hr", "aerobic_te",
+        "avg_pace", "best_pace", "total_strokes", "avg_swolf", "avg_stroke_rate",
+        "best_lap_time", "number_of_laps", "moving_time", "elapsed_time", "training_stress_score",
+    ),
+    csv_columns=COMMON_CSV_HEAD + (
+        ("distance_yards",        "Distance",               "float"),
+        ("calories",              "Calories",               "int"),
+        ("time",                  "Time",                   "text"),
+        ("avg_hr",                "Avg HR",                 "int"),
+        ("max_hr",                "Max HR",                 "int"),
+        ("aerobic_te",            "Aerobic TE",             "float"),
+        ("avg_pace",              "Avg Pace",               "text"),
+        ("best_pace",             "Best Pace",              "text"),
+        ("total_strokes",         "Total Strokes",          "int"),
+        ("avg_swolf",             "Avg. Swolf",             "float"),
+        ("avg_stroke_rate",       "Avg Stroke Rate",        "float"),
+    ) + COMMON_CSV_TAIL,
+    attempts_table="ai_generation_attempts",
+    dead_letter_table="ai_generation_dead_letter",
+    prompt_template=_template("swim", "swim", "swim", "pacing, efficiency, aerobic load, and technique"),
+    packed_prompt_template=_packed_template("swim_workout_id", "swim", "swim", "swim", "pacing, efficiency, aerobic load, and technique"),
+)
+
+BIKE = Sport(
+    key="bike",
+    code=1,
+    table="bike_workouts",
+    id_column="bike_workout_id",
+    distance_column="distance_miles",
+    yards_per_distance_unit=1760,
+    metric_columns=(
+        "title", "distance_miles", "calories", "time", "avg_hr", "max_hr", "aerobic_te",
+        "avg_speed_mph", "max_speed_mph", "total_ascent_ft", "total_descent_ft",
+        "avg_bike_cadence", "max_bike_cadence", "avg_power", "max_power", "normalized_power",
+        "best_lap_time", "number_of_laps", "moving_time", "elapsed_time", "training_stress_score",
+    ),
+    csv_columns=COMMON_CSV_HEAD + (
+        ("distance_miles",        "Distance",               "float"),
+        ("calories",              "Calories",               "int"),
+        ("time",                  "Time",                   "text"),
+        ("avg_hr",                "Avg HR",                 "int"),
+        ("max_hr",                "Max HR",                 "int"),
+        ("aerobic_te",            "Aerobic TE",             "float"),
+        ("avg_speed_mph",         "Avg Speed",              "float"),
+        ("max_speed_mph",         "Max Speed",              "float"),
+        ("total_ascent_ft",       "Total Ascent",           "float"),
+        ("total_descent_ft",      "Total Descent",          "float"),
+        ("avg_bike_cadence",      "Avg Bike Cadence",       "int"),
+        ("max_bike_cadence",      "Max Bike Cadence",       "int"),
+        ("avg_power",             "Avg Power",              "int"),
+        ("max_power",             "Max Power",              "int"),
+        ("normalized_power",      "Normalized Power® (NP®)", "int"),
+    ) + COMMON_CSV_TAIL,
+    attempts_table="bike_ai_generation_attempts",
+    dead_letter_table="bike_ai_generation_dead_letter",
+    prompt_template=_template("cycling", "bike", "ride", "pacing, power and cadence, aerobic load, and terrain"),
+    packed_prompt_template=_packed_template("bike_workout_id", "cycling", "bike", "ride", "pacing, power and cadence, aerobic load, and terrain"),
+)
+
+RUN = Sport(
+    key="run",
+    code=2,
+    table="run_workouts",
+    id_column="run_workout_id",
+    distance_column="distance_miles",
+    yards_per_distance_unit=1760,
+    metric_columns=(
+        "title", "distance_miles", "calories", "time", "avg_hr", "max_hr", "aerobic_te",
+        "avg_pace", "best_pace", "avg_run_cadence", "max_run_cadence", "total_ascent_ft",
+        "total_descent_ft", "avg_stride_length", "avg_power",
+        "best_lap_time", "number_of_laps", "moving_time", "elapsed_time", "training_stress_score",
+    ),
+    csv_columns=COMMON_CSV_HEAD + (
+        ("distance_miles",        "Distance",               "float"),
+        ("calories",              "Calories",               "int"),
+        ("time",                  "Time",                   "text"),
+        ("avg_hr",                "Avg HR",                 "int"),
+        ("max_hr",                "Max HR",                 "int"),
+        ("aerobic_te",            "Aerobic TE",             "float"),
+        ("avg_pace",              "Avg Pace",               "text"),
+        ("best_pace",             "Best Pace",              "text"),
+        ("avg_run_cadence",       "Avg Run Cadence",        "int"),
+        ("max_run_cadence",       "Max Run Cadence",        "int"),
+        ("total_ascent_ft",       "Total Ascent",           "float"),
+        ("total_descent_ft",      "Total Descent",          "float"),
+        ("avg_stride_length",     "Avg Stride Length",      "float"),
+        ("avg_power",             "Avg Power",              "int"),
+    ) + COMMON_CSV_TAIL,
+    attempts_table="run_ai_generation_attempts",
+    dead_letter_table="run_ai_generation_dead_letter",
+    # Marathons and races are run_workouts rows; activity_type tells them apart.
+    prompt_template=_template("running", "run", "run", "pacing, cadence, aerobic load, and race or training intent"),
+    packed_prompt_template=_packed_template("run_workout_id", "running", "run", "run", "pacing, cadence, aerobic load, and race or training intent"),
+)
+
+SPORTS = {sport.key: sport for sport in (SWIM, BIKE, RUN)}
+SPORTS_BY_CODE = {sport.code: sport for sport in SPORTS.values()}
+
+# ------------------------------------------------------------
+# Lookup helpers
+# ------------------------------------------------------------
+
+def get_sport(key):
+    try:
+        return SPORTS[key]
+    except KeyError:
+        raise ValueError(f"Unknown sport: {key} (expected one of {', '.join(SPORTS)})")
+
+
+def configured_sports():
+    """Sports named in SPORTS (comma-separated), else every registered sport."""
+    names = [s.strip() for s in os.getenv("SPORTS", "").split(",") if s.strip()]
+    return [get_sport(name) for name in names] if names else list(SPORTS.values())
+
+
+def active_sports(conn, sports=None):
+    """The configured sports whose tables exist in this database."""
+    cursor = conn.cursor()
+    active = []
+    for sport in sports or configured_sports():
+        cursor.execute("SELECT OBJECT_ID(?, 'U')", f"dbo.{sport.table}")
+        if cursor.fetchone()[0] is not None:
+            active.append(sport)
+    cursor.close()
+    return active
+
+
+def row_version_ceiling(cursor):
+    """MIN_ACTIVE_ROWVERSION(): every row_version below it is committed.
+
+    Incremental readers scan `row_version >= watermark AND row_version < ceiling`
+    and store the ceiling as their next watermark. Rows written by a
+    transaction that is still open sit at or above the ceiling, so they are
+    read on a later pass instead of being skipped once it commits.
+    """
+    cursor.execute("SELECT MIN_ACTIVE_ROWVERSION()")
+    return bytes(cursor.fetchone()[0])
+
+
+def workout_key(sport, workout_id):
+    """Cross-sport search key for a workout id."""
+    return (sport.code << KEY_SHIFT) | int(workout_id)
+
+
+def key_expression(sport, alias=None):
+    """SQL expression computing workout_key() for each row of sport.table."""
+    prefix = f"{alias}." if alias else ""
+    return f"(CAST({prefix}{sport.id_column} AS BIGINT) + {sport.code << KEY_SHIFT})"
+
+
+def split_key(key):
+    """Search key → (Sport, workout id)."""
+    key = int(key)
+    return SPORTS_BY_CODE[key >> KEY_SHIFT], key & ((1 << KEY_SHIFT) - 1)
@@ -0,0 +1,359 @@
+"""
+Fake Anthropic API Server
+-------------------------
+Local stand-in for the Messages and Message Batches endpoints, so the AI
+generation pipeline (including 04_b --bulk) can be exercised end to end
+without an API key or token spend.
+
+Endpoints:
+    POST /v1/messages                          → one canned message (SSE events
+                                                 when "stream": true)
+    POST /v1/messages/batches                  → create a batch
+    GET  /v1/messages/batches                  → every batch, newest first (one page)
+    GET  /v1/messages/batches/<id>             → batch status ("ended" after --batch-seconds)
+    GET  /v1/messages/batches/<id>/results     → JSONL results
+    POST /v1/messages/batches/<id>/cancel      → cancel a batch
+
+Every reply is a valid summary JSON for the workout prompt (a JSON array
+for packed multi-workout prompts). --error-rate makes that fraction of
+requests fail (HTTP 500 for /v1/messages, an "errored" result inside
+batches). --latency-ms delays each /v1/messages reply and
+--rate-limit-rate answers that fraction with HTTP 429 and a short
+retry-after.
+
+System blocks marked with cache_control are tracked like the prompt cache:
+the first request with a given prefix reports cache_creation_input_tokens,
+repeats report cache_read_input_tokens (no minimum prefix length here).
+
+Usage:
+    python tests/fake_anthropic_server.py [--port 8089] [--batch-seconds 5] [--error-rate 0.0]
+                                          [--latency-ms 0] [--rate-limit-rate 0.0]
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8089 python 04_b_generate_swim_ai_fields_anthropic.py --bulk
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FELT = ["easy", "moderate", "hard"]
+EFFORT = ["low", "medium", "high"]
+
+RETRY_AFTER_SECONDS = "0.05"
+
+BATCH_PATH = re.compile(r"^/v1/messages/batches/([^/]+)(/results|/cancel)?$")
+WORKOUT_ID = re.compile(r'"(\w+_workout_id)": (\d+)')
+PACKED_MARKER = "For EACH workout"
+
+# ------------------------------------------------------------
+# Canned responses
+# ------------------------------------------------------------
+
+def fake_fields(seed):
+    return {
+        "summary": "A steady session with controlled pacing and consistent technique. "
+                   "Aerobic load was moderate and the effort stayed sustainable throughout.",
+        "felt_rating": FELT[seed % 3],
+        "perceived_effort": EFFORT[seed % 3],
+    }
+
+
+def system_text(params):
+    """(whole system prompt, prefix up to the last cache_control block)."""
+    system = params.get("system") or ""
+    if isinstance(system, str):
+        return system, ""
+    text = cached = ""
+    for block in system:
+        text += block.get("text", "")
+        if block.get("cache_control"):
+            cached = text
+    return text, cached
+
+
+def fake_message(params, prompt_cache=None):
+    prompt = params["messages"][-1]["content"]
+    if isinstance(prompt, list):
+        prompt = " ".join(block.get("text", "") for block in prompt)
+    if PACKED_MARKER in prompt:
+        # Packed prompt: one entry per workout id listed before the instructions.
+        workouts = WORKOUT_ID.findall(prompt.split(PACKED_MARKER)[0])
+        text = json.dumps([
+            {column: int(wid), **fake_fields(int(wid))} for column, wid in workouts
+        ])
+    else:
+        text = json.dumps(fake_fields(sum(prompt.encode("utf-8"))))
+
+    system, cached = system_text(params)
+    usage = {"input_tokens": (len(system) + len(prompt)) // 4 + 1, "output_tokens": len(text) // 4 + 1,
+             "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+    if cached and prompt_cache is not None:
+        cached_tokens = len(cached) // 4
+        digest = hashlib.sha256(cached.encode("utf-8")).hexdigest()
+        if digest in prompt_cache:
+            usage["cache_read_input_tokens"] = cached_tokens
+        else:
+            prompt_cache.add(digest)
+            usage["cache_creation_input_tokens"] = cached_tokens
+        usage["input_tokens"] -= cached_tokens
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "fake-model"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": usage,
+    }
+
+
+def stream_events(message, chunk_chars=16):
+    """(event, data) pairs of a streamed Messages response for `message`."""
+    text = message["content"][0]["text"]
+    start = {**message, "content": [], "stop_reason": None,
+             "usage": {**message["usage"], "output_tokens": 1}}
+    yield "message_start", {"type": "message_start", "message": start}
+    yield "content_block_start", {"type": "content_block_start", "index": 0,
+                                  "content_block": {"type": "text", "text": ""}}
+    for i in range(0, len(text), chunk_chars):
+        yield "content_block_delta", {"type": "content_block_delta", "index": 0,
+                                      "delta": {"type": "text_delta", "text": text[i:i + chunk_chars]}}
+    yield "content_block_stop", {"type": "content_block_stop", "index": 0}
+    yield "message_delta", {"type": "message_delta",
+                            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                            "usage": {"output_tokens": message["usage"]["output_tokens"]}}
+    yield "message_stop", {"type": "message_stop"}
+
+
+def iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z") if ts else None
+
+# ------------------------------------------------------------
+# Batch store
+# ------------------------------------------------------------
+
+class BatchStore:
+
+    def __init__(self, batch_seconds, error_rate):
+        self.batch_seconds = batch_seconds
+        self.error_rate = error_rate
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def create(self, requests):
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.batches[batch_id] = {
+                "requests": requests,
+                "created": time.time(),
+                "canceled": None,
+                "results": None,
+            }
+        return batch_id
+
+    def _finish(self, batch):
+        if batch["results"] is None:
+            results = []
+            for request in batch["requests"]:
+                if batch["canceled"]:
+                    result = {"type": "canceled"}
+                elif random.random() < self.error_rate:
+                    result = {"type": "errored", "error": {
+                        "type": "error", "error": {"type": "api_error", "message": "fake failure"}}}
+                else:
+                    result = {"type": "succeeded", "message": fake_message(request["params"])}
+                results.append({"custom_id": request["custom_id"], "result": result})
+            batch["results"] = results
+
+    def describe(self, batch_id, base_url):
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            ended = batch["canceled"] or time.time() - batch["created"] >= self.batch_seconds
+            counts = {"processing": len(batch["requests"]), "succeeded": 0,
+                      "errored": 0, "canceled": 0, "expired": 0}
+            if ended:
+                self._finish(batch)
+                counts["processing"] = 0
+                for entry in batch["results"]:
+                    counts[entry["result"]["type"]] += 1
+            return {
+                "id": batch_id,
+                "type": "message_batch",
+                "processing_status": "ended" if ended else "in_progress",
+                "request_counts": counts,
+                "created_at": iso(batch["created"]),
+                "expires_at": iso(batch["created"] + timedelta(days=1).total_seconds()),
+                "ended_at": iso(time.time()) if ended else None,
+                "cancel_initiated_at": iso(batch["canceled"]),
+                "archived_at": None,
+                "results_url": f"{base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+            }
+
+    def list(self, base_url):
+        with self.lock:
+            batch_ids = sorted(self.batches, key=lambda b: self.batches[b]["created"], reverse=True)
+        return [self.describe(batch_id, base_url) for batch_id in batch_ids]
+
+    def results(self, batch_id):
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            return None if batch is None or batch["results"] is None else list(batch["results"])
+
+    def cancel(self, batch_id):
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if batch is not None and batch["canceled"] is None:
+                batch["canceled"] = time.time()
+            return batch is not None
+
+# ------------------------------------------------------------
+# HTTP handler
+# ------------------------------------------------------------
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    store = None
+    prompt_cache = None
+    error_rate = 0.0
+    latency = 0.0
+    rate_limit_rate = 0.0
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, message):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        for event, data in stream_events(message):
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _not_found(self):
+        self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": "not found"}})
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if path == "/v1/messages":
+            params = self._read_json()
+            if self.latency:
+                time.sleep(self.latency)
+            if random.random() < self.rate_limit_rate:
+                self._send_json(429, {"type": "error", "error": {"type": "rate_limit_error", "message": "fake rate limit"}},
+                                {"retry-after": RETRY_AFTER_SECONDS})
+            elif random.random() < self.error_rate:
+                self._send_json(500, {"type": "error", "error": {"type": "api_error", "message": "fake failure"}})
+            elif params.get("stream"):
+                self._send_stream(fake_message(params, self.prompt_cache))
+            else:
+                self._send_json(200, fake_message(params, self.prompt_cache))
+        elif path == "/v1/messages/batches":
+            batch_id = self.store.create(self._read_json()["requests"])
+            self._send_json(200, self.store.describe(batch_id, self.base_url))
+        else:
+            match = BATCH_PATH.match(path)
+            if match and match.group(2) == "/cancel" and self.store.cancel(match.group(1)):
+                self._send_json(200, self.store.describe(match.group(1), self.base_url))
+            else:
+                self._not_found()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/v1/messages/batches":
+            batches = self.store.list(self.base_url)
+            self._send_json(200, {
+                "data": batches,
+                "has_more": False,
+                "first_id": batches[0]["id"] if batches else None,
+                "last_id": batches[-1]["id"] if batches else None,
+            })
+            return
+        match = BATCH_PATH.match(path)
+        if not match or match.group(2) == "/cancel":
+            self._not_found()
+        elif match.group(2) == "/results":
+            results = self.store.results(match.group(1))
+            if results is None:
+                self._not_found()
+                return
+            body = "".join(json.dumps(entry) + "\n" for entry in results).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/binary")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            batch = self.store.describe(match.group(1), self.base_url)
+            if batch is None:
+                self._not_found()
+            else:
+                self._send_json(200, batch)
+
+    def log_message(self, format, *args):
+        pass
+
+# ------------------------------------------------------------
+# Entry point
+# ------------------------------------------------------------
+
+def make_server(host="127.0.0.1", port=8089, batch_seconds=5.0, error_rate=0.0,
+                latency_ms=0.0, rate_limit_rate=0.0):
+    """Build (but do not start) a fake server; port 0 picks a free port."""
+    handler = type("Handler", (FakeAnthropicHandler,), {
+        "store": BatchStore(batch_seconds, error_rate),
+        "prompt_cache": set(),
+        "error_rate": error_rate,
+        "latency": latency_ms / 1000.0,
+        "rate_limit_rate": rate_limit_rate,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Anthropic Messages / Batches API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--batch-seconds", type=float, default=5.0,
+                        help="how long a batch stays in_progress")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="fraction of /v1/messages requests answered with HTTP 429")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.batch_seconds, args.error_rate,
+                         args.latency_ms, args.rate_limit_rate)
+    print(f"Fake Anthropic API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
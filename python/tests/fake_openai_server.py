@@ -0,0 +1,131 @@
+"""
+Fake OpenAI Embeddings Server
+-----------------------------
+Local stand-in for POST /v1/embeddings, so the embedding scripts, semantic
+search and the benchmarks (benchmarks/run_benchmarks.py) run without an
+API key, network access or token spend.
+
+Vectors are deterministic: each input's unit vector is seeded from a
+SHA-256 of its text, so the same text always embeds the same way. The
+`dimensions` parameter is honoured (default 1536), and both float and
+base64 encoding formats are served.
+
+--latency-ms adds a fixed delay per request; --rate-limit-rate answers
+that fraction of requests with HTTP 429 and a short retry-after.
+
+Usage:
+    python tests/fake_openai_server.py [--port 8090] [--latency-ms 0] [--rate-limit-rate 0.0]
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1 python python_regenerate_embeddings_openai.py
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+DEFAULT_DIMENSIONS = 1536
+RETRY_AFTER_SECONDS = "0.05"
+
+# ------------------------------------------------------------
+# Deterministic vectors
+# ------------------------------------------------------------
+
+def fake_embedding(text, dimensions=DEFAULT_DIMENSIONS):
+    """Unit float32 vector seeded by the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dimensions).astype("<f4")
+    return vec / np.linalg.norm(vec)
+
+
+def embeddings_response(params):
+    inputs = params["input"]
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    dimensions = int(params.get("dimensions") or DEFAULT_DIMENSIONS)
+    as_base64 = params.get("encoding_format") == "base64"
+
+    data = []
+    for i, text in enumerate(inputs):
+        vec = fake_embedding(str(text), dimensions)
+        embedding = base64.b64encode(vec.tobytes()).decode("ascii") if as_base64 else vec.tolist()
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+    tokens = sum(len(str(text)) // 4 + 1 for text in inputs)
+    return {
+        "object": "list",
+        "data": data,
+        "model": params.get("model", "fake-embedding-model"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+# ------------------------------------------------------------
+# HTTP handler
+# ------------------------------------------------------------
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    rate_limit_rate = 0.0
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        params = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.split("?")[0] != "/v1/embeddings":
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.rate_limit_rate:
+            self._send_json(429, {"error": {"message": "fake rate limit", "type": "rate_limit_error"}},
+                            {"retry-after": RETRY_AFTER_SECONDS})
+            return
+        self._send_json(200, embeddings_response(params))
+
+    def log_message(self, format, *args):
+        pass
+
+# ------------------------------------------------------------
+# Entry point
+# ------------------------------------------------------------
+
+def make_server(host="127.0.0.1", port=8090, latency_ms=0.0, rate_limit_rate=0.0):
+    """Build (but do not start) a fake server; port 0 picks a free port."""
+    handler = type("Handler", (FakeOpenAIHandler,), {
+        "latency": latency_ms / 1000.0,
+        "rate_limit_rate": rate_limit_rate,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI embeddings API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="fraction of requests answered with HTTP 429")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.rate_limit_rate)
+    print(f"Fake OpenAI API on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
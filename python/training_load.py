@@ -0,0 +1,443 @@
+"""
+Training Load Aggregates
+------------------------
+
+Maintains the small tables from sql/13_training_load.sql, so weekly,
+fitness and trend questions (dashboards, RAG context) read precomputed
+rows instead of scanning the workout tables:
+
+    training_load_daily / _weekly   per-sport sums: workouts, yards, moving
+                                    time, TSS and HR / pace / SWOLF sum+count
+    training_load_metrics           per calendar day: ATL, CTL, TSB and the
+                                    28-day pace and SWOLF trends
+
+refresh() is incremental. It reads only rows whose row_version is at or
+past the sport's watermark (MIN_ACTIVE_ROWVERSION() as of the previous
+refresh, so rows from transactions still open then are not skipped),
+recomputes the days those rows fall on, the weeks that contain them and
+the combined 'all' rollup for those days, then re-runs the rolling
+windows from the earliest touched day forward, seeded with the stored
+ATL/CTL of the day before. Deleted workouts show up as a workout
+count mismatch and trigger a rebuild of that sport.
+
+ATL and CTL are exponentially weighted daily TSS with 7- and 42-day time
+constants (load += (tss - load) / days); TSB is yesterday's CTL - ATL.
+
+Usage:
+    python training_load.py              # incremental refresh, every sport
+    python training_load.py --rebuild    # recompute from scratch
+    python training_load.py --sport swim
+"""
+
+import argparse
+from collections import deque
+from datetime import date, timedelta
+from instrumentation import count, session, span
+from sports import SPORTS, active_sports, get_sport, row_version_ceiling
+from utils import pooled_connection
+
+ATL_DAYS = 7
+CTL_DAYS = 42
+TREND_DAYS = 28
+ALL = "all"
+
+# Columns shared by training_load_daily and training_load_weekly.
+SUM_COLUMNS = (
+    "workouts", "distance_yards", "moving_seconds", "training_stress_score",
+    "hr_sum", "hr_count", "pace_seconds_sum", "pace_count", "swolf_sum", "swolf_count",
+)
+# Pace units differ per sport (per 100 yd swimming, per mile running).
+PACE_COLUMNS = {"pace_seconds_sum", "pace_count"}
+
+# More separate day ranges than this are read as one min..max scan.
+MAX_DAY_RANGES = 50
+
+ONE_DAY = timedelta(days=1)
+
+# ---------------------------------------------------------
+# SQL
+# ---------------------------------------------------------
+_COLUMN_LIST = ", ".join(SUM_COLUMNS)
+
+INSERT_DAILY_SQL = f"""
+    INSERT INTO training_load_daily (sport, day, {_COLUMN_LIST})
+    VALUES (?, ?, {", ".join("?" * len(SUM_COLUMNS))})
+"""
+
+# 'all' = every sport's daily row summed; pace is not comparable across sports.
+ROLLUP_ALL_SQL = f"""
+    INSERT INTO training_load_daily (sport, day, {_COLUMN_LIST})
+    SELECT N'{ALL}', day, {", ".join("0" if c in PACE_COLUMNS else f"SUM({c})" for c in SUM_COLUMNS)}
+    FROM training_load_daily
+    WHERE sport <> N'{ALL}' AND day BETWEEN ? AND ?
+    GROUP BY day
+"""
+
+# 1900-01-01 was a Monday, so this is the week start whatever DATEFIRST is.
+_WEEK_START = "DATEADD(DAY, -(DATEDIFF(DAY, '19000101', day) % 7), day)"
+
+ROLLUP_WEEKLY_SQL = f"""
+    INSERT INTO training_load_weekly (sport, week_start, {_COLUMN_LIST})
+    SELECT sport, {_WEEK_START}, {", ".join(f"SUM({c})" for c in SUM_COLUMNS)}
+    FROM training_load_daily
+    WHERE sport = ? AND day BETWEEN ? AND ?
+    GROUP BY sport, {_WEEK_START}
+"""
+
+INSERT_METRICS_SQL = """
+    INSERT INTO training_load_metrics
+        (sport, day, training_stress_score, atl, ctl, tsb, pace_trend_seconds, swolf_trend)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SAVE_WATERMARK_SQL = """
+    MERGE training_load_watermarks AS t
+    USING (SELECT ? AS sport, CAST(? AS BINARY(8)) AS row_version) AS s
+    ON t.sport = s.sport
+    WHEN MATCHED THEN UPDATE SET row_version = s.row_version, updated_at = SYSUTCDATETIME()
+    WHEN NOT MATCHED THEN INSERT (sport, row_version) VALUES (s.sport, s.row_version);
+"""
+
+def tables_ready(conn, sports=None):
+    """True once sql/13_training_load.sql has been run and sql/14_duration_seconds.sql
+    has added the *_seconds columns source_sql() reads to every active sport table."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT OBJECT_ID('dbo.training_load_metrics', 'U')")
+    ready = cursor.fetchone()[0] is not None
+    if ready:
+        for sport in active_sports(conn, sports):
+            cursor.execute("SELECT COL_LENGTH(?, 'moving_time_seconds')", f"dbo.{sport.table}")
+            if cursor.fetchone()[0] is None:
+                ready = False
+                break
+    cursor.close()
+    return ready
+
+def source_sql(sport):
+    """Per-workout columns the rollups need, for one sport's table.
+
+    Durations and paces come from the parsed *_seconds columns
+    (sql/14_duration_seconds.sql), not the text ones.
+    """
+    expressions = sport.filter_expressions()
+    return f"""
+        SELECT CAST(workout_date AS DATE) AS day,
+               {expressions["distance_yards"]} AS distance_yards,
+               moving_time_seconds, training_stress_score, avg_hr,
+               {expressions["avg_pace_seconds"]} AS avg_pace_seconds,
+               {"avg_swolf" if "avg_swolf" in sport.metric_columns else "NULL"} AS avg_swolf
+        FROM {sport.table}
+        WHERE workout_date >= ? AND workout_date < ?
+    """
+
+# ---------------------------------------------------------
+# Day ranges
+# ---------------------------------------------------------
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+def merge_ranges(ranges):
+    """[(first, last)] → sorted, non-overlapping, non-adjacent [[first, last]]."""
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + ONE_DAY:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+def day_ranges(days):
+    return merge_ranges((day, day) for day in days)
+
+# ---------------------------------------------------------
+# Aggregation
+# ---------------------------------------------------------
+def daily_sums(rows):
+    """Workout rows (source_sql) → {day: [SUM_COLUMNS values]}."""
+    days = {}
+    for row in rows:
+        sums = days.get(row.day)
+        if sums is None:
+            sums = days[row.day] = [0, 0.0, 0.0, 0.0, 0.0, 0, 0.0, 0, 0.0, 0]
+        sums[0] += 1
+        sums[1] += row.distance_yards or 0.0
+        sums[2] += row.moving_time_seconds or 0.0
+        sums[3] += row.training_stress_score or 0.0
+        if row.avg_hr:
+            sums[4] += row.avg_hr
+            sums[5] += 1
+        if row.avg_pace_seconds:
+            sums[6] += row.avg_pace_seconds
+            sums[7] += 1
+        if row.avg_swolf:
+            sums[8] += row.avg_swolf
+            sums[9] += 1
+    return days
+
+def rolling_metrics(key, daily, start, end, atl=0.0, ctl=0.0):
+    """training_load_metrics rows for start..end.
+
+    daily: {day: row with training_stress_score and pace/SWOLF sums}, covering
+    at least TREND_DAYS - 1 days before start. atl/ctl: values for start - 1.
+    """
+    rows = []
+    trend = deque()
+    totals = [0.0, 0, 0.0, 0]
+    day = start - timedelta(days=TREND_DAYS - 1)
+    while day <= end:
+        row = daily.get(day)
+        values = ((row.pace_seconds_sum, row.pace_count, row.swolf_sum, row.swolf_count)
+                  if row else (0.0, 0, 0.0, 0))
+        trend.append(values)
+        totals = [t + v for t, v in zip(totals, values)]
+        if len(trend) > TREND_DAYS:
+            totals = [t - v for t, v in zip(totals, trend.popleft())]
+        if day >= start:
+            tss = row.training_stress_score if row else 0.0
+            tsb = ctl - atl
+            atl += (tss - atl) / ATL_DAYS
+            ctl += (tss - ctl) / CTL_DAYS
+            rows.append((
+                key, day, tss, atl, ctl, tsb,
+                totals[0] / totals[1] if totals[1] else None,
+                totals[2] / totals[3] if totals[3] else None,
+            ))
+        day += ONE_DAY
+    return rows
+
+# ---------------------------------------------------------
+# Refresh steps
+# ---------------------------------------------------------
+def _day_bounds(cursor, key):
+    cursor.execute("SELECT MIN(day), MAX(day) FROM training_load_daily WHERE sport = ?", key)
+    return tuple(cursor.fetchone())
+
+def _clear(cursor, key):
+    for table in ("training_load_daily", "training_load_weekly", "training_load_metrics"):
+        cursor.execute(f"DELETE FROM {table} WHERE sport = ?", key)
+
+def _changed_days(cursor, sport, watermark, ceiling):
+    """Days holding rows with watermark <= row_version < ceiling (every row if watermark is None)."""
+    if watermark is None:
+        cursor.execute(f"SELECT DISTINCT CAST(workout_date AS DATE) FROM {sport.table}")
+    else:
+        cursor.execute(f"""
+            SELECT DISTINCT CAST(workout_date AS DATE)
+            FROM {sport.table}
+            WHERE row_version >= ? AND row_version < ?
+        """, watermark, ceiling)
+    return {row[0] for row in cursor.fetchall()}
+
+def _rollup_days(cursor, sport, ranges):
+    """Recompute sport's daily rows for every day in ranges."""
+    sql = source_sql(sport)
+    inserts = []
+    for first, last in ranges:
+        cursor.execute("DELETE FROM training_load_daily WHERE sport = ? AND day BETWEEN ? AND ?",
+                       sport.key, first, last)
+        cursor.execute(sql, first, last + ONE_DAY)
+        sums = daily_sums(cursor.fetchall())
+        inserts.extend((sport.key, day, *values) for day, values in sorted(sums.items()))
+    if inserts:
+        cursor.executemany(INSERT_DAILY_SQL, inserts)
+    return len(inserts)
+
+def _counts_match(cursor, sport):
+    cursor.execute("SELECT COALESCE(SUM(workouts), 0) FROM training_load_daily WHERE sport = ?", sport.key)
+    aggregated = cursor.fetchone()[0]
+    cursor.execute(f"SELECT COUNT(*) FROM {sport.table}")
+    return aggregated == cursor.fetchone()[0]
+
+def _refresh_sport(cursor, sport, rebuild=False):
+    """Fold one sport's changed rows into its daily rollup → touched day ranges."""
+    ceiling = row_version_ceiling(cursor)
+    watermark = None
+    if not rebuild:
+        cursor.execute("SELECT row_version FROM training_load_watermarks WHERE sport = ?", sport.key)
+        row = cursor.fetchone()
+        watermark = row[0] if row else None
+
+    previous = []
+    if watermark is None:
+        old_first, old_last = _day_bounds(cursor, sport.key)
+        if old_first is not None:
+            previous.append((old_first, old_last))
+        _clear(cursor, sport.key)
+
+    with span("sql_fetch", sport=sport.key, table="training_load"):
+        days = _changed_days(cursor, sport, watermark, ceiling)
+    ranges = day_ranges(days)
+    if len(ranges) > MAX_DAY_RANGES:
+        ranges = [[ranges[0][0], ranges[-1][1]]]
+
+    with span("sql_write", sport=sport.key, table="training_load_daily") as s:
+        s.rows = _rollup_days(cursor, sport, ranges)
+
+    if watermark is not None and not _counts_match(cursor, sport):
+        count("training_load_rebuilds_total", sport=sport.key)
+        return _refresh_sport(cursor, sport, rebuild=True)
+
+    # Rows at or past the ceiling may belong to transactions still open;
+    # the next refresh starts there.
+    cursor.execute(SAVE_WATERMARK_SQL, sport.key, ceiling)
+    # A rebuild also clears days the sport no longer has rows for.
+    return merge_ranges(previous + [tuple(r) for r in ranges])
+
+def _rollup_all(cursor, ranges):
+    for first, last in ranges:
+        cursor.execute(f"DELETE FROM training_load_daily WHERE sport = N'{ALL}' AND day BETWEEN ? AND ?",
+                       first, last)
+        cursor.execute(ROLLUP_ALL_SQL, first, last)
+
+def _rollup_weeks(cursor, key, ranges):
+    weeks = merge_ranges((week_start(first), week_start(last) + timedelta(days=6)) for first, last in ranges)
+    for first, last in weeks:
+        cursor.execute("DELETE FROM training_load_weekly WHERE sport = ? AND week_start BETWEEN ? AND ?",
+                       key, first, last)
+        cursor.execute(ROLLUP_WEEKLY_SQL, key, first, last)
+
+def _roll_metrics(cursor, key, touched_from, today):
+    """Re-run ATL/CTL/TSB and trends for key from the earliest stale day to today."""
+    first, last = _day_bounds(cursor, key)
+    if first is None:
+        cursor.execute("DELETE FROM training_load_metrics WHERE sport = ?", key)
+        return 0
+    cursor.execute("SELECT MAX(day) FROM training_load_metrics WHERE sport = ?", key)
+    computed_to = cursor.fetchone()[0]
+    start = first if computed_to is None else computed_to + ONE_DAY
+    if touched_from is not None:
+        start = min(start, touched_from)
+    start = max(start, first)
+    end = max(today, last)
+    if start > end:
+        return 0
+
+    cursor.execute("SELECT atl, ctl FROM training_load_metrics WHERE sport = ? AND day = ?",
+                   key, start - ONE_DAY)
+    seed = cursor.fetchone()
+    cursor.execute("""
+        SELECT day, training_stress_score, pace_seconds_sum, pace_count, swolf_sum, swolf_count
+        FROM training_load_daily
+        WHERE sport = ? AND day BETWEEN ? AND ?
+    """, key, start - timedelta(days=TREND_DAYS - 1), end)
+    daily = {row.day: row for row in cursor.fetchall()}
+
+    rows = rolling_metrics(key, daily, start, end, *((seed.atl, seed.ctl) if seed else ()))
+    cursor.execute("DELETE FROM training_load_metrics WHERE sport = ? AND day >= ?", key, start)
+    cursor.executemany(INSERT_METRICS_SQL, rows)
+    return len(rows)
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+def refresh(conn, sports=None, rebuild=False, today=None):
+    """Bring the training_load_* tables up to date. Returns {sport: days recomputed}."""
+    today = today or date.today()
+    sports = active_sports(conn, sports)
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+
+    touched = {}
+    for sport in sports:
+        ranges = _refresh_sport(cursor, sport, rebuild)
+        if ranges:
+            touched[sport.key] = ranges
+
+    all_ranges = merge_ranges(tuple(r) for ranges in touched.values() for r in ranges)
+    if all_ranges:
+        touched[ALL] = all_ranges
+        with span("sql_write", table="training_load_daily", sport=ALL):
+            _rollup_all(cursor, all_ranges)
+
+    recomputed = {}
+    for key in [sport.key for sport in sports] + [ALL]:
+        ranges = touched.get(key, [])
+        with span("sql_write", table="training_load_weekly", sport=key):
+            _rollup_weeks(cursor, key, ranges)
+        with span("sql_write", table="training_load_metrics", sport=key) as s:
+            s.rows = _roll_metrics(cursor, key, ranges[0][0] if ranges else None, today)
+        recomputed[key] = sum((last - first).days + 1 for first, last in ranges)
+
+    with span("sql_commit", table="training_load"):
+        conn.commit()
+    cursor.close()
+    return recomputed
+
+def _with_averages(columns, row):
+    """Rollup row → dict with avg_hr / avg_pace_seconds / avg_swolf resolved."""
+    values = dict(zip(columns, row))
+    values["avg_hr"] = values["hr_sum"] / values["hr_count"] if values["hr_count"] else None
+    values["avg_pace_seconds"] = values["pace_seconds_sum"] / values["pace_count"] if values["pace_count"] else None
+    values["avg_swolf"] = values["swolf_sum"] / values["swolf_count"] if values["swolf_count"] else None
+    for column in ("hr_sum", "hr_count", "pace_seconds_sum", "pace_count", "swolf_sum", "swolf_count", "updated_at"):
+        values.pop(column, None)
+    return values
+
+def current_form(conn, sport=ALL, day=None):
+    """Latest training_load_metrics row on or before day (default today) as a dict, or None."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT TOP 1 day, training_stress_score, atl, ctl, tsb, pace_trend_seconds, swolf_trend
+        FROM training_load_metrics
+        WHERE sport = ? AND day <= ?
+        ORDER BY day DESC
+    """, sport, day or date.today())
+    row = cursor.fetchone()
+    columns = [c[0] for c in cursor.description]
+    cursor.close()
+    return dict(zip(columns, row)) if row else None
+
+def weekly_summary(conn, sport=ALL, weeks=12):
+    """The last `weeks` weekly rollups as dicts, oldest first."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT TOP (?) *
+        FROM training_load_weekly
+        WHERE sport = ?
+        ORDER BY week_start DESC
+    """, weeks, sport)
+    columns = [c[0] for c in cursor.description]
+    rows = [_with_averages(columns, row) for row in cursor.fetchall()]
+    cursor.close()
+    return rows[::-1]
+
+def load_series(conn, sport=ALL, start=None, end=None):
+    """Daily ATL/CTL/TSB/trend rows between start and end (default: the last 90 days)."""
+    end = end or date.today()
+    start = start or end - timedelta(days=89)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT day, training_stress_score, atl, ctl, tsb, pace_trend_seconds, swolf_trend
+        FROM training_load_metrics
+        WHERE sport = ? AND day BETWEEN ? AND ?
+        ORDER BY day
+    """, sport, start, end)
+    columns = [c[0] for c in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    cursor.close()
+    return rows
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+def main(sports=None, rebuild=False):
+    with pooled_connection() as conn:
+        if not tables_ready(conn, sports):
+            raise RuntimeError("training_load tables are missing; run sql/14_duration_seconds.sql "
+                               "and sql/13_training_load.sql first.")
+        recomputed = refresh(conn, sports, rebuild)
+        for key, days in recomputed.items():
+            form = current_form(conn, key)
+            if form:
+                print(f"{key}: {days} days recomputed; {form['day']}: "
+                      f"CTL {form['ctl']:.1f}, ATL {form['atl']:.1f}, TSB {form['tsb']:+.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the precomputed training-load tables.")
+    parser.add_argument("--sport", choices=list(SPORTS), action="append",
+                        help="limit to this sport (repeatable); default: SPORTS or every sport")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every day from scratch")
+    parser.add_argument("--profile", action="store_true", help="run under cProfile (see instrumentation.py)")
+    args = parser.parse_args()
+    with session(args.profile):
+        main([get_sport(key) for key in args.sport] if args.sport else None, rebuild=args.rebuild)
@@ -1,7 +1,12 @@
 import os
+import threading
+import time
 import pyodbc
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, date
 from dotenv import load_dotenv
+from instrumentation import observe
 
 load_dotenv()
 
@@ -13,6 +18,21 @@ SQL_DATABASE = os.getenv("SQL_DATABASE")
 SQL_USER = os.getenv("SQL_USER")
 SQL_PASSWORD = os.getenv("SQL_PASSWORD")
 
+# ---------------------------------------------------------
+# EMBEDDINGS
+# ---------------------------------------------------------
+# text-embedding-3 models accept a `dimensions` parameter (Matryoshka
+# embeddings: a shorter vector is the normalized prefix of the full one).
+EMBED_MODEL = "text-embedding-3-small"
+EMBED_NATIVE_DIMENSIONS = 1536
+EMBED_DIMENSIONS = int(os.getenv("EMBED_DIMENSIONS", str(EMBED_NATIVE_DIMENSIONS)))
+
+def embedding_model_tag() -> str:
+    """Value stored in swim_workouts.embedding_model for the current settings."""
+    if EMBED_DIMENSIONS == EMBED_NATIVE_DIMENSIONS:
+        return EMBED_MODEL
+    return f"{EMBED_MODEL}@{EMBED_DIMENSIONS}"
+
 
 # ---------------------------------------------------------
 # DB CONNECTION
@@ -28,6 +48,182 @@ def get_connection():
     )
     return pyodbc.connect(conn_str)
 
+# ---------------------------------------------------------
+# CONNECTION POOL
+# ---------------------------------------------------------
+SQL_POOL_MIN_SIZE = int(os.getenv("SQL_POOL_MIN_SIZE", "1"))
+SQL_POOL_MAX_SIZE = int(os.getenv("SQL_POOL_MAX_SIZE", "8"))
+SQL_POOL_IDLE_TIMEOUT = float(os.getenv("SQL_POOL_IDLE_TIMEOUT", "300"))
+SQL_POOL_HEALTH_CHECK_AFTER = float(os.getenv("SQL_POOL_HEALTH_CHECK_AFTER", "30"))
+SQL_POOL_ACQUIRE_TIMEOUT = float(os.getenv("SQL_POOL_ACQUIRE_TIMEOUT", "30"))
+
+class ConnectionPool:
+    """Thread-safe pool of reusable connections.
+
+    - Connections idle longer than idle_timeout are closed (down to min_size).
+    - Connections idle longer than health_check_after are pinged with
+      SELECT 1 before being handed out; dead ones are replaced.
+    - stats() reports checkouts, time spent waiting for a free connection
+      and how often the pool was saturated (all max_size connections busy).
+    """
+
+    def __init__(self, connect=get_connection, min_size=SQL_POOL_MIN_SIZE, max_size=SQL_POOL_MAX_SIZE,
+                 idle_timeout=SQL_POOL_IDLE_TIMEOUT, health_check_after=SQL_POOL_HEALTH_CHECK_AFTER,
+                 acquire_timeout=SQL_POOL_ACQUIRE_TIMEOUT):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+        self._idle = deque()          # (connection, last_used)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._checkouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._saturated = 0
+        self._discarded = 0
+
+    def _healthy(self, conn):
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        while True:
+            conn = None
+            create = False
+            with self._cond:
+                if not self._idle and self._size >= self.max_size:
+                    self._saturated += 1
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No SQL connection free after {self.acquire_timeout}s")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                idle_for = time.monotonic() - last_used
+                if idle_for > self.idle_timeout or (
+                        idle_for > self.health_check_after and not self._healthy(conn)):
+                    self._discard(conn)
+                    continue
+
+            waited = time.monotonic() - started
+            observe("sql_pool_acquire", waited, created=create)
+            with self._cond:
+                self._checkouts += 1
+                self._wait_seconds += waited
+                self._max_wait_seconds = max(self._max_wait_seconds, waited)
+            return conn
+
+    def release(self, conn, broken=False):
+        if not broken:
+            try:
+                conn.rollback()   # never hand out an open transaction
+            except pyodbc.Error:
+                broken = True
+        if broken:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._prune_locked()
+            self._cond.notify()
+
+    def _prune_locked(self):
+        now = time.monotonic()
+        while len(self._idle) and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            try:
+                conn.close()
+            except pyodbc.Error:
+                pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except pyodbc.Error:
+            self.release(conn, broken=not self._healthy(conn))
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "avg_wait_ms": 1000 * self._wait_seconds / self._checkouts if self._checkouts else 0.0,
+                "max_wait_ms": 1000 * self._max_wait_seconds,
+                "saturated_waits": self._saturated,
+                "discarded": self._discarded,
+            }
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                try:
+                    conn.close()
+                except pyodbc.Error:
+                    pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+def pooled_connection():
+    """Context manager: `with pooled_connection() as conn: ...`"""
+    return get_pool().connection()
+
 # Birthdate
 birthdate_str = os.getenv("ATHLETE_BIRTHDATE")
 if not birthdate_str:
@@ -0,0 +1,386 @@
+"""
+In-Process Vector Index for Swim Workout Embeddings
+---------------------------------------------------
+
+Keeps every workout embedding in one contiguous float32 matrix of
+pre-normalized rows, so a query is a single matrix-vector product plus an
+argpartition top-k instead of per-row unpacking and cosine math in Python.
+
+The index loads once and then refreshes incrementally using the
+row_version column (see sql/07_vector_index_support.sql). It covers every
+active sport in sports.py; ids are cross-sport keys (sports.workout_key),
+which equal swim_workout_id for swims. ROWVERSION is database-wide, so one
+watermark serves every table.
+
+With index_format="float16" or "int8" the matrix is held quantized and
+scored directly in that form (2-4x less memory to scan). Setting a
+rerank_source lets search() re-score the top candidates at float32.
+
+With coarse_dims set, search() first scores a small float32 matrix of
+re-normalized vector prefixes (Matryoshka truncation), then re-scores only
+the best coarse_candidates rows at full dimension.
+
+The filterable columns (search_filters.FILTER_COLUMNS) are kept alongside
+the vectors, so search(filters=...) masks rows before any scoring happens.
+"""
+
+import threading
+import numpy as np
+from embedding_codec import quantize, dequantize, unpack
+from search_filters import FILTER_COLUMNS, empty_columns, to_column_arrays, build_mask
+from sports import active_sports, key_expression, row_version_ceiling
+
+EMBED_DIM = 1536
+SCORE_CHUNK_ROWS = 32768
+QUERY_BLOCK = 64
+
+def index_select(sport):
+    expressions = sport.filter_expressions()
+    return f"""
+        SELECT {key_expression(sport)}, notes, embedding, row_version, embedding_model,
+               {", ".join(expressions[column] for column in FILTER_COLUMNS)}
+        FROM {sport.table}
+    """
+
+# ------------------------------------------------------------
+# Helpers
+# ------------------------------------------------------------
+
+def normalize_rows(matrix):
+    """L2-normalize each row in place; zero rows stay zero."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def normalize(vec):
+    vec = np.asarray(vec, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+# ------------------------------------------------------------
+# Vector index
+# ------------------------------------------------------------
+
+class VectorIndex:
+    """Normalized float32 matrix + id array, refreshed from SQL by row_version."""
+
+    def __init__(self, dim=EMBED_DIM, index_format="float32", rerank_source=None,
+                 coarse_dims=None, coarse_candidates=200, sports=None, model_tag=None):
+        self.dim = dim
+        # embedding_model value a row must carry to be indexed (None = any).
+        self.model_tag = model_tag
+        # sports.Sport list to load (None = sports.configured_sports()).
+        self.sports = sports
+        self.index_format = index_format
+        self.coarse_dims = coarse_dims if coarse_dims and coarse_dims < dim else None
+        self.coarse_candidates = coarse_candidates
+        # Optional callable: list of workout keys → (n, dim) float32 vectors.
+        self.rerank_source = rerank_source
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        codes, _ = quantize(np.empty((0, self.dim), dtype=np.float32), self.index_format)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = codes
+        self.scales = np.empty(0, dtype=np.float32)
+        self.prefix = np.empty((0, self.coarse_dims or 0), dtype=np.float32)
+        self.notes = []
+        self.columns = empty_columns()
+        self.positions = {}
+        self.watermark = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --------------------------------------------------------
+    # Mutation
+    # --------------------------------------------------------
+
+    def upsert(self, ids, vectors, notes, metadata=None):
+        """Insert or replace rows. `vectors` is an (n, dim) float array and
+        `metadata` one tuple per row in FILTER_COLUMNS order (None = unknown).
+
+        Returns the row positions that were written.
+        """
+        vectors = normalize_rows(np.array(vectors, dtype=np.float32, ndmin=2))
+        codes, scales = quantize(vectors, self.index_format)
+        prefix = normalize_rows(vectors[:, :self.coarse_dims].copy()) if self.coarse_dims else None
+        if metadata is None:
+            metadata = [(None,) * len(FILTER_COLUMNS)] * len(vectors)
+        columns = to_column_arrays(metadata)
+        with self.lock:
+            written = []
+            new_ids, new_rows, new_notes = [], [], []
+            for i, (workout_id, note) in enumerate(zip(ids, notes)):
+                pos = self.positions.get(workout_id)
+                if pos is None:
+                    new_ids.append(workout_id)
+                    new_rows.append(i)
+                    new_notes.append(note)
+                else:
+                    self.matrix[pos] = codes[i]
+                    self.scales[pos] = scales[i]
+                    if prefix is not None:
+                        self.prefix[pos] = prefix[i]
+                    self.notes[pos] = note
+                    for name, values in columns.items():
+                        self.columns[name][pos] = values[i]
+                    written.append(pos)
+            if new_ids:
+                start = len(self.ids)
+                self.ids = np.concatenate([self.ids, np.asarray(new_ids, dtype=np.int64)])
+                self.matrix = np.concatenate([self.matrix, codes[new_rows]])
+                self.scales = np.concatenate([self.scales, scales[new_rows]])
+                if prefix is not None:
+                    self.prefix = np.concatenate([self.prefix, prefix[new_rows]])
+                self.notes.extend(new_notes)
+                for name, values in columns.items():
+                    self.columns[name] = np.concatenate([self.columns[name], values[new_rows]])
+                for offset, workout_id in enumerate(new_ids):
+                    self.positions[workout_id] = start + offset
+                written.extend(range(start, start + len(new_ids)))
+            return np.asarray(written, dtype=np.int64)
+
+    def remove(self, ids):
+        with self.lock:
+            drop = [self.positions[i] for i in ids if i in self.positions]
+            if not drop:
+                return
+            keep = np.ones(len(self.ids), dtype=bool)
+            keep[drop] = False
+            self._compact(keep)
+
+    def _compact(self, keep):
+        """Drop rows where `keep` is False and rebuild the id → row map."""
+        self.ids = self.ids[keep]
+        self.matrix = np.ascontiguousarray(self.matrix[keep])
+        self.scales = self.scales[keep]
+        if self.coarse_dims:
+            self.prefix = np.ascontiguousarray(self.prefix[keep])
+        self.notes = [n for n, k in zip(self.notes, keep) if k]
+        self.columns = {name: values[keep] for name, values in self.columns.items()}
+        self.positions = {int(i): pos for pos, i in enumerate(self.ids)}
+
+    # --------------------------------------------------------
+    # SQL load / refresh
+    # --------------------------------------------------------
+
+    def _apply_rows(self, rows):
+        upsert_ids, upsert_vecs, upsert_notes, upsert_meta, removed = [], [], [], [], []
+        for workout_id, notes, binary_vec, row_version, model, *metadata in rows:
+            vec = unpack(binary_vec) if binary_vec is not None else None
+            # Rows still embedded by another model or dimension (mid
+            # re-embed) are left out until they are regenerated.
+            if vec is None or vec.shape[0] != self.dim or (self.model_tag and model != self.model_tag):
+                removed.append(workout_id)
+                continue
+            upsert_ids.append(workout_id)
+            upsert_vecs.append(vec)
+            upsert_notes.append(notes)
+            upsert_meta.append(metadata)
+        if removed:
+            self.remove(removed)
+        if upsert_ids:
+            self.upsert(upsert_ids, upsert_vecs, upsert_notes, upsert_meta)
+        return len(upsert_ids) + len(removed)
+
+    def _embedded(self):
+        """WHERE clause and parameters for the rows this index can hold."""
+        if self.model_tag:
+            return "embedding IS NOT NULL AND embedding_model = ?", [self.model_tag]
+        return "embedding IS NOT NULL", []
+
+    def load(self, conn):
+        """Full load of every workout that has an embedding."""
+        cursor = conn.cursor()
+        ceiling = row_version_ceiling(cursor)
+        where, params = self._embedded()
+        rows = []
+        for sport in active_sports(conn, self.sports):
+            cursor.execute(index_select(sport) + f" WHERE {where}", *params)
+            rows.extend(cursor.fetchall())
+        cursor.close()
+        with self.lock:
+            self._reset()
+            self._apply_rows(rows)
+            self.watermark = ceiling
+        return len(self)
+
+    def refresh(self, conn):
+        """Apply rows changed since the last load/refresh. Returns rows changed."""
+        if self.watermark is None:
+            return self.load(conn)
+        sports = active_sports(conn, self.sports)
+        cursor = conn.cursor()
+        ceiling = row_version_ceiling(cursor)
+        rows = []
+        for sport in sports:
+            cursor.execute(
+                index_select(sport) + " WHERE row_version >= ? AND row_version < ? ORDER BY row_version",
+                self.watermark, ceiling,
+            )
+            rows.extend(cursor.fetchall())
+
+        # Deletes leave no row_version behind; only sweep ids when the
+        # counts disagree. Queries run before taking the lock so searches
+        # are blocked only while rows are applied.
+        where, params = self._embedded()
+        live_count = 0
+        for sport in sports:
+            cursor.execute(f"SELECT COUNT(*) FROM {sport.table} WHERE {where}", *params)
+            live_count += cursor.fetchone()[0]
+
+        with self.lock:
+            changed = self._apply_rows(rows)
+            self.watermark = ceiling
+            in_sync = live_count == len(self)
+
+        if not in_sync:
+            live = set()
+            for sport in sports:
+                cursor.execute(f"SELECT {key_expression(sport)} FROM {sport.table} WHERE {where}", *params)
+                live.update(r[0] for r in cursor.fetchall())
+            with self.lock:
+                gone = [int(i) for i in self.ids if int(i) not in live]
+                self.remove(gone)
+            changed += len(gone)
+        cursor.close()
+        return changed
+
+    # --------------------------------------------------------
+    # Search
+    # --------------------------------------------------------
+
+    def dense_rows(self, rows):
+        """float32 copy of the given rows (dequantized if needed)."""
+        return dequantize(self.matrix[rows], self.scales[rows])
+
+    def score_rows(self, rows, q):
+        """Inner products of q with the given rows (None = all rows).
+
+        Quantized matrices are scored in chunks so only one chunk is ever
+        widened to float32 at a time.
+        """
+        if rows is None:
+            if self.matrix.dtype == np.float32:
+                return self.matrix @ q
+            rows = np.arange(len(self.ids))
+        elif self.matrix.dtype == np.float32:
+            return self.matrix[rows] @ q
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_CHUNK_ROWS):
+            chunk = rows[start:start + SCORE_CHUNK_ROWS]
+            scores[start:start + len(chunk)] = (self.matrix[chunk].astype(np.float32) @ q) * self.scales[chunk]
+        return scores
+
+    def score_block(self, Q, rows=None):
+        """(m, len(rows)) inner products for a block of normalized queries (None = all rows)."""
+        if rows is None:
+            if self.matrix.dtype == np.float32:
+                return Q @ self.matrix.T
+            rows = np.arange(len(self.ids))
+        elif self.matrix.dtype == np.float32:
+            return Q @ self.matrix[rows].T
+        scores = np.empty((len(Q), len(rows)), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_CHUNK_ROWS):
+            chunk = rows[start:start + SCORE_CHUNK_ROWS]
+            scores[:, start:start + len(chunk)] = (Q @ self.matrix[chunk].astype(np.float32).T) * self.scales[chunk]
+        return scores
+
+    def _depth(self, top_n, rerank):
+        """Candidates to collect: the rerank pool when re-scoring, else top_n."""
+        return max(top_n, rerank) if rerank and self.rerank_source else top_n
+
+    def _results(self, rows, scores, depth):
+        """Best `depth` (score, key, notes) from candidate rows and their scores."""
+        idx = top_k(scores, depth)
+        return [(float(scores[i]), int(self.ids[rows[i]]), self.notes[rows[i]]) for i in idx]
+
+    def _rerank(self, results, q, top_n, rerank):
+        """Re-score candidates against full-precision float32 vectors from rerank_source.
+
+        Called without the lock held, since rerank_source usually queries SQL.
+        Candidates it returns no vector for (deleted or re-embedded since the
+        last refresh) are dropped.
+        """
+        if not (rerank and self.rerank_source and results):
+            return results[:top_n]
+        vectors = self.rerank_source([key for _, key, _ in results])
+        kept = [(r, v) for r, v in zip(results, vectors) if v is not None and len(v) == self.dim]
+        if not kept:
+            return []
+        exact = normalize_rows(np.array([v for _, v in kept], dtype=np.float32)) @ q
+        return [(float(exact[i]), kept[i][0][1], kept[i][0][2]) for i in top_k(exact, top_n)]
+
+    def filter_rows(self, filters):
+        """Row positions matching `filters` (see search_filters), or None for all rows."""
+        if not filters:
+            return None
+        return np.flatnonzero(build_mask(self.columns, filters, len(self.ids)))
+
+    def search(self, query_vec, top_n=5, rerank=0, filters=None):
+        """Return [(similarity, workout_key, notes)] for the top_n rows.
+
+        With `filters`, only rows matching them are scored. With rerank > 0
+        and a rerank_source, the best `rerank` candidates are re-scored at
+        float32 first.
+        """
+        q = normalize(query_vec)
+        return self._rerank(self._search(q, self._depth(top_n, rerank), filters), q, top_n, rerank)
+
+    def _search(self, q, depth, filters):
+        with self.lock:
+            rows = self.filter_rows(filters)
+            if rows is not None and not len(rows):
+                return []
+            candidates = len(self) if rows is None else len(rows)
+            if self.coarse_dims and candidates > self.coarse_candidates:
+                prefix = self.prefix if rows is None else self.prefix[rows]
+                best = top_k(prefix @ normalize(q[:self.coarse_dims]), max(self.coarse_candidates, depth))
+                rows = best if rows is None else rows[best]
+                return self._results(rows, self.score_rows(rows, q), depth)
+            scores = self.score_rows(rows, q)
+            if rows is None:
+                rows = np.arange(len(scores))
+            return self._results(rows, scores, depth)
+
+    def search_many(self, query_vecs, top_n=5, rerank=0, filters=None):
+        """Batch search: one matrix-matrix product per block of QUERY_BLOCK queries.
+
+        Returns one [(similarity, workout_key, notes)] list per query, in order.
+        `filters` apply to every query.
+        """
+        Q = normalize_rows(np.array(query_vecs, dtype=np.float32, ndmin=2))
+        candidates = self._search_many(Q, self._depth(top_n, rerank), filters)
+        return [self._rerank(results, q, top_n, rerank) for results, q in zip(candidates, Q)]
+
+    def _search_many(self, Q, depth, filters):
+        with self.lock:
+            if self.coarse_dims and len(self) > self.coarse_candidates:
+                return [self._search(q, depth, filters) for q in Q]
+            rows = self.filter_rows(filters)
+            if rows is not None and not len(rows):
+                return [[] for _ in Q]
+            scored_rows = np.arange(len(self.ids)) if rows is None else rows
+            results = []
+            for start in range(0, len(Q), QUERY_BLOCK):
+                block = Q[start:start + QUERY_BLOCK]
+                scores = self.score_block(block, rows)
+                results.extend(self._results(scored_rows, scores[j], depth) for j in range(len(block)))
+            return results
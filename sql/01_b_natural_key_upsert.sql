@@ -0,0 +1,157 @@
+-- =============================================================================
+-- Natural Key and Idempotent Upsert for swim_workouts
+-- =============================================================================
+-- Description:
+--   Garmin exports overlap, so loading the same workout twice must not create
+--   a second row (and pay for its AI summary and embedding again).
+--
+--   1. Removes existing duplicates (keeps the lowest swim_workout_id).
+--   2. Adds a unique natural-key index:
+--        (workout_date, activity_type, distance_yards, elapsed_time)
+--   3. Creates dbo.merge_swim_workouts_stage, a set-based MERGE from the
+--      caller's #swim_workouts_stage temp table:
+--        - new workouts are inserted
+--        - unchanged workouts are skipped
+--        - workouts whose metrics changed are updated and their AI fields
+--          cleared so 04_b regenerates them (the notes hash then triggers a
+--          new embedding)
+--
+-- Prerequisites:
+--   - 01_schema.sql has been executed
+--
+-- Usage:
+--   Run after 01_schema.sql and before loading data. Safe to re-run.
+--   Used by 02_load_data.sql and python/02_b_load_swim_workouts.py.
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Remove Existing Duplicates
+-- ---------------------------------------------------------------------------
+WITH ranked AS
+(
+    SELECT
+        swim_workout_id,
+        ROW_NUMBER() OVER (
+            PARTITION BY workout_date, activity_type, distance_yards, elapsed_time
+            ORDER BY swim_workout_id
+        ) AS rn
+    FROM dbo.swim_workouts
+)
+DELETE FROM ranked
+WHERE rn > 1;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: Unique Natural-Key Index
+-- ---------------------------------------------------------------------------
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ux_swim_workouts_natural_key'
+      AND object_id = OBJECT_ID('dbo.swim_workouts')
+)
+    CREATE UNIQUE NONCLUSTERED INDEX ux_swim_workouts_natural_key
+        ON dbo.swim_workouts (workout_date, activity_type, distance_yards, elapsed_time);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 3: Upsert Procedure
+-- ---------------------------------------------------------------------------
+-- The caller creates and fills #swim_workouts_stage with the typed load
+-- columns. Keys match with INTERSECT so NULLs compare equal, the same way
+-- the unique index treats them. Change detection uses EXCEPT for the same
+-- reason.
+CREATE OR ALTER PROCEDURE dbo.merge_swim_workouts_stage
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @changes TABLE (action NVARCHAR(10), swim_workout_id INT);
+
+    MERGE dbo.swim_workouts WITH (HOLDLOCK) AS t
+    USING
+    (
+        SELECT *
+        FROM
+        (
+            SELECT
+                s.*,
+                ROW_NUMBER() OVER (
+                    PARTITION BY s.workout_date, s.activity_type, s.distance_yards, s.elapsed_time
+                    ORDER BY (SELECT NULL)
+                ) AS rn
+            FROM #swim_workouts_stage AS s
+            WHERE s.workout_date IS NOT NULL
+        ) AS d
+        WHERE d.rn = 1
+    ) AS s
+        ON EXISTS (
+            SELECT t.workout_date, t.activity_type, t.distance_yards, t.elapsed_time
+            INTERSECT
+            SELECT s.workout_date, s.activity_type, s.distance_yards, s.elapsed_time
+        )
+    WHEN MATCHED AND EXISTS (
+            SELECT s.title, s.calories, s.[time], s.avg_hr, s.max_hr, s.aerobic_te,
+                   s.avg_pace, s.best_pace, s.total_strokes, s.avg_swolf, s.avg_stroke_rate,
+                   s.best_lap_time, s.number_of_laps, s.moving_time, s.training_stress_score
+            EXCEPT
+            SELECT t.title, t.calories, t.[time], t.avg_hr, t.max_hr, t.aerobic_te,
+                   t.avg_pace, t.best_pace, t.total_strokes, t.avg_swolf, t.avg_stroke_rate,
+                   t.best_lap_time, t.number_of_laps, t.moving_time, t.training_stress_score
+        ) THEN
+        UPDATE SET
+            title                 = s.title,
+            calories              = s.calories,
+            [time]                = s.[time],
+            avg_hr                = s.avg_hr,
+            max_hr                = s.max_hr,
+            aerobic_te            = s.aerobic_te,
+            avg_pace              = s.avg_pace,
+            best_pace             = s.best_pace,
+            total_strokes         = s.total_strokes,
+            avg_swolf             = s.avg_swolf,
+            avg_stroke_rate       = s.avg_stroke_rate,
+            best_lap_time         = s.best_lap_time,
+            number_of_laps        = s.number_of_laps,
+            moving_time           = s.moving_time,
+            training_stress_score = s.training_stress_score,
+            -- Metrics changed: regenerate the AI summary.
+            notes                 = NULL,
+            felt_rating           = NULL,
+            perceived_effort      = NULL
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT
+        (
+            activity_type, workout_date, title, distance_yards, calories, [time],
+            avg_hr, max_hr, aerobic_te, avg_pace, best_pace, total_strokes,
+            avg_swolf, avg_stroke_rate, best_lap_time, number_of_laps,
+            moving_time, elapsed_time, training_stress_score
+        )
+        VALUES
+        (
+            s.activity_type, s.workout_date, s.title, s.distance_yards, s.calories, s.[time],
+            s.avg_hr, s.max_hr, s.aerobic_te, s.avg_pace, s.best_pace, s.total_strokes,
+            s.avg_swolf, s.avg_stroke_rate, s.best_lap_time, s.number_of_laps,
+            s.moving_time, s.elapsed_time, s.training_stress_score
+        )
+    OUTPUT $action, inserted.swim_workout_id INTO @changes;
+
+    -- Changed rows get a fresh retry budget for AI generation.
+    IF OBJECT_ID('dbo.ai_generation_attempts', 'U') IS NOT NULL
+        DELETE a
+        FROM dbo.ai_generation_attempts AS a
+        JOIN @changes AS c ON c.swim_workout_id = a.swim_workout_id AND c.action = 'UPDATE';
+
+    IF OBJECT_ID('dbo.ai_generation_dead_letter', 'U') IS NOT NULL
+        DELETE d
+        FROM dbo.ai_generation_dead_letter AS d
+        JOIN @changes AS c ON c.swim_workout_id = d.swim_workout_id AND c.action = 'UPDATE';
+
+    SELECT
+        (SELECT COUNT(*) FROM #swim_workouts_stage)             AS staged,
+        (SELECT COUNT(*) FROM @changes WHERE action = 'INSERT') AS inserted,
+        (SELECT COUNT(*) FROM @changes WHERE action = 'UPDATE') AS updated;
+END
+GO
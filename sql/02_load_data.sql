@@ -6,11 +6,14 @@
 --
 -- Prerequisites:
 --   - 01_schema.sql has been executed
+--   - 01_b_natural_key_upsert.sql has been executed
 --   - swim_workouts.csv is available locally
 --   - Update @FilePath to the full path on your machine
 --
 -- Usage:
---   Run this script after creating the table in 01_schema.sql
+--   Run this script after creating the table in 01_schema.sql.
+--   Re-running it with an overlapping export is safe: rows are upserted on
+--   the natural key, unchanged rows are skipped.
 -- =============================================================================
 
 USE SqlAiDatathon;
@@ -27,7 +30,7 @@ GO
 -- ---------------------------------------------------------------------------
 
 -- ---------------------------------------------------------------------------
--- SECTION 2: Load Data Using BULK INSERT + Staging Table
+-- SECTION 2: Load Data Using BULK INSERT + Staging Table + MERGE
 -- ---------------------------------------------------------------------------
 DECLARE @FilePath NVARCHAR(4000) =
     'C:\Users\shane\source\repos\sql-ai-endurance-agent\data\swim_workouts.csv'; -- <-- UPDATE THIS
@@ -69,33 +72,11 @@ DECLARE @BulkSql NVARCHAR(MAX) =
 
 EXEC sys.sp_executesql @BulkSql;
 
-INSERT INTO dbo.swim_workouts
-(
-    activity_type,
-    workout_date,
-    title,
-    distance_yards,
-    calories,
-    time,
-    avg_hr,
-    max_hr,
-    aerobic_te,
-    avg_pace,
-    best_pace,
-    total_strokes,
-    avg_swolf,
-    avg_stroke_rate,
-    best_lap_time,
-    number_of_laps,
-    moving_time,
-    elapsed_time,
-    training_stress_score
-)
 SELECT
     [Activity Type] AS activity_type,
     TRY_CONVERT(DATETIME2, [Date]) AS workout_date,
     [Title] AS title,
-    TRY_CONVERT(FLOAT, REPLACE([Distance], ',', '')) AS distance,
+    TRY_CONVERT(FLOAT, REPLACE([Distance], ',', '')) AS distance_yards,
     TRY_CONVERT(INT, [Calories]) AS calories,
     [Time] AS time,
     TRY_CONVERT(INT, [Avg HR]) AS avg_hr,
@@ -111,8 +92,13 @@ SELECT
     [Moving Time] AS moving_time,
     [Elapsed Time] AS elapsed_time,
     TRY_CONVERT(FLOAT, [Training Stress Score®]) AS training_stress_score
+INTO #swim_workouts_stage
 FROM #swim_workouts_raw;
 
+-- Upsert on the natural key (see 01_b_natural_key_upsert.sql).
+EXEC dbo.merge_swim_workouts_stage;
+
+DROP TABLE #swim_workouts_stage;
 DROP TABLE #swim_workouts_raw;
 GO
 
@@ -0,0 +1,45 @@
+-- =============================================================================
+-- Embedding Metadata for Incremental Regeneration
+-- =============================================================================
+-- Description:
+--   Adds the columns python_regenerate_embeddings_openai.py uses to decide
+--   which rows actually need a new embedding:
+--     - embedding_hash  : SHA2_256 of the notes text that was embedded
+--     - embedding_model : embedding model that produced the vector
+--
+--   A row is re-embedded only when its embedding is NULL, its notes no longer
+--   hash to embedding_hash, or embedding_model differs from the current model.
+--
+-- Prerequisites:
+--   - 01_schema.sql has been executed
+--
+-- Usage:
+--   Safe to re-run. Run again after 01_schema.sql recreates swim_workouts.
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Add Metadata Columns
+-- ---------------------------------------------------------------------------
+IF COL_LENGTH('dbo.swim_workouts', 'embedding_hash') IS NULL
+    ALTER TABLE dbo.swim_workouts ADD embedding_hash BINARY(32) NULL;
+
+IF COL_LENGTH('dbo.swim_workouts', 'embedding_model') IS NULL
+    ALTER TABLE dbo.swim_workouts ADD embedding_model NVARCHAR(100) NULL;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: Verify Stale Row Count
+-- ---------------------------------------------------------------------------
+-- HASHBYTES over NVARCHAR hashes the UTF-16LE bytes, which is what the
+-- Python side hashes as well. Rows with blank notes keep a NULL embedding once
+-- their hash and model are recorded, so they are not counted again.
+SELECT COUNT(*) AS rows_needing_embedding
+FROM dbo.swim_workouts
+WHERE embedding_hash IS NULL
+   OR embedding_hash <> HASHBYTES('SHA2_256', ISNULL(notes, N''))
+   OR embedding_model IS NULL
+   OR embedding_model <> N'text-embedding-3-small';
+GO
@@ -0,0 +1,56 @@
+-- =============================================================================
+-- AI Generation Attempt Tracking and Dead-Letter Table
+-- =============================================================================
+-- Description:
+--   Durable per-row bookkeeping for 04_b_generate_swim_ai_fields_anthropic.py.
+--     - ai_generation_attempts    : failure count, last error and the earliest
+--                                   time the row may be retried (exponential
+--                                   backoff)
+--     - ai_generation_dead_letter : rows that hit the retry cap; they are no
+--                                   longer fetched until removed from here
+--
+-- Prerequisites:
+--   - 01_schema.sql has been executed
+--
+-- Usage:
+--   Safe to re-run. To retry a dead-lettered workout, delete its rows from
+--   both tables.
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Attempt Tracking
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.ai_generation_attempts', 'U') IS NULL
+CREATE TABLE dbo.ai_generation_attempts
+(
+    swim_workout_id   INT             NOT NULL PRIMARY KEY,
+    attempts          INT             NOT NULL,
+    last_error        NVARCHAR(MAX)   NULL,
+    last_attempt_at   DATETIME2       NOT NULL,
+    next_attempt_at   DATETIME2       NOT NULL
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: Dead-Letter Table
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.ai_generation_dead_letter', 'U') IS NULL
+CREATE TABLE dbo.ai_generation_dead_letter
+(
+    swim_workout_id   INT             NOT NULL PRIMARY KEY,
+    attempts          INT             NOT NULL,
+    last_error        NVARCHAR(MAX)   NULL,
+    dead_lettered_at  DATETIME2       NOT NULL DEFAULT SYSUTCDATETIME()
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 3: Verify
+-- ---------------------------------------------------------------------------
+SELECT swim_workout_id, attempts, dead_lettered_at, LEFT(last_error, 200) AS last_error
+FROM dbo.ai_generation_dead_letter
+ORDER BY dead_lettered_at DESC;
+GO
@@ -0,0 +1,36 @@
+-- =============================================================================
+-- Change Tracking for the In-Process Vector Index
+-- =============================================================================
+-- Description:
+--   Adds a ROWVERSION column to swim_workouts. SQL Server bumps it on every
+--   INSERT/UPDATE, so semantic_search.py can refresh its in-memory index with
+--   only the rows changed since the highest row_version it has already seen.
+--
+-- Prerequisites:
+--   - 01_schema.sql has been executed
+--
+-- Usage:
+--   Safe to re-run. Run again after 01_schema.sql recreates swim_workouts.
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Add ROWVERSION Column
+-- ---------------------------------------------------------------------------
+IF COL_LENGTH('dbo.swim_workouts', 'row_version') IS NULL
+    ALTER TABLE dbo.swim_workouts ADD row_version ROWVERSION;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: Index for Incremental Refresh
+-- ---------------------------------------------------------------------------
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_swim_workouts_row_version'
+      AND object_id = OBJECT_ID('dbo.swim_workouts')
+)
+    CREATE NONCLUSTERED INDEX ix_swim_workouts_row_version
+        ON dbo.swim_workouts (row_version);
+GO
@@ -0,0 +1,44 @@
+-- =============================================================================
+-- Widen swim_workouts.embedding for Self-Describing Blobs
+-- =============================================================================
+-- Description:
+--   python/embedding_codec.py stores embeddings as float32, float16 or int8,
+--   each prefixed with a small header (format + dimension, plus a float32
+--   scale for int8). A 1536-dim float32 blob with its header is 6150 bytes,
+--   just over the original VARBINARY(6144), so the column is widened to 8000.
+--   float16 (3078 bytes) and int8 (1546 bytes) blobs cut storage and ODBC
+--   transfer 2-4x. Legacy raw float32 blobs remain readable.
+--
+-- Prerequisites:
+--   - 01_schema.sql has been executed
+--
+-- Usage:
+--   Safe to re-run. Set EMBED_STORAGE_FORMAT and run
+--   python_regenerate_embeddings_openai.py --full to re-encode existing rows.
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Widen Column
+-- ---------------------------------------------------------------------------
+IF EXISTS (
+    SELECT * FROM sys.columns
+    WHERE object_id = OBJECT_ID('dbo.swim_workouts')
+      AND name = 'embedding'
+      AND max_length <> 8000
+)
+    ALTER TABLE dbo.swim_workouts ALTER COLUMN embedding VARBINARY(8000) NULL;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: Verify Storage per Row
+-- ---------------------------------------------------------------------------
+SELECT
+    COUNT(*)                   AS rows_with_embedding,
+    AVG(DATALENGTH(embedding)) AS avg_bytes_per_embedding,
+    SUM(DATALENGTH(embedding)) AS total_embedding_bytes
+FROM dbo.swim_workouts
+WHERE embedding IS NOT NULL;
+GO
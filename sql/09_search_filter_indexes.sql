@@ -0,0 +1,60 @@
+-- =============================================================================
+-- Indexes for Filtered Semantic Search
+-- =============================================================================
+-- Description:
+--   Supports the structured filters in python/search_filters.py when they are
+--   pushed down to SQL (search_filters.to_sql): date ranges, activity type,
+--   distance / heart-rate / training-stress thresholds and the AI-generated
+--   felt_rating / perceived_effort labels.
+--
+--   The in-memory vector index applies the same filters itself. The keyword
+--   side of search (semantic_search.keyword_candidates) looks the matching
+--   workout keys up in SQL on every filtered query; these indexes (which
+--   carry the clustered swim_workout_id) let that lookup seek instead of
+--   scanning the table.
+--
+-- Prerequisites:
+--   - 01_schema.sql has been executed
+--
+-- Usage:
+--   Safe to re-run. Run again after 01_schema.sql recreates swim_workouts.
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Date / Activity Type
+-- ---------------------------------------------------------------------------
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_swim_workouts_activity_date'
+      AND object_id = OBJECT_ID('dbo.swim_workouts')
+)
+    CREATE NONCLUSTERED INDEX ix_swim_workouts_activity_date
+        ON dbo.swim_workouts (activity_type, workout_date)
+        INCLUDE (distance_yards, avg_hr, training_stress_score);
+GO
+
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_swim_workouts_workout_date'
+      AND object_id = OBJECT_ID('dbo.swim_workouts')
+)
+    CREATE NONCLUSTERED INDEX ix_swim_workouts_workout_date
+        ON dbo.swim_workouts (workout_date)
+        INCLUDE (activity_type, distance_yards, avg_hr, training_stress_score);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: AI-Generated Labels
+-- ---------------------------------------------------------------------------
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_swim_workouts_effort_labels'
+      AND object_id = OBJECT_ID('dbo.swim_workouts')
+)
+    CREATE NONCLUSTERED INDEX ix_swim_workouts_effort_labels
+        ON dbo.swim_workouts (felt_rating, perceived_effort)
+        INCLUDE (workout_date);
+GO
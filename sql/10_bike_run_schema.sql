@@ -0,0 +1,441 @@
+-- =============================================================================
+-- Bike and Run Workout Tables
+-- =============================================================================
+-- Description:
+--   Adds the bike_workouts and run_workouts tables described in
+--   python/sports.py, so the generic loader, AI generation, embedding and
+--   search pipelines cover the whole training history, not just swims.
+--   Marathons and other races are run_workouts rows (see activity_type).
+--
+--   Each table gets everything swim_workouts picked up in scripts 01_b-09:
+--     - natural-key unique index + dbo.merge_<table>_stage upsert procedure
+--     - embedding, embedding_hash, embedding_model and row_version columns
+--     - <sport>_ai_generation_attempts / _dead_letter tracking tables
+--     - filter / refresh indexes
+--   Distances are stored in miles (Garmin's bike/run unit); search filters
+--   convert them to yards so one filter works across sports.
+--
+-- Prerequisites:
+--   - 01_schema.sql has been executed
+--
+-- Usage:
+--   Safe to re-run. Load data with:
+--     python 02_b_load_swim_workouts.py path/to/bike_workouts.csv --sport bike
+--     python 02_b_load_swim_workouts.py path/to/run_workouts.csv --sport run
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: bike_workouts
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.bike_workouts', 'U') IS NULL
+CREATE TABLE dbo.bike_workouts
+(
+    bike_workout_id       INT IDENTITY(1,1) PRIMARY KEY,
+
+    -- Core workout metrics
+    activity_type         NVARCHAR(100)     NULL,   -- e.g., "Road Cycling", "Indoor Cycling"
+    workout_date          DATETIME2         NOT NULL,
+    title                 NVARCHAR(200)     NULL,
+
+    distance_miles        FLOAT             NULL,
+    calories              INT               NULL,
+    [time]                NVARCHAR(50)      NULL,
+    avg_hr                INT               NULL,
+    max_hr                INT               NULL,
+    aerobic_te            FLOAT             NULL,
+    avg_speed_mph         FLOAT             NULL,
+    max_speed_mph         FLOAT             NULL,
+    total_ascent_ft       FLOAT             NULL,
+    total_descent_ft      FLOAT             NULL,
+    avg_bike_cadence      INT               NULL,
+    max_bike_cadence      INT               NULL,
+    avg_power             INT               NULL,
+    max_power             INT               NULL,
+    normalized_power      INT               NULL,
+
+    -- Session structure / training load
+    best_lap_time         NVARCHAR(50)      NULL,
+    number_of_laps        INT               NULL,
+    moving_time           NVARCHAR(50)      NULL,
+    elapsed_time          NVARCHAR(50)      NULL,
+    training_stress_score FLOAT             NULL,
+
+    -- AI-generated summary
+    notes                 NVARCHAR(MAX)     NULL,
+    felt_rating           NVARCHAR(20)      NULL,
+    perceived_effort      NVARCHAR(20)      NULL,
+
+    -- Embedding (self-describing blob, see python/embedding_codec.py) + metadata
+    embedding             VARBINARY(8000)   NULL,
+    embedding_hash        BINARY(32)        NULL,
+    embedding_model       NVARCHAR(100)     NULL,
+    row_version           ROWVERSION
+);
+GO
+
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ux_bike_workouts_natural_key'
+      AND object_id = OBJECT_ID('dbo.bike_workouts')
+)
+    CREATE UNIQUE NONCLUSTERED INDEX ux_bike_workouts_natural_key
+        ON dbo.bike_workouts (workout_date, activity_type, distance_miles, elapsed_time);
+GO
+
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_bike_workouts_row_version'
+      AND object_id = OBJECT_ID('dbo.bike_workouts')
+)
+    CREATE NONCLUSTERED INDEX ix_bike_workouts_row_version
+        ON dbo.bike_workouts (row_version);
+GO
+
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_bike_workouts_activity_date'
+      AND object_id = OBJECT_ID('dbo.bike_workouts')
+)
+    CREATE NONCLUSTERED INDEX ix_bike_workouts_activity_date
+        ON dbo.bike_workouts (activity_type, workout_date)
+        INCLUDE (distance_miles, avg_hr, training_stress_score);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: run_workouts
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.run_workouts', 'U') IS NULL
+CREATE TABLE dbo.run_workouts
+(
+    run_workout_id        INT IDENTITY(1,1) PRIMARY KEY,
+
+    -- Core workout metrics
+    activity_type         NVARCHAR(100)     NULL,   -- e.g., "Running", "Treadmill Running"
+    workout_date          DATETIME2         NOT NULL,
+    title                 NVARCHAR(200)     NULL,
+
+    distance_miles        FLOAT             NULL,
+    calories              INT               NULL,
+    [time]                NVARCHAR(50)      NULL,
+    avg_hr                INT               NULL,
+    max_hr                INT               NULL,
+    aerobic_te            FLOAT             NULL,
+    avg_pace              NVARCHAR(50)      NULL,
+    best_pace             NVARCHAR(50)      NULL,
+    avg_run_cadence       INT               NULL,
+    max_run_cadence       INT               NULL,
+    total_ascent_ft       FLOAT             NULL,
+    total_descent_ft      FLOAT             NULL,
+    avg_stride_length     FLOAT             NULL,
+    avg_power             INT               NULL,
+
+    -- Session structure / training load
+    best_lap_time         NVARCHAR(50)      NULL,
+    number_of_laps        INT               NULL,
+    moving_time           NVARCHAR(50)      NULL,
+    elapsed_time          NVARCHAR(50)      NULL,
+    training_stress_score FLOAT             NULL,
+
+    -- AI-generated summary
+    notes                 NVARCHAR(MAX)     NULL,
+    felt_rating           NVARCHAR(20)      NULL,
+    perceived_effort      NVARCHAR(20)      NULL,
+
+    -- Embedding (self-describing blob, see python/embedding_codec.py) + metadata
+    embedding             VARBINARY(8000)   NULL,
+    embedding_hash        BINARY(32)        NULL,
+    embedding_model       NVARCHAR(100)     NULL,
+    row_version           ROWVERSION
+);
+GO
+
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ux_run_workouts_natural_key'
+      AND object_id = OBJECT_ID('dbo.run_workouts')
+)
+    CREATE UNIQUE NONCLUSTERED INDEX ux_run_workouts_natural_key
+        ON dbo.run_workouts (workout_date, activity_type, distance_miles, elapsed_time);
+GO
+
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_run_workouts_row_version'
+      AND object_id = OBJECT_ID('dbo.run_workouts')
+)
+    CREATE NONCLUSTERED INDEX ix_run_workouts_row_version
+        ON dbo.run_workouts (row_version);
+GO
+
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_run_workouts_activity_date'
+      AND object_id = OBJECT_ID('dbo.run_workouts')
+)
+    CREATE NONCLUSTERED INDEX ix_run_workouts_activity_date
+        ON dbo.run_workouts (activity_type, workout_date)
+        INCLUDE (distance_miles, avg_hr, training_stress_score);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 3: Bike AI Generation Tracking
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.bike_ai_generation_attempts', 'U') IS NULL
+CREATE TABLE dbo.bike_ai_generation_attempts
+(
+    bike_workout_id   INT             NOT NULL PRIMARY KEY,
+    attempts          INT             NOT NULL,
+    last_error        NVARCHAR(MAX)   NULL,
+    last_attempt_at   DATETIME2       NOT NULL,
+    next_attempt_at   DATETIME2       NOT NULL
+);
+GO
+
+IF OBJECT_ID('dbo.bike_ai_generation_dead_letter', 'U') IS NULL
+CREATE TABLE dbo.bike_ai_generation_dead_letter
+(
+    bike_workout_id   INT             NOT NULL PRIMARY KEY,
+    attempts          INT             NOT NULL,
+    last_error        NVARCHAR(MAX)   NULL,
+    dead_lettered_at  DATETIME2       NOT NULL DEFAULT SYSUTCDATETIME()
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 4: Run AI Generation Tracking
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.run_ai_generation_attempts', 'U') IS NULL
+CREATE TABLE dbo.run_ai_generation_attempts
+(
+    run_workout_id    INT             NOT NULL PRIMARY KEY,
+    attempts          INT             NOT NULL,
+    last_error        NVARCHAR(MAX)   NULL,
+    last_attempt_at   DATETIME2       NOT NULL,
+    next_attempt_at   DATETIME2       NOT NULL
+);
+GO
+
+IF OBJECT_ID('dbo.run_ai_generation_dead_letter', 'U') IS NULL
+CREATE TABLE dbo.run_ai_generation_dead_letter
+(
+    run_workout_id    INT             NOT NULL PRIMARY KEY,
+    attempts          INT             NOT NULL,
+    last_error        NVARCHAR(MAX)   NULL,
+    dead_lettered_at  DATETIME2       NOT NULL DEFAULT SYSUTCDATETIME()
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 5: bike_workouts Upsert Procedure
+-- ---------------------------------------------------------------------------
+-- Same contract as dbo.merge_swim_workouts_stage (01_b_natural_key_upsert.sql):
+-- the caller fills #bike_workouts_stage, NULL-safe key match, changed metrics
+-- clear the AI fields and the row's retry bookkeeping.
+CREATE OR ALTER PROCEDURE dbo.merge_bike_workouts_stage
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @changes TABLE (action NVARCHAR(10), bike_workout_id INT);
+
+    MERGE dbo.bike_workouts WITH (HOLDLOCK) AS t
+    USING
+    (
+        SELECT *
+        FROM
+        (
+            SELECT
+                s.*,
+                ROW_NUMBER() OVER (
+                    PARTITION BY s.workout_date, s.activity_type, s.distance_miles, s.elapsed_time
+                    ORDER BY (SELECT NULL)
+                ) AS rn
+            FROM #bike_workouts_stage AS s
+            WHERE s.workout_date IS NOT NULL
+        ) AS d
+        WHERE d.rn = 1
+    ) AS s
+        ON EXISTS (
+            SELECT t.workout_date, t.activity_type, t.distance_miles, t.elapsed_time
+            INTERSECT
+            SELECT s.workout_date, s.activity_type, s.distance_miles, s.elapsed_time
+        )
+    WHEN MATCHED AND EXISTS (
+            SELECT s.title, s.calories, s.[time], s.avg_hr, s.max_hr, s.aerobic_te,
+                   s.avg_speed_mph, s.max_speed_mph, s.total_ascent_ft, s.total_descent_ft,
+                   s.avg_bike_cadence, s.max_bike_cadence, s.avg_power, s.max_power,
+                   s.normalized_power, s.best_lap_time, s.number_of_laps, s.moving_time,
+                   s.training_stress_score
+            EXCEPT
+            SELECT t.title, t.calories, t.[time], t.avg_hr, t.max_hr, t.aerobic_te,
+                   t.avg_speed_mph, t.max_speed_mph, t.total_ascent_ft, t.total_descent_ft,
+                   t.avg_bike_cadence, t.max_bike_cadence, t.avg_power, t.max_power,
+                   t.normalized_power, t.best_lap_time, t.number_of_laps, t.moving_time,
+                   t.training_stress_score
+        ) THEN
+        UPDATE SET
+            title                 = s.title,
+            calories              = s.calories,
+            [time]                = s.[time],
+            avg_hr                = s.avg_hr,
+            max_hr                = s.max_hr,
+            aerobic_te            = s.aerobic_te,
+            avg_speed_mph         = s.avg_speed_mph,
+            max_speed_mph         = s.max_speed_mph,
+            total_ascent_ft       = s.total_ascent_ft,
+            total_descent_ft      = s.total_descent_ft,
+            avg_bike_cadence      = s.avg_bike_cadence,
+            max_bike_cadence      = s.max_bike_cadence,
+            avg_power             = s.avg_power,
+            max_power             = s.max_power,
+            normalized_power      = s.normalized_power,
+            best_lap_time         = s.best_lap_time,
+            number_of_laps        = s.number_of_laps,
+            moving_time           = s.moving_time,
+            training_stress_score = s.training_stress_score,
+            -- Metrics changed: regenerate the AI summary.
+            notes                 = NULL,
+            felt_rating           = NULL,
+            perceived_effort      = NULL
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT
+        (
+            activity_type, workout_date, title, distance_miles, calories, [time], avg_hr,
+            max_hr, aerobic_te, avg_speed_mph, max_speed_mph, total_ascent_ft,
+            total_descent_ft, avg_bike_cadence, max_bike_cadence, avg_power, max_power,
+            normalized_power, best_lap_time, number_of_laps, moving_time, elapsed_time,
+            training_stress_score
+        )
+        VALUES
+        (
+            s.activity_type, s.workout_date, s.title, s.distance_miles, s.calories,
+            s.[time], s.avg_hr, s.max_hr, s.aerobic_te, s.avg_speed_mph, s.max_speed_mph,
+            s.total_ascent_ft, s.total_descent_ft, s.avg_bike_cadence, s.max_bike_cadence,
+            s.avg_power, s.max_power, s.normalized_power, s.best_lap_time,
+            s.number_of_laps, s.moving_time, s.elapsed_time, s.training_stress_score
+        )
+    OUTPUT $action, inserted.bike_workout_id INTO @changes;
+
+    -- Changed rows get a fresh retry budget for AI generation.
+    DELETE a
+    FROM dbo.bike_ai_generation_attempts AS a
+    JOIN @changes AS c ON c.bike_workout_id = a.bike_workout_id AND c.action = 'UPDATE';
+
+    DELETE d
+    FROM dbo.bike_ai_generation_dead_letter AS d
+    JOIN @changes AS c ON c.bike_workout_id = d.bike_workout_id AND c.action = 'UPDATE';
+
+    SELECT
+        (SELECT COUNT(*) FROM #bike_workouts_stage)             AS staged,
+        (SELECT COUNT(*) FROM @changes WHERE action = 'INSERT') AS inserted,
+        (SELECT COUNT(*) FROM @changes WHERE action = 'UPDATE') AS updated;
+END
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 6: run_workouts Upsert Procedure
+-- ---------------------------------------------------------------------------
+-- Same contract as dbo.merge_swim_workouts_stage (01_b_natural_key_upsert.sql):
+-- the caller fills #run_workouts_stage, NULL-safe key match, changed metrics
+-- clear the AI fields and the row's retry bookkeeping.
+CREATE OR ALTER PROCEDURE dbo.merge_run_workouts_stage
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @changes TABLE (action NVARCHAR(10), run_workout_id INT);
+
+    MERGE dbo.run_workouts WITH (HOLDLOCK) AS t
+    USING
+    (
+        SELECT *
+        FROM
+        (
+            SELECT
+                s.*,
+                ROW_NUMBER() OVER (
+                    PARTITION BY s.workout_date, s.activity_type, s.distance_miles, s.elapsed_time
+                    ORDER BY (SELECT NULL)
+                ) AS rn
+            FROM #run_workouts_stage AS s
+            WHERE s.workout_date IS NOT NULL
+        ) AS d
+        WHERE d.rn = 1
+    ) AS s
+        ON EXISTS (
+            SELECT t.workout_date, t.activity_type, t.distance_miles, t.elapsed_time
+            INTERSECT
+            SELECT s.workout_date, s.activity_type, s.distance_miles, s.elapsed_time
+        )
+    WHEN MATCHED AND EXISTS (
+            SELECT s.title, s.calories, s.[time], s.avg_hr, s.max_hr, s.aerobic_te,
+                   s.avg_pace, s.best_pace, s.avg_run_cadence, s.max_run_cadence,
+                   s.total_ascent_ft, s.total_descent_ft, s.avg_stride_length, s.avg_power,
+                   s.best_lap_time, s.number_of_laps, s.moving_time,
+                   s.training_stress_score
+            EXCEPT
+            SELECT t.title, t.calories, t.[time], t.avg_hr, t.max_hr, t.aerobic_te,
+                   t.avg_pace, t.best_pace, t.avg_run_cadence, t.max_run_cadence,
+                   t.total_ascent_ft, t.total_descent_ft, t.avg_stride_length, t.avg_power,
+                   t.best_lap_time, t.number_of_laps, t.moving_time,
+                   t.training_stress_score
+        ) THEN
+        UPDATE SET
+            title                 = s.title,
+            calories              = s.calories,
+            [time]                = s.[time],
+            avg_hr                = s.avg_hr,
+            max_hr                = s.max_hr,
+            aerobic_te            = s.aerobic_te,
+            avg_pace              = s.avg_pace,
+            best_pace             = s.best_pace,
+            avg_run_cadence       = s.avg_run_cadence,
+            max_run_cadence       = s.max_run_cadence,
+            total_ascent_ft       = s.total_ascent_ft,
+            total_descent_ft      = s.total_descent_ft,
+            avg_stride_length     = s.avg_stride_length,
+            avg_power             = s.avg_power,
+            best_lap_time         = s.best_lap_time,
+            number_of_laps        = s.number_of_laps,
+            moving_time           = s.moving_time,
+            training_stress_score = s.training_stress_score,
+            -- Metrics changed: regenerate the AI summary.
+            notes                 = NULL,
+            felt_rating           = NULL,
+            perceived_effort      = NULL
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT
+        (
+            activity_type, workout_date, title, distance_miles, calories, [time], avg_hr,
+            max_hr, aerobic_te, avg_pace, best_pace, avg_run_cadence, max_run_cadence,
+            total_ascent_ft, total_descent_ft, avg_stride_length, avg_power, best_lap_time,
+            number_of_laps, moving_time, elapsed_time, training_stress_score
+        )
+        VALUES
+        (
+            s.activity_type, s.workout_date, s.title, s.distance_miles, s.calories,
+            s.[time], s.avg_hr, s.max_hr, s.aerobic_te, s.avg_pace, s.best_pace,
+            s.avg_run_cadence, s.max_run_cadence, s.total_ascent_ft, s.total_descent_ft,
+            s.avg_stride_length, s.avg_power, s.best_lap_time, s.number_of_laps,
+            s.moving_time, s.elapsed_time, s.training_stress_score
+        )
+    OUTPUT $action, inserted.run_workout_id INTO @changes;
+
+    -- Changed rows get a fresh retry budget for AI generation.
+    DELETE a
+    FROM dbo.run_ai_generation_attempts AS a
+    JOIN @changes AS c ON c.run_workout_id = a.run_workout_id AND c.action = 'UPDATE';
+
+    DELETE d
+    FROM dbo.run_ai_generation_dead_letter AS d
+    JOIN @changes AS c ON c.run_workout_id = d.run_workout_id AND c.action = 'UPDATE';
+
+    SELECT
+        (SELECT COUNT(*) FROM #run_workouts_stage)             AS staged,
+        (SELECT COUNT(*) FROM @changes WHERE action = 'INSERT') AS inserted,
+        (SELECT COUNT(*) FROM @changes WHERE action = 'UPDATE') AS updated;
+END
+GO
@@ -0,0 +1,86 @@
+-- =============================================================================
+-- AI Output Cache
+-- =============================================================================
+-- Description:
+--   Persistent cache of generated AI fields, shared by every sport and used
+--   by 04_b_generate_swim_ai_fields_anthropic.py (python/ai_output_cache.py).
+--
+--   cache_key is a SHA2_256 over the canonicalized prompt inputs (sport,
+--   metrics, age, gender, prompt_version, model, plus packed_prompt_version
+--   for outputs of packed multi-workout requests). After a schema rebuild or
+--   an overlapping re-import, rows with identical metrics are filled from
+--   here instead of calling the model again.
+--
+--   prompt_variant is 'single' or 'packed'. Every row records prompt_version;
+--   packed rows also record packed_prompt_version, since their key hashes
+--   both. Bumping prompt_version evicts a sport's single and packed outputs;
+--   bumping packed_prompt_version evicts only the packed ones.
+--
+--   The table is deliberately not dropped by 01_schema.sql, so the cache
+--   survives rebuilds of the workout tables.
+--
+-- Prerequisites:
+--   - 00_create_db.sql has been executed
+--
+-- Usage:
+--   Safe to re-run. Entries for an older prompt_version (or
+--   packed_prompt_version) are evicted automatically; to clear everything, TRUNCATE TABLE dbo.ai_output_cache.
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Cache Table
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.ai_output_cache', 'U') IS NULL
+CREATE TABLE dbo.ai_output_cache
+(
+    cache_key             BINARY(32)      NOT NULL PRIMARY KEY,
+    sport                 NVARCHAR(20)    NOT NULL,
+    prompt_variant        NVARCHAR(10)    NOT NULL DEFAULT 'single',
+    prompt_version        INT             NOT NULL,
+    packed_prompt_version INT             NULL,
+    model                 NVARCHAR(100)   NOT NULL,
+    summary               NVARCHAR(MAX)   NOT NULL,
+    felt_rating           NVARCHAR(20)    NOT NULL,
+    perceived_effort      NVARCHAR(20)    NOT NULL,
+    hits                  INT             NOT NULL DEFAULT 0,
+    created_at            DATETIME2       NOT NULL DEFAULT SYSUTCDATETIME(),
+    last_hit_at           DATETIME2       NULL
+);
+GO
+
+-- Tables created before packed outputs were cached.
+IF COL_LENGTH('dbo.ai_output_cache', 'prompt_variant') IS NULL
+    ALTER TABLE dbo.ai_output_cache
+        ADD prompt_variant NVARCHAR(10) NOT NULL
+            CONSTRAINT df_ai_output_cache_prompt_variant DEFAULT 'single';
+GO
+
+-- Packed rows written before they recorded both versions keep a NULL here
+-- and are evicted on the next 04_b pass.
+IF COL_LENGTH('dbo.ai_output_cache', 'packed_prompt_version') IS NULL
+    ALTER TABLE dbo.ai_output_cache ADD packed_prompt_version INT NULL;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: Index for Prompt-Version Eviction
+-- ---------------------------------------------------------------------------
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_ai_output_cache_sport_version'
+      AND object_id = OBJECT_ID('dbo.ai_output_cache')
+)
+    CREATE NONCLUSTERED INDEX ix_ai_output_cache_sport_version
+        ON dbo.ai_output_cache (sport, prompt_version);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 3: Verify
+-- ---------------------------------------------------------------------------
+SELECT sport, prompt_variant, prompt_version, packed_prompt_version, model,
+       COUNT(*) AS entries, SUM(hits) AS hits
+FROM dbo.ai_output_cache
+GROUP BY sport, prompt_variant, prompt_version, packed_prompt_version, model;
+GO
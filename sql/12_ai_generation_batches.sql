@@ -0,0 +1,93 @@
+-- =============================================================================
+-- AI Generation Batch Tracking (Message Batches bulk mode)
+-- =============================================================================
+-- Description:
+--   Bookkeeping for 04_b_generate_swim_ai_fields_anthropic.py --bulk, which
+--   submits pending workouts as Anthropic Message Batches instead of one
+--   synchronous request per workout.
+--
+--   ai_generation_batches       one row per submitted batch (id, sport, status)
+--   ai_generation_batch_items   one row per workout in a batch; applied = 1
+--                               once its result (or failure) is written
+--
+--   The batch and its items are committed under a local id (status
+--   'submitting') before the batch is created, then switched to the API's
+--   batch id. A crashed run resumes by polling the unapplied batches and
+--   applying the items that are still open; a batch stuck in 'submitting'
+--   is matched against the API's batch list or dropped. Workouts with an
+--   open item are not submitted again.
+--
+-- Prerequisites:
+--   - 00_create_db.sql has been executed
+--
+-- Usage:
+--   Safe to re-run. Applied batches are history only; delete them freely.
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Batch Table
+-- ---------------------------------------------------------------------------
+-- status: submitting (local id, create pending) → in_progress → ended
+--         (results available) → applied (written to SQL)
+IF OBJECT_ID('dbo.ai_generation_batches', 'U') IS NULL
+CREATE TABLE dbo.ai_generation_batches
+(
+    batch_id          NVARCHAR(100)   NOT NULL PRIMARY KEY,
+    sport             NVARCHAR(20)    NOT NULL,
+    model             NVARCHAR(100)   NOT NULL,
+    request_count     INT             NOT NULL,
+    status            NVARCHAR(20)    NOT NULL DEFAULT 'in_progress',
+    submitted_at      DATETIME2       NOT NULL DEFAULT SYSUTCDATETIME(),
+    ended_at          DATETIME2       NULL,
+    applied_at        DATETIME2       NULL
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: Batch Item Table
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.ai_generation_batch_items', 'U') IS NULL
+CREATE TABLE dbo.ai_generation_batch_items
+(
+    batch_id          NVARCHAR(100)   NOT NULL,
+    sport             NVARCHAR(20)    NOT NULL,
+    workout_id        INT             NOT NULL,
+    cache_key         BINARY(32)      NULL,
+    applied           BIT             NOT NULL DEFAULT 0,
+    CONSTRAINT pk_ai_generation_batch_items PRIMARY KEY (batch_id, workout_id)
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 3: Indexes
+-- ---------------------------------------------------------------------------
+-- In-flight check used when fetching pending workouts.
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_ai_generation_batch_items_open'
+      AND object_id = OBJECT_ID('dbo.ai_generation_batch_items')
+)
+    CREATE NONCLUSTERED INDEX ix_ai_generation_batch_items_open
+        ON dbo.ai_generation_batch_items (sport, workout_id)
+        WHERE applied = 0;
+GO
+
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE name = 'ix_ai_generation_batches_sport_status'
+      AND object_id = OBJECT_ID('dbo.ai_generation_batches')
+)
+    CREATE NONCLUSTERED INDEX ix_ai_generation_batches_sport_status
+        ON dbo.ai_generation_batches (sport, status);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 4: Verify
+-- ---------------------------------------------------------------------------
+SELECT b.sport, b.status, COUNT(*) AS batches, SUM(b.request_count) AS requests
+FROM dbo.ai_generation_batches AS b
+GROUP BY b.sport, b.status;
+GO
@@ -0,0 +1,126 @@
+-- =============================================================================
+-- Precomputed Training Load (daily/weekly rollups, ATL/CTL/TSB, trends)
+-- =============================================================================
+-- Description:
+--   Small aggregate tables maintained by python/training_load.py, so
+--   dashboards and RAG context read a few hundred rows instead of scanning
+--   the workout tables for every weekly or fitness question.
+--
+--   training_load_daily        one row per sport per day with workouts
+--   training_load_weekly       the same sums per ISO week (Monday start)
+--   training_load_metrics      one row per sport per calendar day: TSS,
+--                              ATL (7-day) / CTL (42-day) exponentially
+--                              weighted load, TSB, and 28-day pace and
+--                              SWOLF trends
+--   training_load_watermarks   per sport, the row_version the next refresh
+--                              reads from (MIN_ACTIVE_ROWVERSION() at the
+--                              last refresh)
+--
+--   sport is 'swim', 'bike', 'run' or 'all' (every sport combined; pace
+--   is left out of 'all' because the units differ per sport).
+--
+--   Averages are stored as sum + count pairs so a day or week can be
+--   recomputed on its own and still combine exactly.
+--
+-- Prerequisites:
+--   - 07_vector_index_support.sql (swim_workouts.row_version)
+--   - 10_bike_run_schema.sql for bike/run (optional)
+--   - 14_duration_seconds.sql (moving_time_seconds, avg_pace_seconds)
+--
+-- Usage:
+--   Safe to re-run. Populate or refresh with:
+--       python training_load.py            (incremental)
+--       python training_load.py --rebuild  (from scratch)
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Daily Rollup
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.training_load_daily', 'U') IS NULL
+CREATE TABLE dbo.training_load_daily
+(
+    sport                 NVARCHAR(20)    NOT NULL,
+    day                   DATE            NOT NULL,
+    workouts              INT             NOT NULL,
+    distance_yards        FLOAT           NOT NULL,
+    moving_seconds        FLOAT           NOT NULL,
+    training_stress_score FLOAT           NOT NULL,
+    hr_sum                FLOAT           NOT NULL,
+    hr_count              INT             NOT NULL,
+    pace_seconds_sum      FLOAT           NOT NULL,
+    pace_count            INT             NOT NULL,
+    swolf_sum             FLOAT           NOT NULL,
+    swolf_count           INT             NOT NULL,
+    updated_at            DATETIME2       NOT NULL DEFAULT SYSUTCDATETIME(),
+    CONSTRAINT pk_training_load_daily PRIMARY KEY (sport, day)
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: Weekly Rollup
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.training_load_weekly', 'U') IS NULL
+CREATE TABLE dbo.training_load_weekly
+(
+    sport                 NVARCHAR(20)    NOT NULL,
+    week_start            DATE            NOT NULL,
+    workouts              INT             NOT NULL,
+    distance_yards        FLOAT           NOT NULL,
+    moving_seconds        FLOAT           NOT NULL,
+    training_stress_score FLOAT           NOT NULL,
+    hr_sum                FLOAT           NOT NULL,
+    hr_count              INT             NOT NULL,
+    pace_seconds_sum      FLOAT           NOT NULL,
+    pace_count            INT             NOT NULL,
+    swolf_sum             FLOAT           NOT NULL,
+    swolf_count           INT             NOT NULL,
+    updated_at            DATETIME2       NOT NULL DEFAULT SYSUTCDATETIME(),
+    CONSTRAINT pk_training_load_weekly PRIMARY KEY (sport, week_start)
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 3: Rolling Load and Trends
+-- ---------------------------------------------------------------------------
+-- Every calendar day from the sport's first workout to the last refresh,
+-- rest days included (TSS 0), because ATL/CTL decay on rest days too.
+-- tsb is form going into the day: yesterday's CTL - yesterday's ATL.
+IF OBJECT_ID('dbo.training_load_metrics', 'U') IS NULL
+CREATE TABLE dbo.training_load_metrics
+(
+    sport                 NVARCHAR(20)    NOT NULL,
+    day                   DATE            NOT NULL,
+    training_stress_score FLOAT           NOT NULL,
+    atl                   FLOAT           NOT NULL,
+    ctl                   FLOAT           NOT NULL,
+    tsb                   FLOAT           NOT NULL,
+    pace_trend_seconds    FLOAT           NULL,
+    swolf_trend           FLOAT           NULL,
+    CONSTRAINT pk_training_load_metrics PRIMARY KEY (sport, day)
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 4: Refresh Watermarks
+-- ---------------------------------------------------------------------------
+IF OBJECT_ID('dbo.training_load_watermarks', 'U') IS NULL
+CREATE TABLE dbo.training_load_watermarks
+(
+    sport                 NVARCHAR(20)    NOT NULL PRIMARY KEY,
+    row_version           BINARY(8)       NOT NULL,
+    updated_at            DATETIME2       NOT NULL DEFAULT SYSUTCDATETIME()
+);
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 5: Verify
+-- ---------------------------------------------------------------------------
+SELECT m.sport, m.day, m.training_stress_score, m.atl, m.ctl, m.tsb,
+       m.pace_trend_seconds, m.swolf_trend
+FROM dbo.training_load_metrics AS m
+WHERE m.day = (SELECT MAX(day) FROM dbo.training_load_metrics WHERE sport = m.sport)
+ORDER BY m.sport;
+GO
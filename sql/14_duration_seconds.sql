@@ -0,0 +1,109 @@
+-- =============================================================================
+-- Parsed Seconds Columns for Duration and Pace Strings
+-- =============================================================================
+-- Description:
+--   Garmin exports durations and paces as text ("0:40:29", "1:50", "0:25.3"),
+--   so every sort, range filter or aggregate on them parsed strings per row.
+--   This one-time migration adds a persisted computed FLOAT column with the
+--   value in seconds next to each of them, on every workout table present:
+--
+--     time           → time_seconds
+--     avg_pace       → avg_pace_seconds        (swim, run)
+--     best_pace      → best_pace_seconds       (swim, run)
+--     best_lap_time  → best_lap_time_seconds
+--     moving_time    → moving_time_seconds
+--     elapsed_time   → elapsed_time_seconds
+--
+--   Paces keep the sport's own unit: seconds per 100 yards for swims,
+--   seconds per mile for runs.
+--
+--   The columns are computed, so both loaders (02_load_data.sql and
+--   python/02_b_load_swim_workouts.py) and the MERGE procedures fill them
+--   without changes. Adding them rewrites each table once (the backfill).
+--   The expression uses only built-in string functions (no scalar UDF), so
+--   queries on these tables can still get parallel plans.
+--
+--   "h:mm:ss" and "m:ss" (with optional fractional seconds) parse; blanks,
+--   "--" and anything else become NULL.
+--
+-- Prerequisites:
+--   - 01_schema.sql has been executed
+--   - 10_bike_run_schema.sql for bike/run (optional; re-run this script
+--     after creating those tables)
+--
+-- Usage:
+--   Safe to re-run. Indexed computed columns need the default ANSI session
+--   settings (ANSI_NULLS, QUOTED_IDENTIFIER, ARITHABORT ON) for any session
+--   that writes to these tables; SSMS and ODBC connections use them already.
+-- =============================================================================
+
+USE SqlAiDatathon;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 1: Persisted Seconds Columns
+-- ---------------------------------------------------------------------------
+-- {c} is replaced with the quoted text column.
+DECLARE @expression NVARCHAR(MAX) = N'CAST(
+    CASE
+        WHEN {c} LIKE ''%:%:%'' THEN
+              TRY_CAST(LEFT({c}, CHARINDEX('':'', {c}) - 1) AS FLOAT) * 3600
+            + TRY_CAST(SUBSTRING({c}, CHARINDEX('':'', {c}) + 1,
+                                 CHARINDEX('':'', {c}, CHARINDEX('':'', {c}) + 1) - CHARINDEX('':'', {c}) - 1) AS FLOAT) * 60
+            + TRY_CAST(SUBSTRING({c}, CHARINDEX('':'', {c}, CHARINDEX('':'', {c}) + 1) + 1, 50) AS FLOAT)
+        WHEN {c} LIKE ''%:%'' THEN
+              TRY_CAST(LEFT({c}, CHARINDEX('':'', {c}) - 1) AS FLOAT) * 60
+            + TRY_CAST(SUBSTRING({c}, CHARINDEX('':'', {c}) + 1, 50) AS FLOAT)
+        ELSE TRY_CAST({c} AS FLOAT)
+    END AS FLOAT)';
+
+DECLARE @sql NVARCHAR(MAX) = N'';
+
+SELECT @sql += N'ALTER TABLE dbo.' + QUOTENAME(t.table_name)
+             + N' ADD ' + QUOTENAME(c.column_name + N'_seconds')
+             + N' AS ' + REPLACE(@expression, N'{c}', QUOTENAME(c.column_name))
+             + N' PERSISTED;' + NCHAR(10)
+FROM (VALUES (N'swim_workouts'), (N'bike_workouts'), (N'run_workouts')) AS t (table_name)
+CROSS JOIN (VALUES (N'time'), (N'avg_pace'), (N'best_pace'),
+                   (N'best_lap_time'), (N'moving_time'), (N'elapsed_time')) AS c (column_name)
+WHERE OBJECT_ID(N'dbo.' + t.table_name, 'U') IS NOT NULL
+  AND COL_LENGTH(N'dbo.' + t.table_name, c.column_name) IS NOT NULL
+  AND COL_LENGTH(N'dbo.' + t.table_name, c.column_name + N'_seconds') IS NULL;
+
+EXEC sys.sp_executesql @sql;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 2: Indexes for Pace / Duration Range Filters
+-- ---------------------------------------------------------------------------
+-- Back the min_/max_avg_pace_seconds and min_/max_moving_time_seconds search
+-- filters with seeks when semantic_search.keyword_candidates pushes them down
+-- (search_filters.to_sql), and pace/duration sorts.
+DECLARE @sql NVARCHAR(MAX) = N'';
+
+SELECT @sql += N'CREATE NONCLUSTERED INDEX ' + QUOTENAME(N'ix_' + t.table_name + N'_' + c.column_name)
+             + N' ON dbo.' + QUOTENAME(t.table_name) + N' (' + QUOTENAME(c.column_name) + N')'
+             + N' INCLUDE (workout_date, activity_type);' + NCHAR(10)
+FROM (VALUES (N'swim_workouts'), (N'bike_workouts'), (N'run_workouts')) AS t (table_name)
+CROSS JOIN (VALUES (N'avg_pace_seconds'), (N'moving_time_seconds')) AS c (column_name)
+WHERE COL_LENGTH(N'dbo.' + t.table_name, c.column_name) IS NOT NULL
+  AND NOT EXISTS (
+      SELECT * FROM sys.indexes
+      WHERE name = N'ix_' + t.table_name + N'_' + c.column_name
+        AND object_id = OBJECT_ID(N'dbo.' + t.table_name)
+  );
+
+EXEC sys.sp_executesql @sql;
+GO
+
+-- ---------------------------------------------------------------------------
+-- SECTION 3: Verify
+-- ---------------------------------------------------------------------------
+-- Text values that did not parse (expect 0 apart from odd export rows).
+SELECT
+    SUM(CASE WHEN moving_time IS NOT NULL AND moving_time <> '--' AND moving_time_seconds IS NULL THEN 1 ELSE 0 END) AS unparsed_moving_time,
+    SUM(CASE WHEN avg_pace IS NOT NULL AND avg_pace <> '--' AND avg_pace_seconds IS NULL THEN 1 ELSE 0 END) AS unparsed_avg_pace,
+    MIN(avg_pace_seconds) AS fastest_avg_pace_seconds,
+    MAX(moving_time_seconds) AS longest_moving_time_seconds
+FROM dbo.swim_workouts;
+GO